@@ -0,0 +1,30 @@
+"""
+Micro benchmark of the PEP 503 name normalization
+
+    python -m benchmarks.bench_normalize
+"""
+
+import re
+import timeit
+
+from warehouse14.pkg_helpers import normalize_pkgname
+
+NAMES = [f"Example_Package.{i}-Name" for i in range(100)]
+
+
+def uncompiled(name: str) -> str:
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def main(number=2000):
+    for label, func in [
+        ("re.sub (uncompiled)", uncompiled),
+        ("normalize_pkgname", normalize_pkgname),
+    ]:
+        seconds = timeit.timeit(lambda: [func(n) for n in NAMES], number=number)
+        per_call = seconds / (number * len(NAMES)) * 1e9
+        print(f"{label:<24} {per_call:8.1f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Benchmark of the simple API hot paths
+
+Seeds N projects x M versions x K files into DynamoDB (moto or local DynamoDB)
+and a temporary SimpleFileStorage, then measures latency, throughput
+and DynamoDB calls per request of index, project page, download and upload.
+
+    python -m benchmarks.bench_simple_api --projects 100 --versions 10 --files 3
+    python -m benchmarks.bench_simple_api --dynamodb local --json results.json
+"""
+
+import argparse
+import base64
+import json
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Callable, Dict, List
+
+import boto3
+import pypitoken
+from flask import Flask
+
+import warehouse14
+from warehouse14 import simple_api
+from warehouse14.models import Project, Version, File
+from warehouse14.repos_dynamo import DynamoDBBackend, create_table
+from warehouse14.storage import SimpleFileStorage
+
+FILE_CONTENT = b"x" * 4096
+
+
+class CallCounter:
+    """Counts DynamoDB API calls of a boto3 client"""
+
+    def __init__(self, client):
+        self.calls = 0
+        client.meta.events.register("before-call", self._count)
+
+    def _count(self, **kwargs):
+        self.calls += 1
+
+
+@contextmanager
+def dynamodb(kind: str):
+    if kind == "moto":
+        from moto import mock_dynamodb
+
+        with mock_dynamodb():
+            yield boto3.resource("dynamodb", region_name="us-east-1")
+    else:
+        from tests.local_dynamodb import LocalDynamoDB
+
+        with LocalDynamoDB() as resource:
+            yield resource
+
+
+def seed(db: DynamoDBBackend, storage: SimpleFileStorage, projects, versions, files):
+    db.account_save("bench")
+    token = db.account_token_add("bench", token_id="bench", name="bench", key="sec")
+    api_key = pypitoken.Token.create(
+        domain="warehouse14", identifier=token.id, key=token.key, prefix="wh14"
+    ).dump()
+
+    for p in range(projects):
+        name = f"project-{p}"
+        project = Project(name=name, admins=["bench"], public=True)
+        for v in range(versions):
+            version = f"0.{v}.0"
+            project.versions[version] = Version(
+                version=version, metadata={"summary": f"Benchmark project {p}"}
+            )
+            for f in range(files):
+                filename = f"{name}-{version}-{f}.tar.gz"
+                project.add_file(version, File(filename=filename, sha256_digest="x"))
+                storage.add(name, filename, BytesIO(FILE_CONTENT))
+        db.project_save(project)
+
+    return api_key
+
+
+def measure(requests: int, request: Callable[[int], int], counter: CallCounter) -> Dict:
+    latencies: List[float] = []
+    calls_before = counter.calls
+    start = time.perf_counter()
+    for i in range(requests):
+        t0 = time.perf_counter()
+        status = request(i)
+        latencies.append(time.perf_counter() - t0)
+        assert status < 400, f"request failed with status {status}"
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "throughput_rps": requests / duration,
+        "db_calls_per_request": (counter.calls - calls_before) / requests,
+    }
+
+
+def run(args) -> Dict[str, Dict]:
+    with dynamodb(args.dynamodb) as resource, tempfile.TemporaryDirectory() as tmp:
+        table = create_table(resource, "benchmark")
+        db = DynamoDBBackend(table)
+        storage = SimpleFileStorage(tmp)
+        api_key = seed(db, storage, args.projects, args.versions, args.files)
+        counter = CallCounter(table.meta.client)
+
+        app = Flask(warehouse14.__name__)
+        app.register_blueprint(simple_api.create_blueprint(db=db, storage=storage))
+        client = app.test_client()
+        credentials = base64.b64encode(f"__token__:{api_key}".encode()).decode()
+        headers = {"Authorization": f"Basic {credentials}"}
+
+        def get(url):
+            return lambda i: client.get(url, headers=headers).status_code
+
+        def upload(i):
+            return client.post(
+                "/simple/",
+                headers=headers,
+                data={
+                    ":action": "file_upload",
+                    "protocol_version": "1",
+                    "sha256_digest": "x",
+                    "filetype": "sdist",
+                    "name": "project-0",
+                    "version": "9.9.9",
+                    "summary": "Uploaded by benchmark",
+                    "content": (BytesIO(FILE_CONTENT), f"upload-{i}.tar.gz"),
+                },
+            ).status_code
+
+        scenarios = {
+            "/simple/": get("/simple/"),
+            "/simple/<project>/": get("/simple/project-0/"),
+            "/packages/<project>/<file>": get(
+                "/packages/project-0/project-0-0.0.0-0.tar.gz"
+            ),
+            "upload": upload,
+        }
+        return {
+            name: measure(args.requests, request, counter)
+            for name, request in scenarios.items()
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--versions", type=int, default=5)
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--dynamodb", choices=["moto", "local"], default="moto")
+    parser.add_argument("--json", help="write results to the given file")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print(f"{'endpoint':<28} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'db calls':>9}")
+    for name, r in results.items():
+        print(
+            f"{name:<28} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} "
+            f"{r['throughput_rps']:9.1f} {r['db_calls_per_request']:9.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"parameters": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
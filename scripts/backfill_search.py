@@ -0,0 +1,19 @@
+#! python
+"""
+Writes the search text of projects stored before it was introduced.
+
+    python scripts/backfill_search.py <table name>
+"""
+import argparse
+
+import boto3
+
+from warehouse14.repos_dynamo import DynamoDBBackend
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("table", help="name of the DynamoDB table")
+    args = parser.parse_args()
+
+    db = DynamoDBBackend(boto3.resource("dynamodb").Table(args.table))
+    print(f"Updated {db.backfill_search()} projects")
@@ -0,0 +1,24 @@
+#! python
+"""
+Moves all files of a SimpleFileStorage to the given shard levels.
+
+    python scripts/migrate_file_storage.py <root> --shard-levels 1
+"""
+import argparse
+
+from warehouse14.storage import SimpleFileStorage
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", help="root directory of the storage")
+    parser.add_argument(
+        "--shard-levels",
+        type=int,
+        default=1,
+        help=f"0 to {SimpleFileStorage.MAX_SHARD_LEVELS}, "
+        f"0 stores all files of a project in one directory",
+    )
+    args = parser.parse_args()
+
+    storage = SimpleFileStorage(args.root, shard_levels=args.shard_levels)
+    print(f"Moved {storage.migrate()} files")
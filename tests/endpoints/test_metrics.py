@@ -0,0 +1,85 @@
+import requests_html
+from pytest import fixture
+from wsgiadapter import WSGIAdapter
+
+from tests.endpoints import login
+from tests.test_simple_api import (
+    given_account_exists_with_api_key,
+    given_project_with_file,
+)
+from warehouse14 import create_app
+from warehouse14.metrics import Metrics
+
+
+@fixture
+def metrics():
+    return Metrics()
+
+
+@fixture
+def app(db, storage, authenticator, metrics):
+    app = create_app(db, storage, authenticator, metrics=metrics)
+    app.debug = True
+    return app
+
+
+@fixture
+def html_client(app) -> requests_html.HTMLSession:
+    session = requests_html.HTMLSession()
+    session.mount("http://localhost", WSGIAdapter(app))
+    return session
+
+
+def test_metrics_endpoint_reports_requests(html_client, db):
+    login(html_client, "user1")
+    html_client.get("http://localhost/projects")
+
+    res = html_client.get("http://localhost/metrics")
+
+    assert res.status_code == 200
+    assert res.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    assert (
+        "warehouse14_http_requests_total"
+        '{endpoint="list_projects",method="GET",status="200"} 1.0' in res.text
+    )
+    assert (
+        'warehouse14_db_call_duration_seconds_count{method="project_search"} 1'
+        in res.text
+    )
+    assert 'warehouse14_dynamodb_calls_total{operation="Query"}' in res.text
+
+
+def test_metrics_report_simple_api(html_client, db, storage, metrics):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+
+    res = html_client.get(
+        "http://localhost/packages/example-pkg/example-pkg-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+    )
+    assert res.status_code == 200
+
+    assert metrics.token_verification.count(result="valid") == 1
+    assert (
+        metrics.request_latency.count(endpoint="simple.server_static", method="GET")
+        == 1
+    )
+    assert metrics.storage_bytes.value(backend="S3Storage", direction="out") == len(
+        res.content
+    )
+
+
+def test_metrics_endpoint_requires_configured_bearer_token(db, storage, authenticator):
+    app = create_app(db, storage, authenticator, metrics=Metrics(bearer_token="secret"))
+    session = requests_html.HTMLSession()
+    session.mount("http://localhost", WSGIAdapter(app))
+
+    assert session.get("http://localhost/metrics").status_code == 401
+    res = session.get(
+        "http://localhost/metrics", headers={"Authorization": "Bearer wrong"}
+    )
+    assert res.status_code == 401
+    res = session.get(
+        "http://localhost/metrics", headers={"Authorization": "Bearer secret"}
+    )
+    assert res.status_code == 200
@@ -6,7 +6,9 @@ from wsgiadapter import WSGIAdapter
 from tests import captured_templates
 from tests.endpoints import login
 from tests.test_simple_api import given_project_with_file
+import warehouse14
 from warehouse14 import create_app, Project
+from warehouse14.models import Version
 
 
 @fixture
@@ -48,6 +50,57 @@ def test_projects_list_projects(html_client, app, db):
     }
 
 
+def test_projects_list_filtered_by_search_query(html_client, app, db):
+    login(html_client, "user1")
+
+    db.project_save(Project(name="public1", public=True))
+    db.project_save(
+        Project(
+            name="public2",
+            public=True,
+            versions={
+                "0.0.1": Version(version="0.0.1", metadata={"summary": "Fast Parser"})
+            },
+        )
+    )
+
+    res: HTMLResponse = html_client.get("http://localhost/projects?q=parser")
+
+    assert res.status_code == 200, res.text
+    assert res.html.find("#projects", first=True).links == {"/projects/public2"}
+
+
+def test_projects_list_rejects_invalid_cursor(html_client, app, db):
+    login(html_client, "user1")
+
+    res: HTMLResponse = html_client.get("http://localhost/projects?cursor=garbage")
+
+    assert res.status_code == 400
+
+
+def test_projects_list_paginated(html_client, app, db, monkeypatch):
+    monkeypatch.setattr(warehouse14, "PROJECTS_PER_PAGE", 2)
+    login(html_client, "user1")
+
+    for name in ["public1", "public2", "public3"]:
+        db.project_save(Project(name=name, public=True))
+
+    res: HTMLResponse = html_client.get("http://localhost/projects")
+    first_page = res.html.find("#projects", first=True).links
+    next_page = res.html.find("#projects-next-page", first=True).attrs["href"]
+
+    res: HTMLResponse = html_client.get(f"http://localhost{next_page}")
+    second_page = res.html.find("#projects", first=True).links
+
+    assert len(first_page) == 2
+    assert first_page | second_page == {
+        "/projects/public1",
+        "/projects/public2",
+        "/projects/public3",
+    }
+    assert res.html.find("#projects-next-page", first=True) is None
+
+
 def test_project_page_shows_details(html_client, app, db, storage):
     login(html_client, "user1")
     project = given_project_with_file(db, storage, admins=["user1"])
@@ -128,3 +181,26 @@ def test_project_edit_updates_project(html_client, app, db, storage):
     assert actual_project.public == True
     assert actual_project.members == []
     assert actual_project.admins == ["user1"]
+
+
+def test_logs_db_usage_per_request(html_client, app, db, caplog):
+    login(html_client, "user1")
+    db.project_save(Project(name="public1", public=True))
+
+    with caplog.at_level("INFO"):
+        html_client.get("http://localhost/projects")
+
+    assert any(
+        "GET /projects DynamoDB calls:" in record.message for record in caplog.records
+    )
+    assert "list_projects" in db.stats.as_dict()["endpoints"]
+
+
+def test_logged_in_user_is_not_loaded_per_request(html_client, app, db):
+    login(html_client, "user1")
+    calls_before = db.stats.total.as_dict()["calls"].get("GetItem", 0)
+
+    html_client.get("http://localhost/")
+    html_client.get("http://localhost/")
+
+    assert db.stats.total.as_dict()["calls"].get("GetItem", 0) == calls_before
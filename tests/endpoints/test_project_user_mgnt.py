@@ -221,3 +221,163 @@ def test_users_remove_last_member(html_client, app, db, storage):
 
     assert res.status_code == 200, res.text
     assert list(map(attrgetter("text"), res.html.find(".member"))) == []
+
+
+def test_users_bulk_change_across_projects(html_client, app, db, storage):
+    login(html_client, "admin1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg2")
+
+    res = html_client.post(
+        "http://localhost/manage/projects/users",
+        json={
+            "changes": [
+                {"project": "pkg1", "user": "user1", "role": "member"},
+                {"project": "pkg2", "user": "user1", "role": "admin"},
+                {"project": "pkg2", "user": "user2", "role": "member"},
+            ]
+        },
+    )
+
+    assert res.status_code == 200, res.text
+    assert res.json() == {"projects": ["pkg1", "pkg2"]}
+    assert db.project_get("pkg1").members == ["user1"]
+    assert sorted(db.project_get("pkg2").admins) == ["admin1", "user1"]
+    assert db.project_get("pkg2").members == ["user2"]
+
+
+def test_users_bulk_change_requires_admin_of_all_projects(
+    html_client, app, db, storage
+):
+    login(html_client, "admin1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg1")
+    given_project_with_file(db, storage, admins=["admin2"], project_name="pkg2")
+
+    res = html_client.post(
+        "http://localhost/manage/projects/users",
+        json={
+            "changes": [
+                {"project": "pkg1", "user": "user1", "role": "member"},
+                {"project": "pkg2", "user": "user1", "role": "member"},
+            ]
+        },
+    )
+
+    assert res.status_code == 401
+    assert db.project_get("pkg1").members == []
+
+
+def test_users_bulk_change_keeps_an_admin(html_client, app, db, storage):
+    login(html_client, "admin1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg1")
+
+    res = html_client.post(
+        "http://localhost/manage/projects/users",
+        json={"changes": [{"project": "pkg1", "user": "admin1", "role": None}]},
+    )
+
+    assert res.status_code == 400
+    assert db.project_get("pkg1").admins == ["admin1"]
+
+
+def test_users_bulk_change_rejects_invalid_roles(html_client, app, db, storage):
+    login(html_client, "admin1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg1")
+
+    res = html_client.post(
+        "http://localhost/manage/projects/users",
+        json={"changes": [{"project": "pkg1", "user": "user1", "role": "owner"}]},
+    )
+
+    assert res.status_code == 400
+
+
+def test_users_bulk_change_rejects_concurrently_changed_projects(
+    html_client, app, db, storage, monkeypatch
+):
+    login(html_client, "admin1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg1")
+    given_project_with_file(db, storage, admins=["admin1"], project_name="pkg2")
+
+    project_get_many = db.project_get_many
+
+    def project_get_many_and_change(names):
+        projects = project_get_many(names)
+        # admin1 is removed from pkg2, right after the endpoint checked the admins
+        pkg2 = db.project_get("pkg2")
+        pkg2.admins = ["admin2"]
+        db.project_save(pkg2)
+        return projects
+
+    monkeypatch.setattr(db, "project_get_many", project_get_many_and_change)
+
+    res = html_client.post(
+        "http://localhost/manage/projects/users",
+        json={
+            "changes": [
+                {"project": "pkg1", "user": "user1", "role": "member"},
+                {"project": "pkg2", "user": "user1", "role": "admin"},
+            ]
+        },
+    )
+
+    assert res.status_code == 409
+    assert res.json() == {"projects": [], "conflicts": ["pkg1", "pkg2"]}
+    assert db.project_get("pkg1").members == []
+    assert db.project_get("pkg2").admins == ["admin2"]
+
+
+def test_groups_add_grants_project_access(html_client, app, db, storage):
+    login(html_client, "admin1")
+    db.group_create("group1", admins=["admin1"])
+    project = given_project_with_file(db, storage, admins=["admin1"])
+
+    res: HTMLResponse = html_client.post(
+        f"http://localhost/projects/{project.name}/groups", data={"group": "group1"}
+    )
+
+    assert res.status_code == 200, res.text
+    assert list(map(attrgetter("text"), res.html.find(".group"))) == ["group1"]
+    assert db.project_get(project.name).groups == ["group1"]
+
+
+def test_groups_add_rejects_unknown_group(html_client, app, db, storage):
+    login(html_client, "admin1")
+    project = given_project_with_file(db, storage, admins=["admin1"])
+
+    res: HTMLResponse = html_client.post(
+        f"http://localhost/projects/{project.name}/groups", data={"group": "group1"}
+    )
+
+    assert res.status_code == 200, res.text
+    assert db.project_get(project.name).groups == []
+
+
+def test_groups_add_requires_admin(html_client, app, db, storage):
+    login(html_client, "user1")
+    db.group_create("group1", admins=["user1"])
+    project = given_project_with_file(db, storage, admins=["admin1"])
+
+    res: HTMLResponse = html_client.post(
+        f"http://localhost/projects/{project.name}/groups", data={"group": "group1"}
+    )
+
+    assert res.status_code == 401
+    assert db.project_get(project.name).groups == []
+
+
+def test_groups_remove_revokes_project_access(html_client, app, db, storage):
+    login(html_client, "admin1")
+    db.group_create("group1", admins=["admin1"])
+    project = given_project_with_file(db, storage, admins=["admin1"])
+    project = db.project_get(project.name)
+    project.groups = ["group1"]
+    db.project_save(project)
+
+    res: HTMLResponse = html_client.get(
+        f"http://localhost/projects/{project.name}/groups/group1/delete"
+    )
+
+    assert res.status_code == 200, res.text
+    assert list(map(attrgetter("text"), res.html.find(".group"))) == []
+    assert db.project_get(project.name).groups == []
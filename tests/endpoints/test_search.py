@@ -0,0 +1,81 @@
+import requests_html
+from pytest import fixture
+from requests_html import HTMLResponse
+from wsgiadapter import WSGIAdapter
+
+from tests.endpoints import login
+from warehouse14 import create_app, Project
+from warehouse14.models import Version
+from warehouse14.search import SearchIndex
+
+
+@fixture
+def search_index():
+    return SearchIndex()
+
+
+@fixture
+def app(db, storage, authenticator, search_index):
+    app = create_app(db, storage, authenticator, search_index=search_index)
+    app.debug = True
+    return app
+
+
+@fixture
+def html_client(app) -> requests_html.HTMLSession:
+    session = requests_html.HTMLSession()
+    session.mount("http://localhost", WSGIAdapter(app))
+    return session
+
+
+def test_search_lists_matching_projects(html_client, app, search_index):
+    login(html_client, "user1")
+    search_index.rebuild(
+        [
+            Project(
+                name="public1",
+                public=True,
+                versions={
+                    "0.0.1": Version(
+                        version="0.0.1", metadata={"summary": "Fast Parser"}
+                    )
+                },
+            ),
+            Project(name="public2", public=True),
+        ]
+    )
+
+    res: HTMLResponse = html_client.get("http://localhost/search?q=parser")
+
+    assert res.status_code == 200, res.text
+    assert res.html.find("#results", first=True).links == {"/projects/public1"}
+
+
+def test_search_finds_project_created_in_app(html_client, app):
+    login(html_client, "user1")
+    res = html_client.get("http://localhost/projects_form")
+    csrf_token = res.html.find("#csrf_token", first=True).attrs["value"]
+    html_client.post(
+        "http://localhost/projects_form",
+        data={"name": "test-project", "public": False, "csrf_token": csrf_token},
+    )
+
+    res: HTMLResponse = html_client.get("http://localhost/search?q=test")
+
+    assert res.status_code == 200, res.text
+    assert res.html.find("#results", first=True).links == {"/projects/test-project"}
+
+
+def test_search_finds_project_after_user_was_added(html_client, app, db):
+    db.project_save(Project(name="private1", admins=["admin1"]))
+    login(html_client, "admin1")
+    html_client.post(
+        "http://localhost/manage/projects/users",
+        json={"changes": [{"project": "private1", "user": "user1", "role": "member"}]},
+    )
+
+    login(html_client, "user1")
+    res: HTMLResponse = html_client.get("http://localhost/search?q=private")
+
+    assert res.status_code == 200, res.text
+    assert res.html.find("#results", first=True).links == {"/projects/private1"}
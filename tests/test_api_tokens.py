@@ -0,0 +1,99 @@
+import pypitoken
+import pytest
+
+from warehouse14.api_tokens import (
+    TokenCache,
+    TokenPermissions,
+    VerifiedToken,
+    parse_restrictions,
+    token_expiry,
+)
+
+
+def create_token(**restrictions) -> pypitoken.Token:
+    token = pypitoken.Token.create(
+        domain="warehouse14", identifier="token-id", key="sec", prefix="wh14"
+    )
+    if restrictions:
+        token.restrict(**restrictions)
+    return token
+
+
+def verified(token: pypitoken.Token) -> VerifiedToken:
+    permissions, _ = parse_restrictions(token)
+    return VerifiedToken("user1", token, permissions, token_expiry(token))
+
+
+def test_unrestricted_token_allows_all_projects():
+    permissions, project_name = parse_restrictions(create_token())
+
+    assert permissions == TokenPermissions()
+    assert permissions.allows("any")
+    assert project_name is None
+
+
+def test_project_restrictions_allow_listed_projects():
+    token = create_token(project_names=["my-pkg", "other"])
+
+    permissions, project_name = parse_restrictions(token)
+
+    assert permissions.projects == {"my-pkg", "other"}
+    assert permissions.allows("My_Pkg")
+    assert not permissions.allows("third")
+    assert project_name == "my-pkg"
+
+
+def test_disjoint_project_restrictions_are_invalid():
+    token = create_token(project_names=["a"])
+    token.restrict(project_names=["b"])
+
+    with pytest.raises(pypitoken.ValidationError):
+        parse_restrictions(token)
+
+
+def test_returns_cached_verification():
+    cache = TokenCache(clock=lambda: 1000)
+    raw = create_token().dump()
+    cache.set(raw, verified(pypitoken.Token.load(raw)))
+
+    actual = cache.get(raw)
+
+    assert actual.account_name == "user1"
+    assert actual.token.identifier == "token-id"
+    assert cache.get(create_token(project_names=["other"]).dump()) is None
+
+
+def test_verification_expires_after_ttl():
+    now = [1000]
+    cache = TokenCache(ttl=60, clock=lambda: now[0])
+    raw = create_token().dump()
+    cache.set(raw, verified(pypitoken.Token.load(raw)))
+
+    now[0] = 1059
+    assert cache.get(raw) is not None
+
+    now[0] = 1060
+    assert cache.get(raw) is None
+
+
+def test_verification_expires_with_token():
+    now = [1000]
+    cache = TokenCache(ttl=60, clock=lambda: now[0])
+    raw = create_token(not_before=900, not_after=1010).dump()
+    cache.set(raw, verified(pypitoken.Token.load(raw)))
+
+    now[0] = 1009
+    assert cache.get(raw) is not None
+
+    now[0] = 1010
+    assert cache.get(raw) is None
+
+
+def test_invalidate_drops_token():
+    cache = TokenCache()
+    raw = create_token().dump()
+    cache.set(raw, verified(pypitoken.Token.load(raw)))
+
+    cache.invalidate("token-id")
+
+    assert cache.get(raw) is None
@@ -0,0 +1,231 @@
+from pytest import fixture
+from starlette.testclient import TestClient
+
+from tests import PROJECT_BASE_PATH
+from tests.test_simple_api import (
+    given_account_exists_with_api_key,
+    given_project_with_file,
+    given_restricted_api_key,
+    EXAMBLE_FILE_CONTENT,
+    EXAMPLE_SHA256_URL,
+)
+from warehouse14.asgi import create_asgi_app
+from warehouse14.repos import DBBackend
+from warehouse14.repos_dynamo import DynamoDBBackend
+from warehouse14.storage import SimpleFileStorage
+
+
+@fixture
+def db(table) -> DBBackend:
+    return DynamoDBBackend(table)
+
+
+@fixture
+def storage(tmpdir):
+    return SimpleFileStorage(tmpdir)
+
+
+@fixture
+def client(db, storage) -> TestClient:
+    app = create_asgi_app(db=db, storage=storage, allow_project_creation=True)
+    return TestClient(app, base_url="http://localhost")
+
+
+def test_list_access_denied(client):
+    res = client.get("/simple/")
+    assert res.status_code == 401
+    assert res.headers["WWW-Authenticate"].startswith("Basic")
+
+
+def test_list_access_denied_with_invalid_token(client):
+    res = client.get("/simple/", auth=("__token__", "wh14-invalid"))
+    assert res.status_code == 401
+
+
+def test_index_lists_visible_projects(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, project_name="public_pkg", public=True)
+    given_project_with_file(db, storage, project_name="private_pkg", public=False)
+
+    res = client.get("/simple/", auth=("__token__", api_key))
+
+    assert res.status_code == 200
+    assert 'href="public-pkg/"' in res.text
+    assert "private" not in res.text
+
+
+def test_project_page_redirects_to_normalized_name(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+
+    res = client.get(
+        "/simple/ex.example-pkg_some/",
+        auth=("__token__", api_key),
+        follow_redirects=False,
+    )
+
+    assert res.status_code == 301
+    assert res.headers["location"] == "/simple/ex-example-pkg-some/"
+
+
+def test_project_page_list_files_of_public_project(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+
+    res = client.get("/simple/example-pkg/", auth=("__token__", api_key))
+
+    assert res.status_code == 200
+    assert (
+        f'href="/packages/example-pkg/example-pkg-0.0.1.tar.gz#{EXAMPLE_SHA256_URL}"'
+        in res.text
+    )
+
+
+def test_project_page_denies_access_to_private_project(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=False)
+
+    res = client.get("/simple/example-pkg/", auth=("__token__", api_key))
+
+    assert res.status_code == 401
+
+
+def test_download_streams_file_of_member_project(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, members=[account.name], public=False)
+
+    res = client.get(
+        "/packages/example-pkg/example-pkg-0.0.1.tar.gz", auth=("__token__", api_key)
+    )
+
+    assert res.status_code == 200
+    assert res.content == EXAMBLE_FILE_CONTENT
+    assert res.headers["content-type"] == "application/octet-stream"
+    assert (
+        res.headers["content-disposition"]
+        == 'attachment; filename="example-pkg-0.0.1.tar.gz"'
+    )
+
+
+def test_download_denies_access_to_file_of_private_project(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=False)
+
+    res = client.get(
+        "/packages/example-pkg/example-pkg-0.0.1.tar.gz", auth=("__token__", api_key)
+    )
+
+    assert res.status_code == 401
+
+
+def test_download_of_missing_file(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+
+    res = client.get(
+        "/packages/example-pkg/example-pkg-0.0.2.tar.gz", auth=("__token__", api_key)
+    )
+
+    assert res.status_code == 404
+
+
+def upload_example_pkg(client, api_key):
+    with (PROJECT_BASE_PATH / "fixtures/mypkg/dist/example-pkg-0.0.1.tar.gz").open(
+        "rb"
+    ) as file:
+        return client.post(
+            "/simple/",
+            auth=("__token__", api_key),
+            data={
+                ":action": "file_upload",
+                "protocol_version": "1",
+                "sha256_digest": "xxx",
+                "filetype": "sdist",
+                "pyversion": "source",
+                "metadata_version": "2.2",
+                "name": "example-pkg",
+                "version": "0.0.1",
+                "summary": "Example package to test file upload.",
+            },
+            files={"content": file},
+        )
+
+
+def test_upload_creates_project(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+
+    res = upload_example_pkg(client, api_key)
+
+    assert res.status_code == 200, res.text
+    project = db.project_get("example-pkg")
+    assert project.admins == [account.name]
+    assert project.versions["0.0.1"].summary == "Example package to test file upload."
+    assert storage.get("example-pkg", "example-pkg-0.0.1.tar.gz").read()
+
+
+def test_upload_twice_conflicts(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    upload_example_pkg(client, api_key)
+
+    res = upload_example_pkg(client, api_key)
+
+    assert res.status_code == 409, res.text
+
+
+def test_restricted_token_denies_other_projects(client, db, storage):
+    given_account_exists_with_api_key(db)
+    api_key = given_restricted_api_key(db, ["example-pkg"])
+    given_project_with_file(db, storage, public=True, project_name="other-pkg")
+
+    page = client.get("/simple/other-pkg/", auth=("__token__", api_key))
+    index = client.get("/simple/", auth=("__token__", api_key))
+
+    assert page.status_code == 403
+    assert "other-pkg" not in index.text
+
+
+def test_upload_without_action_is_rejected(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+
+    res = client.post(
+        "/simple/",
+        auth=("__token__", api_key),
+        data={"protocol_version": "1", "name": "example-pkg"},
+        files={"content": ("example-pkg-0.0.1.tar.gz", b"data")},
+    )
+
+    assert res.status_code == 400, res.text
+
+
+def test_upload_without_protocol_version_is_rejected(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+
+    res = client.post(
+        "/simple/",
+        auth=("__token__", api_key),
+        data={":action": "file_upload", "name": "example-pkg"},
+        files={"content": ("example-pkg-0.0.1.tar.gz", b"data")},
+    )
+
+    assert res.status_code == 400, res.text
+
+
+def test_upload_with_text_content_is_rejected(client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+
+    res = client.post(
+        "/simple/",
+        auth=("__token__", api_key),
+        data={
+            ":action": "file_upload",
+            "protocol_version": "1",
+            "sha256_digest": "xxx",
+            "filetype": "sdist",
+            "name": "example-pkg",
+            "version": "0.0.1",
+            "summary": "Example package to test file upload.",
+            "content": "not a file",
+        },
+    )
+
+    assert res.status_code == 403, res.text
+    assert db.project_get("example-pkg") is None
@@ -0,0 +1,65 @@
+from io import BytesIO
+
+import pytest
+
+from warehouse14.storage_async import AsyncSimpleFileStorage, AsyncS3Storage
+
+
+async def test_file_round_trip(tmpdir):
+    fs = AsyncSimpleFileStorage(tmpdir)
+
+    # Add
+    await fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+    assert (tmpdir / "packages" / "example_project" / "test.txt").exists()
+
+    # Retrieve file
+    assert await fs.get("example_project", "test.txt") == b"Hello World!"
+
+    # Delete file
+    await fs.delete("example_project", "test.txt")
+    assert not (tmpdir / "packages" / "example_project" / "test.txt").exists()
+
+
+async def test_file_open_streams_chunks(tmpdir):
+    fs = AsyncSimpleFileStorage(tmpdir)
+    await fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+    chunks = await fs.open("example_project", "test.txt", chunk_size=5)
+
+    assert [chunk async for chunk in chunks] == [b"Hello", b" Worl", b"d!"]
+
+
+async def test_file_open_raises_for_missing_file(tmpdir):
+    fs = AsyncSimpleFileStorage(tmpdir)
+
+    with pytest.raises(FileNotFoundError):
+        await fs.open("example_project", "test.txt")
+
+
+async def test_file_add_does_not_overwrite(tmpdir):
+    fs = AsyncSimpleFileStorage(tmpdir)
+    await fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+    with pytest.raises(FileExistsError):
+        await fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+
+async def test_s3_round_trip(bucket):
+    fs = AsyncS3Storage(bucket)
+
+    # Add
+    await fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+    # Retrieve file
+    assert await fs.get("example_project", "test.txt") == b"Hello World!"
+
+    # Delete file
+    await fs.delete("example_project", "test.txt")
+    assert list(fs.storage.list()) == []
+
+
+async def test_s3_open_raises_for_missing_file(bucket):
+    fs = AsyncS3Storage(bucket)
+
+    with pytest.raises(KeyError):
+        await fs.open("example_project", "test.txt")
@@ -0,0 +1,147 @@
+from io import BytesIO
+from uuid import uuid4
+
+import boto3
+import pytest
+from botocore.config import Config
+from moto import mock_dynamodb, mock_s3
+
+from warehouse14.aws import (
+    client_config,
+    PoolMetrics,
+    create_dynamodb_backend,
+    create_s3_storage,
+)
+
+
+@pytest.fixture
+def dynamodb_mock():
+    with mock_dynamodb():
+        yield
+
+
+@pytest.fixture
+def s3_mock():
+    with mock_s3():
+        yield
+
+
+def test_client_config_sized_by_threads():
+    config = client_config(threads=32)
+
+    assert config.max_pool_connections == 64
+    assert config.tcp_keepalive is True
+    assert config.retries == {"mode": "adaptive", "max_attempts": 5}
+
+
+def test_client_config_keeps_boto_minimum_pool_size():
+    assert client_config(threads=1).max_pool_connections == 10
+
+
+def test_create_dynamodb_backend(dynamodb_mock):
+    metrics = PoolMetrics()
+    db = create_dynamodb_backend(
+        str(uuid4()),
+        threads=16,
+        create_if_missing=True,
+        pool_metrics=metrics,
+        region_name="us-east-1",
+    )
+
+    db.account_save("userX")
+
+    assert db.account_get("userX").name == "userX"
+    snapshot = metrics.snapshot()["dynamodb"]
+    assert snapshot["max_connections"] == 32
+    assert snapshot["calls"] > 0
+    assert snapshot["in_flight"] == 0
+    assert snapshot["peak"] == 1
+    assert snapshot["saturated"] == 0
+
+
+def test_create_s3_storage(s3_mock):
+    bucket_name = str(uuid4())
+    boto3.resource("s3", region_name="us-east-1").Bucket(bucket_name).create()
+
+    storage = create_s3_storage(bucket_name, threads=4, region_name="us-east-1")
+    storage.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+    assert storage.get("example_project", "test.txt").read() == b"Hello World!"
+
+
+def test_create_s3_storage_releases_streamed_downloads(s3_mock):
+    bucket_name = str(uuid4())
+    boto3.resource("s3", region_name="us-east-1").Bucket(bucket_name).create()
+    metrics = PoolMetrics()
+    storage = create_s3_storage(
+        bucket_name, threads=4, pool_metrics=metrics, region_name="us-east-1"
+    )
+    storage.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+
+    body = storage.get("example_project", "test.txt")
+    assert metrics.snapshot()["s3"]["in_flight"] == 1
+
+    assert body.read(5) == b"Hello"
+    assert body.read() == b" World!"
+    body.close()
+    assert metrics.snapshot()["s3"]["in_flight"] == 0
+
+
+def test_pool_metrics_reports_pools_separately():
+    metrics = PoolMetrics()
+    dynamodb = boto3.client(
+        "dynamodb", region_name="us-east-1", config=client_config(threads=1)
+    )
+    s3 = boto3.client("s3", region_name="us-east-1", config=client_config(threads=8))
+    metrics.attach(dynamodb)
+    metrics.attach(s3)
+    metrics.attach(s3)
+
+    assert metrics.snapshot() == {
+        "dynamodb": {
+            "max_connections": 10,
+            "in_flight": 0,
+            "peak": 0,
+            "calls": 0,
+            "saturated": 0,
+        },
+        "s3": {
+            "max_connections": 16,
+            "in_flight": 0,
+            "peak": 0,
+            "calls": 0,
+            "saturated": 0,
+        },
+        "s3-2": {
+            "max_connections": 16,
+            "in_flight": 0,
+            "peak": 0,
+            "calls": 0,
+            "saturated": 0,
+        },
+    }
+
+
+def test_pool_metrics_counts_saturated_calls():
+    metrics = PoolMetrics()
+    client = boto3.client(
+        "dynamodb", region_name="us-east-1", config=Config(max_pool_connections=1)
+    )
+    metrics.attach(client)
+    other = boto3.client("s3", region_name="us-east-1")
+    metrics.attach(other)
+
+    pool, other_pool = metrics._pools["dynamodb"], metrics._pools["s3"]
+    metrics._before_call(pool)
+    metrics._before_call(pool)
+    metrics._after_call(pool)
+    metrics._after_call(pool)
+
+    assert metrics.snapshot()["dynamodb"] == {
+        "max_connections": 1,
+        "in_flight": 0,
+        "peak": 2,
+        "calls": 2,
+        "saturated": 1,
+    }
+    assert other_pool.calls == 0
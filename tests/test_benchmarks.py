@@ -0,0 +1,17 @@
+from argparse import Namespace
+
+from benchmarks import bench_simple_api
+
+
+def test_bench_simple_api_runs_all_scenarios():
+    results = bench_simple_api.run(
+        Namespace(projects=2, versions=2, files=1, requests=2, dynamodb="moto")
+    )
+
+    assert set(results) == {
+        "/simple/",
+        "/simple/<project>/",
+        "/packages/<project>/<file>",
+        "upload",
+    }
+    assert results["/simple/<project>/"]["db_calls_per_request"] > 0
@@ -0,0 +1,39 @@
+from warehouse14.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LRUCache()
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_lru_cache_expires_entries_after_ttl():
+    now = [0.0]
+    cache = LRUCache(ttl=10, timer=lambda: now[0])
+    cache.set("a", 1)
+
+    now[0] = 9.9
+    assert cache.get("a") == 1
+
+    now[0] = 10
+    assert cache.get("a") is None
+    assert "a" not in cache
+    assert len(cache) == 0
@@ -0,0 +1,146 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import BinaryIO
+
+import pytest
+
+from warehouse14.storage import PackageStorage, SimpleFileStorage
+from warehouse14.storage_cache import CachedStorage
+
+
+class CountingStorage(PackageStorage):
+    def __init__(self, storage: PackageStorage):
+        self._storage = storage
+        self.gets = 0
+        self._lock = threading.Lock()
+
+    def add(self, project: str, file: str, data: BinaryIO):
+        self._storage.add(project, file, data)
+
+    def get(self, project: str, file: str) -> BinaryIO:
+        with self._lock:
+            self.gets += 1
+        return self._storage.get(project, file)
+
+    def delete(self, project: str, file: str):
+        self._storage.delete(project, file)
+
+
+def sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+@pytest.fixture
+def backing(tmpdir):
+    return CountingStorage(SimpleFileStorage(tmpdir / "backing", allow_overwrite=True))
+
+
+@pytest.fixture
+def cache_dir(tmpdir):
+    return tmpdir / "cache"
+
+
+def test_serves_hits_from_local_files(backing, cache_dir):
+    backing.add("project", "file.whl", BytesIO(b"content"))
+    cached = CachedStorage(backing, cache_dir)
+
+    assert cached.get("project", "file.whl").read() == b"content"
+    data = cached.get_with_digest("project", "file.whl", sha256(b"content"))
+
+    assert data.read() == b"content"
+    assert data.fileno() > 0
+    assert backing.gets == 1
+    assert (cached.hits, cached.misses) == (1, 1)
+
+
+def test_downloads_again_if_digest_changed(backing, cache_dir):
+    backing.add("project", "file.whl", BytesIO(b"old"))
+    cached = CachedStorage(backing, cache_dir)
+    cached.get_with_digest("project", "file.whl", sha256(b"old"))
+
+    backing.add("project", "file.whl", BytesIO(b"new"))
+    data = cached.get_with_digest("project", "file.whl", sha256(b"new"))
+
+    assert data.read() == b"new"
+    assert cached.get("project", "file.whl").read() == b"new"
+    assert backing.gets == 2
+    assert cached.size == 3
+
+
+def test_does_not_cache_files_differing_from_project(backing, cache_dir):
+    backing.add("project", "file.whl", BytesIO(b"content"))
+    cached = CachedStorage(backing, cache_dir)
+
+    data = cached.get_with_digest("project", "file.whl", sha256(b"other"))
+
+    assert data.read() == b"content"
+    assert cached.size == 0
+    assert list(cache_dir.visit(fil=lambda p: p.isfile())) == []
+
+
+def test_evicts_least_recently_used_files(backing, cache_dir):
+    for name in ["a", "b", "c"]:
+        backing.add("project", name, BytesIO(b"x" * 100))
+    cached = CachedStorage(backing, cache_dir, max_bytes=250)
+
+    cached.get("project", "a")
+    cached.get("project", "b")
+    cached.get("project", "a")
+    cached.get("project", "c")
+    backing.gets = 0
+
+    cached.get("project", "a")
+    cached.get("project", "c")
+    assert backing.gets == 0
+    cached.get("project", "b")
+    assert backing.gets == 1
+    assert cached.size == 200
+
+
+def test_does_not_cache_files_exceeding_the_budget(backing, cache_dir):
+    backing.add("project", "big.whl", BytesIO(b"x" * 100))
+    cached = CachedStorage(backing, cache_dir, max_bytes=50)
+
+    assert cached.get("project", "big.whl").read() == b"x" * 100
+    assert cached.size == 0
+
+
+def test_reuses_cache_directory_on_start(backing, cache_dir):
+    backing.add("project", "file.whl", BytesIO(b"content"))
+    CachedStorage(backing, cache_dir).get("project", "file.whl")
+
+    cached = CachedStorage(backing, cache_dir)
+    data = cached.get_with_digest("project", "file.whl", sha256(b"content"))
+
+    assert data.read() == b"content"
+    assert cached.size == 7
+    assert backing.gets == 1
+
+
+def test_add_and_delete_invalidate(backing, cache_dir):
+    cached = CachedStorage(backing, cache_dir)
+    cached.add("project", "file.whl", BytesIO(b"old"))
+    cached.get("project", "file.whl")
+
+    cached.add("project", "file.whl", BytesIO(b"new"))
+    assert cached.get("project", "file.whl").read() == b"new"
+
+    cached.delete("project", "file.whl")
+    with pytest.raises(FileNotFoundError):
+        cached.get("project", "file.whl")
+    assert cached.size == 0
+
+
+def test_concurrent_misses_download_once(backing, cache_dir):
+    backing.add("project", "file.whl", BytesIO(b"content"))
+    cached = CachedStorage(backing, cache_dir)
+
+    with ThreadPoolExecutor(8) as executor:
+        contents = list(
+            executor.map(lambda _: cached.get("project", "file.whl").read(), range(8))
+        )
+
+    assert contents == [b"content"] * 8
+    assert backing.gets == 1
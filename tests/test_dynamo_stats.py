@@ -0,0 +1,175 @@
+from contextvars import copy_context
+from uuid import uuid4
+
+import boto3
+from pytest import fixture
+
+from warehouse14 import Project
+from warehouse14.models import File, MembershipChange
+from warehouse14.repos_dynamo import DynamoDBBackend, create_table
+
+
+@fixture
+def db(table) -> DynamoDBBackend:
+    return DynamoDBBackend(table)
+
+
+def test_counts_calls_items_and_capacity(db):
+    db.project_save(Project(name="p1", public=True, admins=["user1"]))
+
+    stats = db.stats.total.as_dict()
+    assert stats["calls"]["TransactWriteItems"] == 1
+
+    # moto reports no consumed capacity for transactions
+    db.account_save("user1")
+
+    stats = db.stats.total.as_dict()
+    assert stats["write_units"] > 0
+
+    db.project_get("p1")
+
+    stats = db.stats.total.as_dict()
+    assert stats["calls"]["Query"] >= 1
+    assert stats["items"] >= 2
+    assert stats["read_units"] > 0
+
+
+def test_request_scope_only_counts_own_calls(db):
+    db.project_save(Project(name="p1", public=True))
+
+    def request():
+        stats = db.stats.start_request()
+        db.project_get("p1")
+        db.stats.end_request("project")
+        return stats
+
+    stats = copy_context().run(request)
+
+    assert stats.calls == {"Query": 1}
+    assert "BatchWriteItem" not in stats.calls
+    assert db.stats.as_dict()["endpoints"]["project"]["calls"] == {"Query": 1}
+
+
+def test_request_scope_includes_parallel_queries(db):
+    db.project_save(Project(name="p1", public=True))
+    db.project_save(Project(name="p2", public=True))
+
+    def request():
+        stats = db.stats.start_request()
+        db.project_get_many(["p1", "p2"])
+        db.stats.end_request()
+        return stats
+
+    stats = copy_context().run(request)
+
+    assert stats.calls == {"Query": 2}
+
+
+def test_endpoint_aggregates_sum_requests(db):
+    db.project_save(Project(name="p1", public=True))
+
+    for _ in range(3):
+        db.stats.start_request()
+        db.project_get("p1")
+        db.stats.end_request("project")
+
+    assert db.stats.as_dict()["endpoints"]["project"]["calls"] == {"Query": 3}
+
+
+def test_account_save_is_a_single_write(db):
+    db.account_save("user1")
+    stats = db.stats.start_request()
+
+    account = db.account_save("user1")
+    db.stats.end_request()
+
+    assert account.name == "user1"
+    assert stats.calls == {"UpdateItem": 1}
+
+
+def test_project_save_is_one_transaction_without_reload(db):
+    project = db.project_save(Project(name="p1", public=True, admins=["user1"]))
+    project.add_file("1.0", File(filename="p1-1.0.tar.gz", sha256_digest="x"))
+    stats = db.stats.start_request()
+
+    saved = db.project_save(project)
+    db.stats.end_request()
+
+    assert saved.revision == 2
+    assert stats.calls == {"Query": 1, "TransactWriteItems": 1}
+
+
+def test_user_search_only_loads_projects_of_the_page(db):
+    for name in ["p1", "p2", "p3", "p4"]:
+        db.project_save(Project(name=name, public=True))
+    db.project_save(Project(name="hidden"))
+    stats = db.stats.start_request()
+
+    page = db.project_search(user="user1", limit=2)
+    db.stats.end_request()
+
+    assert [p.name for p in page.projects] == ["p1", "p2"]
+    # one index query per principal, one query per project of the page
+    assert stats.calls == {"Query": 2 + 2}
+
+
+def test_members_update_is_one_transaction_across_projects(db):
+    db.project_save(Project(name="p1", admins=["user1"]))
+    db.project_save(Project(name="p2", admins=["user1"]))
+    stats = db.stats.start_request()
+
+    changed = db.project_members_update(
+        [
+            MembershipChange(project="p1", user="user2", role="member"),
+            MembershipChange(project="p2", user="user2", role="admin"),
+        ],
+        {"p1": 1, "p2": 1},
+    )
+    db.stats.end_request()
+
+    assert changed == ["p1", "p2"]
+    assert stats.calls == {"TransactWriteItems": 1}
+
+
+def test_backends_sharing_a_client_count_own_calls(table):
+    dynamodb = boto3.resource("dynamodb", region_name="us-east-1")
+    db1 = DynamoDBBackend(create_table(dynamodb, str(uuid4())))
+    db2 = DynamoDBBackend(dynamodb.Table(table.name))
+
+    db1.account_save("user1")
+    db2.project_get("p1")
+
+    assert db1.stats.total.calls == {"UpdateItem": 1}
+    assert db2.stats.total.calls == {"Query": 1}
+
+
+def test_user_search_reads_index_items_independent_of_project_count(db):
+    def read_first_page():
+        stats = db.stats.start_request()
+        page = db.project_search(user="user1", limit=2)
+        db.stats.end_request()
+        assert [p.name for p in page.projects] == ["a1", "a2"]
+        return stats.items
+
+    for name in ["a1", "a2", "a3"]:
+        db.project_save(Project(name=name, public=True))
+    for name in ["m1", "m2", "m3"]:
+        db.project_save(Project(name=name, members=["user1"]))
+    items = read_first_page()
+
+    for i in range(30):
+        db.project_save(Project(name=f"n{i}", public=True, members=["user1"]))
+
+    assert read_first_page() == items
+
+
+def test_account_get_or_create_of_existing_account_is_a_read(db):
+    db.account_get_or_create("user1")
+    stats = db.stats.start_request()
+
+    account = db.account_get_or_create("user1")
+    db.stats.end_request()
+
+    assert account.name == "user1"
+    assert stats.calls == {"GetItem": 1}
+    assert stats.write_units == 0
@@ -1,5 +1,13 @@
+import errno
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from pathlib import Path
 
+import pytest
+
+from warehouse14 import storage
 from warehouse14.storage import SimpleFileStorage
 
 
@@ -18,3 +26,133 @@ def test_round_trip(tmpdir):
 
     fs.delete("example_project", "test.txt")
     assert not (tmpdir / "example_project" / "test.txt").exists()
+
+
+def test_sharded_round_trip(tmpdir):
+    fs = SimpleFileStorage(tmpdir, shard_levels=2)
+
+    fs.add("example_project", "test.txt", BytesIO(b"Hello World!"))
+    assert not (tmpdir / "packages" / "example_project" / "test.txt").exists()
+    assert len(list(Path(tmpdir).rglob("test.txt"))) == 1
+
+    assert fs.get("example_project", "test.txt").read() == b"Hello World!"
+
+    fs.delete("example_project", "test.txt")
+    assert list(Path(tmpdir).rglob("test.txt")) == []
+
+
+def test_sharded_storage_finds_files_of_other_layouts(tmpdir):
+    SimpleFileStorage(tmpdir).add("example_project", "test.txt", BytesIO(b"flat"))
+    fs = SimpleFileStorage(tmpdir, shard_levels=1)
+
+    assert fs.get("example_project", "test.txt").read() == b"flat"
+    with pytest.raises(FileExistsError):
+        fs.add("example_project", "test.txt", BytesIO(b"sharded"))
+    with pytest.raises(FileNotFoundError):
+        fs.get("example_project", "missing.txt")
+
+
+def test_migrate_moves_files_to_configured_layout(tmpdir):
+    flat = SimpleFileStorage(tmpdir)
+    for i in range(10):
+        flat.add("example_project", f"test-{i}.txt", BytesIO(f"{i}".encode()))
+    flat.add("example_project", "dist/nested.txt", BytesIO(b"nested"))
+
+    fs = SimpleFileStorage(tmpdir, shard_levels=1)
+    assert fs.migrate() == 11
+    assert fs.migrate() == 0
+
+    project_dir = Path(tmpdir) / "packages" / "example_project"
+    assert all(len(p.name) == 2 for p in project_dir.iterdir())
+    assert fs.get("example_project", "test-3.txt").read() == b"3"
+    assert fs.get("example_project", "dist/nested.txt").read() == b"nested"
+
+    # and back to one directory per project
+    assert flat.migrate() == 11
+    assert sorted(p.name for p in project_dir.iterdir())[:2] == ["dist", "test-0.txt"]
+
+
+def test_concurrent_adds_store_one_complete_file(tmpdir):
+    fs = SimpleFileStorage(tmpdir)
+    barrier = threading.Barrier(8)
+
+    def add(i):
+        barrier.wait()
+        try:
+            fs.add("example_project", "test.txt", BytesIO(bytes([i]) * 100_000))
+            return i
+        except FileExistsError:
+            return None
+
+    with ThreadPoolExecutor(8) as executor:
+        winners = [i for i in executor.map(add, range(8)) if i is not None]
+
+    assert len(winners) == 1
+    assert fs.get("example_project", "test.txt").read() == bytes(winners) * 100_000
+    assert os.listdir(tmpdir / "packages" / "example_project") == ["test.txt"]
+
+
+def test_failed_add_leaves_no_file(tmpdir):
+    class BrokenStream:
+        def read(self, size=-1):
+            raise ConnectionError()
+
+    fs = SimpleFileStorage(tmpdir)
+
+    with pytest.raises(ConnectionError):
+        fs.add("example_project", "test.txt", BrokenStream())
+
+    assert os.listdir(tmpdir / "packages" / "example_project") == []
+
+
+def test_overwrite_replaces_file(tmpdir):
+    fs = SimpleFileStorage(tmpdir, allow_overwrite=True)
+
+    fs.add("example_project", "test.txt", BytesIO(b"first"))
+    fs.add("example_project", "test.txt", BytesIO(b"second"))
+
+    assert fs.get("example_project", "test.txt").read() == b"second"
+
+
+def test_add_without_hard_links_keeps_first_file(tmpdir, monkeypatch):
+    def link(src, dst):
+        raise PermissionError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", link)
+    fs = SimpleFileStorage(tmpdir)
+
+    fs.add("example_project", "test.txt", BytesIO(b"first"))
+    with pytest.raises(FileExistsError):
+        fs.add("example_project", "test.txt", BytesIO(b"second"))
+
+    assert fs.get("example_project", "test.txt").read() == b"first"
+
+
+def test_add_without_hard_links_or_noreplace_rename_keeps_first_file(
+    tmpdir, monkeypatch
+):
+    def link(src, dst):
+        raise PermissionError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", link)
+    monkeypatch.setattr(storage, "_rename_noreplace", lambda src, dst: False)
+    fs = SimpleFileStorage(tmpdir)
+
+    fs.add("example_project", "test.txt", BytesIO(b"first"))
+    with pytest.raises(FileExistsError):
+        fs.add("example_project", "test.txt", BytesIO(b"second"))
+
+    assert fs.get("example_project", "test.txt").read() == b"first"
+
+
+def test_add_fails_on_other_link_errors(tmpdir, monkeypatch):
+    def link(src, dst):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(os, "link", link)
+    fs = SimpleFileStorage(tmpdir)
+
+    with pytest.raises(OSError):
+        fs.add("example_project", "test.txt", BytesIO(b"first"))
+
+    assert os.listdir(tmpdir / "packages" / "example_project") == []
@@ -0,0 +1,86 @@
+import inspect
+from io import BytesIO
+
+from warehouse14.cache import LRUCache
+from warehouse14.metrics import Metrics, Histogram, MeteredStorage, MeteredDBBackend
+from warehouse14.repos import DBBackend
+from warehouse14.repos_dynamo import DynamoDBBackend
+from warehouse14.storage import SimpleFileStorage
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency", "Latency", ["route"], buckets=[0.1, 1])
+
+    histogram.observe(0.05, route="a")
+    histogram.observe(0.5, route="a")
+    histogram.observe(5, route="a")
+
+    assert histogram.render() == [
+        "# HELP latency Latency",
+        "# TYPE latency histogram",
+        'latency_bucket{route="a",le="0.1"} 1',
+        'latency_bucket{route="a",le="1.0"} 2',
+        'latency_bucket{route="a",le="+Inf"} 3',
+        'latency_sum{route="a"} 5.55',
+        'latency_count{route="a"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    metrics = Metrics(prefix="")
+    counter = metrics.counter("requests_total", "Requests", ["path"])
+
+    counter.inc(path='a"b')
+    counter.inc(2, path='a"b')
+
+    assert 'requests_total{path="a\\"b"} 3.0' in metrics.render()
+
+
+def test_reports_cache_hits_and_misses():
+    metrics = Metrics()
+    cache = LRUCache()
+    metrics.register_cache("readme", cache)
+
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    text = metrics.render()
+    assert 'warehouse14_cache_hits_total{cache="readme"} 1.0' in text
+    assert 'warehouse14_cache_misses_total{cache="readme"} 1.0' in text
+
+
+def test_metered_storage_counts_bytes(tmpdir):
+    metrics = Metrics()
+    storage = MeteredStorage(SimpleFileStorage(tmpdir), metrics)
+
+    storage.add("p1", "f1", BytesIO(b"12345"))
+    with storage.get("p1", "f1") as f:
+        assert f.read() == b"12345"
+
+    bytes_in = metrics.storage_bytes.value(backend="SimpleFileStorage", direction="in")
+    bytes_out = metrics.storage_bytes.value(
+        backend="SimpleFileStorage", direction="out"
+    )
+    assert bytes_in == 5
+    assert bytes_out == 5
+
+
+def test_metered_db_measures_calls(table):
+    metrics = Metrics()
+    db = MeteredDBBackend(DynamoDBBackend(table), metrics)
+
+    db.account_get("user1")
+    db.project_get("p1")
+    db.project_get("p2")
+
+    assert metrics.db_latency.count(method="account_get") == 1
+    assert metrics.db_latency.count(method="project_get") == 2
+
+
+def test_metered_db_keeps_signatures_and_docstrings():
+    method = MeteredDBBackend.project_search
+
+    assert method.__name__ == "project_search"
+    assert "cursor" in inspect.signature(method).parameters
+    assert method.__doc__ == DBBackend.project_search.__doc__
@@ -0,0 +1,110 @@
+from warehouse14.models import Project, Version, ProjectRecord, File
+
+
+def given_project(*versions):
+    return Project(name="pkg", versions={v: Version(version=v) for v in versions})
+
+
+def test_latest_version_none_without_versions():
+    assert given_project().latest_version is None
+
+
+def test_latest_version_compares_pep440_versions():
+    project = given_project("1.9", "1.10", "1.2")
+
+    assert project.latest_version.version == "1.10"
+
+
+def test_latest_version_skips_pre_releases():
+    project = given_project("1.0", "1.1rc1", "1.1.dev3")
+
+    assert project.latest_version.version == "1.0"
+
+
+def test_latest_version_falls_back_to_pre_release():
+    project = given_project("1.1a1", "1.1rc1")
+
+    assert project.latest_version.version == "1.1rc1"
+
+
+def test_latest_version_sorts_invalid_versions_first():
+    project = given_project("not-a-version", "0.1")
+
+    assert project.latest_version.version == "0.1"
+
+
+def test_latest_version_reflects_added_version():
+    project = given_project("1.0")
+    assert project.latest_version.version == "1.0"
+
+    project.versions["2.0"] = Version(version="2.0")
+
+    assert project.latest_version.version == "2.0"
+
+
+def test_sorted_versions():
+    project = given_project("1.10", "1.0", "1.9", "1.10rc1")
+
+    assert [v.version for v in project.sorted_versions] == [
+        "1.0",
+        "1.9",
+        "1.10rc1",
+        "1.10",
+    ]
+
+
+def test_project_record_round_trip():
+    project = Project(
+        name="pkg",
+        admins=["admin1", "admin0"],
+        members=["member1"],
+        groups=["group1"],
+        public=True,
+        versions={
+            "0.0.1": Version(
+                version="0.0.1",
+                metadata={"summary": "summary"},
+                files=[File(filename="pkg-0.0.1.tar.gz", sha256_digest="xxx")],
+            )
+        },
+    )
+
+    assert ProjectRecord.from_project(project).to_project() == project
+
+
+def test_project_record_visibility():
+    record = ProjectRecord(
+        name="pkg", public=False, admins=["admin1"], members=["member1"], versions={}
+    )
+
+    assert record.visible("admin1")
+    assert record.visible("member1")
+    assert not record.visible("user1")
+
+
+def test_project_visible_for_group_members():
+    project = Project(name="pkg", groups=["team1"])
+    record = ProjectRecord.from_project(project)
+
+    assert project.visible("user1", frozenset({"team0", "team1"}))
+    assert record.visible("user1", frozenset({"team0", "team1"}))
+    assert not project.visible("user1", frozenset({"team0"}))
+    assert not record.visible("user1", frozenset({"team0"}))
+
+
+def test_project_record_file_index():
+    record = ProjectRecord(
+        name="pkg",
+        public=True,
+        admins=[],
+        members=[],
+        versions={
+            "0.0.1": {
+                "version": "0.0.1",
+                "files": [{"filename": "pkg-0.0.1.tar.gz", "sha256_digest": "xxx"}],
+            }
+        },
+    )
+
+    assert record.get_file("pkg-0.0.1.tar.gz") == ("pkg-0.0.1.tar.gz", "xxx", "0.0.1")
+    assert record.get_file("pkg-0.0.2.tar.gz") is None
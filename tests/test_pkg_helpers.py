@@ -0,0 +1,25 @@
+import pytest
+
+from warehouse14.models import Project
+from warehouse14.pkg_helpers import normalize_pkgname, normalize_pkgname_for_url
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("friendly-bard", "friendly-bard"),
+        ("Friendly-Bard", "friendly-bard"),
+        ("FRIENDLY-BARD", "friendly-bard"),
+        ("friendly.bard", "friendly-bard"),
+        ("friendly_bard", "friendly-bard"),
+        ("friendly--bard", "friendly-bard"),
+        ("FrIeNdLy-._.-bArD", "friendly-bard"),
+    ],
+)
+def test_normalize_pkgname(name, expected):
+    assert normalize_pkgname(name) == expected
+    assert Project.normalize_name(name) == expected
+
+
+def test_normalize_pkgname_for_url():
+    assert normalize_pkgname_for_url("some pkg") == "some%20pkg"
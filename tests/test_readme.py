@@ -0,0 +1,65 @@
+from warehouse14 import readme
+from warehouse14.models import Version
+from warehouse14.readme import ReadmeCache
+
+
+def given_version(description, content_type="text/markdown", version="0.0.1"):
+    return Version(
+        version=version,
+        metadata={
+            "description": description,
+            "description_content_type": content_type,
+        },
+    )
+
+
+def count_renderings(monkeypatch):
+    calls = []
+    render = readme.render_readme
+
+    def counting_render(version):
+        calls.append(version.version)
+        return render(version)
+
+    monkeypatch.setattr(readme, "render_readme", counting_render)
+    return calls
+
+
+def test_render_markdown():
+    cache = ReadmeCache()
+
+    html = cache.render("pkg", given_version("# Title"))
+
+    assert "<h1>Title</h1>" in html
+
+
+def test_render_caches_result(monkeypatch):
+    calls = count_renderings(monkeypatch)
+    cache = ReadmeCache()
+
+    first = cache.render("pkg", given_version("# Title"))
+    second = cache.render("pkg", given_version("# Title"))
+
+    assert first == second
+    assert calls == ["0.0.1"]
+    assert cache.cache.hits == 1
+
+
+def test_render_again_after_description_changed(monkeypatch):
+    calls = count_renderings(monkeypatch)
+    cache = ReadmeCache()
+
+    cache.render("pkg", given_version("# Title"))
+    html = cache.render("pkg", given_version("# Other Title"))
+
+    assert "Other Title" in html
+    assert len(calls) == 2
+
+
+def test_render_caches_failed_rendering(monkeypatch):
+    calls = count_renderings(monkeypatch)
+    cache = ReadmeCache()
+
+    assert cache.render("pkg", given_version("`broken", "text/x-rst")) is None
+    assert cache.render("pkg", given_version("`broken", "text/x-rst")) is None
+    assert len(calls) == 1
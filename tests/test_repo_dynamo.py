@@ -4,8 +4,13 @@ import pytest
 from freezegun import freeze_time
 
 from tests.local_dynamodb import LocalDynamoDB
-from warehouse14.models import Version, File
-from warehouse14.repos import Project, DBBackend
+from warehouse14.models import Version, File, MembershipChange
+from warehouse14.repos import (
+    Project,
+    DBBackend,
+    ConcurrentModificationError,
+    InvalidCursorError,
+)
 from warehouse14.repos_dynamo import DynamoDBBackend, create_table
 
 
@@ -74,6 +79,22 @@ class DBBackendTestSuite:
 
         assert actual_user is None
 
+    def test_account_get_or_create_creates_account(self, imp: DBBackend):
+        actual_account = imp.account_get_or_create("userX")
+
+        assert actual_account.name == "userX"
+        assert actual_account.created == datetime.fromisoformat("2021-06-20 10:00:00")
+        assert imp.account_get("userX") == actual_account
+
+    def test_account_get_or_create_keeps_existing_account(self, imp: DBBackend):
+        with freeze_time("2021-06-20 09:00:00"):
+            imp.account_save("userX")
+
+        actual_account = imp.account_get_or_create("userX")
+
+        assert actual_account.created == datetime.fromisoformat("2021-06-20 09:00:00")
+        assert actual_account.updated == datetime.fromisoformat("2021-06-20 09:00:00")
+
     def test_account_token_list_returns_saved_token(self, imp: DBBackend):
         imp.account_save("userX")
         imp.account_token_add(
@@ -233,7 +254,7 @@ class DBBackendTestSuite:
         assert actual_project.members == ["member1"]
 
     def test_project_save_remove_admin_and_member(self, imp: DBBackend):
-        imp.project_save(
+        project = imp.project_save(
             Project(
                 name="projectX",
                 admins=["admin1"],
@@ -243,13 +264,119 @@ class DBBackendTestSuite:
             )
         )
 
-        actual_project = imp.project_save(
-            Project(name="projectX", admins=[], members=[], public=False, versions={})
-        )
+        project.admins = []
+        project.members = []
+        actual_project = imp.project_save(project)
 
         assert actual_project.admins == []
         assert actual_project.members == []
 
+    def test_project_save_add_and_remove_groups(self, imp: DBBackend):
+        actual_project = imp.project_save(
+            Project(name="projectX", admins=["admin1"], groups=["group1", "group2"])
+        )
+        assert sorted(actual_project.groups) == ["group1", "group2"]
+
+        actual_project.groups = ["group2"]
+        actual_project = imp.project_save(actual_project)
+        assert actual_project.groups == ["group2"]
+        assert actual_project.admins == ["admin1"]
+
+    def test_group_delete_removes_project_access(self, imp: DBBackend):
+        imp.group_create("group1", admins=["user1"])
+        imp.project_save(Project(name="projectX", groups=["group1"]))
+
+        imp.group_delete("group1")
+
+        assert imp.project_get("projectX").groups == []
+
+    def test_project_members_update_across_projects(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX", admins=["admin1"], members=["user1"]))
+        imp.project_save(Project(name="projectY", admins=["admin1"]))
+
+        changed = imp.project_members_update(
+            [
+                MembershipChange(project="projectX", user="user1", role="admin"),
+                MembershipChange(project="projectX", user="user2", role="member"),
+                MembershipChange(project="projectY", user="user1", role="member"),
+                MembershipChange(project="projectY", user="admin1", role="admin"),
+                MembershipChange(project="projectY", user="user3", role="member"),
+                MembershipChange(project="projectY", user="user3"),
+                MembershipChange(project="missing", user="user1", role="admin"),
+            ]
+        )
+
+        assert changed == ["projectx", "projecty"]
+        project_x = imp.project_get("projectX")
+        assert sorted(project_x.admins) == ["admin1", "user1"]
+        assert project_x.members == ["user2"]
+        project_y = imp.project_get("projectY")
+        assert project_y.admins == ["admin1"]
+        assert project_y.members == ["user1"]
+        assert imp.project_get("missing") is None
+
+    def test_project_members_update_rejects_stale_revisions(self, imp: DBBackend):
+        project_x = imp.project_save(Project(name="projectX", admins=["admin1"]))
+        project_y = imp.project_save(Project(name="projectY", admins=["admin1"]))
+        revisions = {"projectx": project_x.revision, "projecty": project_y.revision}
+
+        project_y.admins = ["admin2"]
+        imp.project_save(project_y)
+        changed = imp.project_members_update(
+            [
+                MembershipChange(project="projectX", user="user1", role="member"),
+                MembershipChange(project="projectY", user="user1", role="admin"),
+            ],
+            revisions,
+        )
+
+        assert changed == []
+        assert imp.project_get("projectX").members == []
+        assert imp.project_get("projectY").admins == ["admin2"]
+
+    def test_project_save_rejects_stale_revision(self, imp: DBBackend):
+        loaded = imp.project_save(Project(name="projectX", admins=["admin1"]))
+        stale = loaded.copy(deep=True)
+
+        loaded.members = ["user1"]
+        saved = imp.project_save(loaded)
+        stale.members = ["user2"]
+
+        assert saved.revision == 2
+        with pytest.raises(ConcurrentModificationError):
+            imp.project_save(stale)
+        assert imp.project_get("projectX").members == ["user1"]
+
+    def test_project_save_rejects_new_project_with_existing_name(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX", admins=["admin1"]))
+
+        with pytest.raises(ConcurrentModificationError):
+            imp.project_save(Project(name="projectX", admins=["admin2"]))
+        assert imp.project_get("projectX").admins == ["admin1"]
+
+    def test_project_members_update_invalidates_loaded_projects(self, imp: DBBackend):
+        loaded = imp.project_save(Project(name="projectX", admins=["admin1"]))
+
+        imp.project_members_update(
+            [MembershipChange(project="projectX", user="user1", role="member")]
+        )
+
+        loaded.public = True
+        with pytest.raises(ConcurrentModificationError):
+            imp.project_save(loaded)
+        assert imp.project_get("projectX").members == ["user1"]
+
+    def test_project_save_removes_versions(self, imp: DBBackend):
+        project = Project(name="projectX")
+        project.add_file("0.0.1", File(filename="a-0.0.1.tar.gz", sha256_digest="x"))
+        project.add_file("0.0.2", File(filename="a-0.0.2.tar.gz", sha256_digest="y"))
+        project = imp.project_save(project)
+
+        del project.versions["0.0.1"]
+        imp.project_save(project)
+
+        assert list(imp.project_get("projectX").versions) == ["0.0.2"]
+
     def test_project_save_with_version_and_file(self, imp: DBBackend):
         actual_project = imp.project_save(
             Project(
@@ -277,10 +404,213 @@ class DBBackendTestSuite:
 
         actual_projects = imp.project_list()
 
-        assert actual_projects == [Project(name="projectY"), Project(name="projectX")]
+        assert sorted(actual_projects, key=lambda p: p.name) == [
+            Project(name="projectX", revision=1),
+            Project(name="projectY", revision=1),
+        ]
+
+    def test_project_get_many_returns_projects_in_given_order(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX"))
+        imp.project_save(Project(name="projectY"))
+        imp.project_save(Project(name="projectZ"))
+
+        actual_projects = imp.project_get_many(["projectZ", "projectX"])
+
+        assert [p.name for p in actual_projects] == ["projectZ", "projectX"]
+
+    def test_project_get_many_skips_unknown_projects(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX"))
+
+        actual_projects = imp.project_get_many(["unknown", "projectX"])
+
+        assert [p.name for p in actual_projects] == ["projectX"]
+
+    def test_project_search_filters_by_name_and_summary(self, imp: DBBackend):
+        imp.project_save(Project(name="parserX"))
+        imp.project_save(
+            Project(
+                name="projectY",
+                versions={
+                    "0.0.1": Version(version="0.0.1", metadata={"summary": "A Parser"})
+                },
+            )
+        )
+        imp.project_save(Project(name="projectZ"))
+
+        page = imp.project_search(query="PARSER")
+
+        assert [p.name for p in page.projects] == ["parserX", "projectY"]
+        assert page.cursor is None
+
+    def test_project_search_filters_by_visibility(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX", public=True))
+        imp.project_save(Project(name="projectY", members=["userX"]))
+        imp.project_save(Project(name="projectZ"))
+
+        page = imp.project_search(user="userX")
+
+        assert [p.name for p in page.projects] == ["projectX", "projectY"]
+
+    def test_project_search_filters_by_group_visibility(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX", groups=["group1"]))
+        imp.project_save(Project(name="projectY", groups=["group2"]))
+
+        page = imp.project_search(user="userX", groups=frozenset({"group1"}))
+
+        assert [p.name for p in page.projects] == ["projectX"]
+
+    def test_project_search_pages_through_all_projects(self, imp: DBBackend):
+        for name in ["projectA", "projectB", "projectC", "projectD", "projectE"]:
+            imp.project_save(Project(name=name))
+
+        names = []
+        page = imp.project_search(limit=2)
+        names.extend(p.name for p in page.projects)
+        while page.cursor:
+            assert len(page.projects) == 2
+            page = imp.project_search(cursor=page.cursor, limit=2)
+            names.extend(p.name for p in page.projects)
+
+        assert sorted(names) == [
+            "projectA",
+            "projectB",
+            "projectC",
+            "projectD",
+            "projectE",
+        ]
+
+    def test_project_search_pages_through_matching_visible_projects(
+        self, imp: DBBackend
+    ):
+        imp.project_save(Project(name="parserA", public=True))
+        imp.project_save(Project(name="parserB", members=["userX"]))
+        imp.project_save(Project(name="parserC"))
+        imp.project_save(Project(name="projectD", public=True))
+        imp.project_save(Project(name="parserE", admins=["userX"]))
+
+        names = []
+        page = imp.project_search(query="parser", user="userX", limit=1)
+        names.extend(p.name for p in page.projects)
+        while page.cursor:
+            page = imp.project_search(
+                query="parser", user="userX", cursor=page.cursor, limit=1
+            )
+            names.extend(p.name for p in page.projects)
+
+        assert sorted(names) == ["parserA", "parserB", "parserE"]
+
+    def test_project_search_rejects_invalid_cursor(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX"))
+
+        for cursor in ["garbage", "-1", "eyJmb28iOiAxfQ=="]:
+            with pytest.raises(InvalidCursorError):
+                imp.project_search(cursor=cursor)
+            with pytest.raises(InvalidCursorError):
+                imp.project_search(user="userX", cursor=cursor)
+
+    def test_project_get_record_returns_lean_project(self, imp: DBBackend):
+        imp.project_save(
+            Project(
+                name="projectX",
+                admins=["admin1"],
+                members=["member1"],
+                versions={
+                    "0.0.1": Version(
+                        version="0.0.1",
+                        files=[File(filename="test.pkg", sha256_digest="xxx")],
+                    )
+                },
+            )
+        )
+
+        record = imp.project_get_record("projectX")
+
+        assert record.name == "projectX"
+        assert record.files == (("test.pkg", "xxx", "0.0.1"),)
+        assert record.visible("member1")
+        assert not record.visible("userX")
+        assert record.is_admin("admin1")
+
+    def test_project_get_record_returns_none_for_unknown_project(self, imp: DBBackend):
+        assert imp.project_get_record("projectX") is None
+
+    def test_project_list_records_returns_all_projects(self, imp: DBBackend):
+        imp.project_save(Project(name="projectX"))
+        imp.project_save(Project(name="projectY"))
+
+        records = imp.project_list_records()
+
+        assert sorted(r.name for r in records) == ["projectX", "projectY"]
 
 
 class TestDynamoDBBackend(DBBackendTestSuite):
     @pytest.fixture
     def imp(self, table):
         yield DynamoDBBackend(table)
+
+    def test_account_get_or_create_returns_concurrently_created_account(
+        self, imp, monkeypatch
+    ):
+        with freeze_time("2021-06-20 09:00:00"):
+            imp.account_save("userX")
+        account_get = imp.account_get
+        # the first read misses the account, created by a concurrent login
+        reads = []
+
+        def account_get_after_miss(user_id):
+            reads.append(user_id)
+            return account_get(user_id) if len(reads) > 1 else None
+
+        monkeypatch.setattr(imp, "account_get", account_get_after_miss)
+
+        actual_account = imp.account_get_or_create("userX")
+
+        assert actual_account.created == datetime.fromisoformat("2021-06-20 09:00:00")
+        assert len(reads) == 2
+
+    def test_project_search_matches_name_of_legacy_projects(self, imp, table):
+        # stored before the search attribute was introduced
+        table.put_item(
+            Item={
+                "pk": "project#legacy-parser",
+                "sk": "project#legacy-parser",
+                "name": "legacy-parser",
+                "versions": {
+                    "0.0.1": {
+                        "version": "0.0.1",
+                        "metadata": {"summary": "Summary"},
+                        "files": [],
+                    }
+                },
+            }
+        )
+
+        assert [p.name for p in imp.project_search(query="parser").projects] == [
+            "legacy-parser"
+        ]
+        assert imp.project_search(query="summary").projects == []
+
+        assert imp.backfill_search() == 1
+        assert imp.backfill_search() == 0
+
+        assert [p.name for p in imp.project_search(query="summary").projects] == [
+            "legacy-parser"
+        ]
+
+    def test_project_members_update_writes_large_batches_per_project(self, imp):
+        imp.project_save(Project(name="projectX", admins=["admin1"]))
+        imp.project_save(Project(name="projectY", admins=["admin1"]))
+        users = [f"user{i}" for i in range(60)]
+
+        changed = imp.project_members_update(
+            [
+                MembershipChange(project=project, user=user, role="member")
+                for project in ["projectX", "projectY"]
+                for user in users
+            ],
+            {"projectx": 1, "projecty": 1},
+        )
+
+        assert changed == ["projectx", "projecty"]
+        assert sorted(imp.project_get("projectX").members) == sorted(users)
+        assert sorted(imp.project_get("projectY").members) == sorted(users)
@@ -1,5 +1,7 @@
 from io import BytesIO
 
+import pytest
+
 from warehouse14.storage import S3Storage
 
 
@@ -16,3 +18,10 @@ def test_round_trip(bucket):
     # Delete file
     fs.delete("example_project", "test.txt")
     assert list(fs.list()) == []
+
+
+def test_get_missing_file_raises_key_error(bucket):
+    fs = S3Storage(bucket)
+
+    with pytest.raises(KeyError):
+        fs.get("example_project", "missing.txt")
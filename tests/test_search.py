@@ -0,0 +1,115 @@
+from warehouse14.models import Project, Version
+from warehouse14.search import SearchIndex
+
+
+def given_project(name, summary="", public=True, members=None, **metadata):
+    return Project(
+        name=name,
+        public=public,
+        members=members or [],
+        versions={
+            "0.0.1": Version(version="0.0.1", metadata={"summary": summary, **metadata})
+        },
+    )
+
+
+def test_search_finds_project_by_summary():
+    index = SearchIndex()
+    index.index_project(given_project("requests", "HTTP for Humans"))
+    index.index_project(given_project("flask", "A micro web framework"))
+
+    results = index.search("http", "user1")
+
+    assert [r.name for r in results] == ["requests"]
+    assert results[0].normalized_name == "requests"
+    assert results[0].version == "0.0.1"
+    assert results[0].summary == "HTTP for Humans"
+
+
+def test_search_matches_prefix_keywords_and_classifiers():
+    index = SearchIndex()
+    index.index_project(
+        given_project(
+            "pkg1", keywords=["parsing", "toml"], classifiers=["Topic :: Utilities"]
+        )
+    )
+
+    assert [r.name for r in index.search("pars", "user1")] == ["pkg1"]
+    assert [r.name for r in index.search("utilities", "user1")] == ["pkg1"]
+
+
+def test_search_ranks_name_matches_first():
+    index = SearchIndex()
+    index.index_project(given_project("other", description="a parser for parser"))
+    index.index_project(given_project("parser", "some tool"))
+
+    results = index.search("parser", "user1")
+
+    assert [r.name for r in results] == ["parser", "other"]
+
+
+def test_search_returns_one_result_per_project():
+    index = SearchIndex()
+    project = given_project("pkg1", "A parser")
+    project.versions["0.0.2"] = Version(
+        version="0.0.2", metadata={"summary": "A parser"}
+    )
+    index.index_project(project)
+
+    assert len(index.search("parser", "user1")) == 1
+
+
+def test_search_respects_visibility():
+    index = SearchIndex()
+    index.index_project(given_project("private1", "parser", public=False))
+    index.index_project(
+        given_project("member1", "parser", public=False, members=["user1"])
+    )
+
+    assert [r.name for r in index.search("parser", "user1")] == ["member1"]
+    assert index.search("parser", "user2") == []
+
+
+def test_index_project_replaces_previous_state():
+    index = SearchIndex()
+    index.index_project(given_project("pkg1", "parser"))
+    index.index_project(given_project("pkg1", "renderer"))
+
+    assert index.search("parser", "user1") == []
+    assert [r.name for r in index.search("renderer", "user1")] == ["pkg1"]
+
+
+def test_remove_project():
+    index = SearchIndex()
+    index.index_project(given_project("pkg_1", "parser"))
+
+    index.remove_project("pkg.1")
+
+    assert index.search("parser", "user1") == []
+
+
+def test_rebuild_replaces_index():
+    index = SearchIndex()
+    index.index_project(given_project("pkg1", "parser"))
+
+    index.rebuild([given_project("pkg2", "parser")])
+
+    assert [r.name for r in index.search("parser", "user1")] == ["pkg2"]
+
+
+def test_search_ignores_query_syntax():
+    index = SearchIndex()
+    index.index_project(given_project("pkg1", "parser"))
+
+    assert [r.name for r in index.search('"pars* -(', "user1")] == ["pkg1"]
+    assert index.search('" *', "user1") == []
+
+
+def test_search_finds_projects_of_users_groups():
+    index = SearchIndex()
+    project = given_project("pkg1", public=False)
+    project.groups = ["team1"]
+    index.index_project(project)
+
+    assert index.search("pkg1", "user1") == []
+    assert [r.name for r in index.search("pkg1", "user1", groups={"team1"})] == ["pkg1"]
@@ -4,16 +4,18 @@ import pypitoken
 import requests
 import requests_html
 from flask import Flask
+import pytest
 from pytest import fixture
 from wsgiadapter import WSGIAdapter
 
 import warehouse14
 from tests import PROJECT_BASE_PATH
 from warehouse14 import simple_api
-from warehouse14.models import Version, File, Project
+from warehouse14.models import Version, File, Project, MembershipChange
 from warehouse14.repos import DBBackend
 from warehouse14.repos_dynamo import DynamoDBBackend
 from warehouse14.storage import SimpleFileStorage
+from warehouse14.storage_cache import CachedStorage
 
 EXAMPLE_SHA256_URL = (
     "sha256=a591a6d40bf420404a011733cfb7b190d62c65bf0bcda32b57b277d9ad9f146e"
@@ -58,6 +60,20 @@ def given_account_exists_with_api_key(db: DBBackend):
     return account, api_key
 
 
+def given_restricted_api_key(db: DBBackend, project_names):
+    token = db.account_token_add(
+        user_id="userX", token_id="restricted-id", name="", key="sec"
+    )
+    api_key = pypitoken.Token.create(
+        domain="warehouse14",
+        identifier=token.id,
+        key=token.key,
+        prefix="wh14",
+    )
+    api_key.restrict(project_names=project_names)
+    return api_key.dump()
+
+
 def given_project_with_file(
     db, storage, public=False, admins=None, members=None, project_name="example-pkg"
 ) -> Project:
@@ -252,6 +268,28 @@ def test_project_page_denies_access_to_list_of_private_project(
     assert res.status_code == 401
 
 
+def test_repeated_requests_reuse_token_verification(
+    app, html_client, db, storage, monkeypatch
+):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+    resolved = []
+    resolve_token = db.resolve_token
+    monkeypatch.setattr(
+        db,
+        "resolve_token",
+        lambda token_id: resolved.append(token_id) or resolve_token(token_id),
+    )
+
+    for _ in range(3):
+        res = html_client.get(
+            "http://localhost/simple/example-pkg/", auth=("__token__", api_key)
+        )
+        assert res.status_code == 200
+
+    assert resolved == ["token-id"]
+
+
 def test_project_page_list_files_with_hash(app, html_client, db, storage):
     account, api_key = given_account_exists_with_api_key(db)
     given_project_with_file(db, storage, public=True)
@@ -332,6 +370,19 @@ def test_download_denies_access_to_file_of_private_project(
     assert res.status_code == 401
 
 
+def test_download_of_file_not_in_project(app, html_client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+    storage.add("example-pkg", "unlisted-0.0.1.tar.gz", BytesIO(EXAMBLE_FILE_CONTENT))
+
+    res = html_client.get(
+        "http://localhost/packages/example-pkg/unlisted-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+    )
+
+    assert res.status_code == 404
+
+
 def test_upload_to_admin_repo(app, html_client, db, storage):
     account, api_key = given_account_exists_with_api_key(db)
     db.project_save(
@@ -364,6 +415,109 @@ def test_upload_to_admin_repo(app, html_client, db, storage):
     assert res.status_code == 200, res.text
 
 
+def post_example_pkg(html_client, api_key):
+    with (PROJECT_BASE_PATH / "fixtures/mypkg/dist/example-pkg-0.0.1.tar.gz").open(
+        "rb"
+    ) as file:
+        return html_client.post(
+            "http://localhost/simple/",
+            auth=("__token__", api_key),
+            data={
+                ":action": "file_upload",
+                "protocol_version": "1",
+                "sha256_digest": "xxx",
+                "filetype": "sdist",
+                "pyversion": "source",
+                "metadata_version": "2.2",
+                "name": "example-pkg",
+                "version": "0.0.1",
+                "summary": "Example package to test file upload.",
+            },
+            files={"content": file},
+        )
+
+
+def given_concurrent_change(db, monkeypatch, change, times=1):
+    """Applies the change right after the upload loaded the project"""
+    project_get = db.project_get
+    calls = []
+
+    def project_get_and_change(name):
+        project = project_get(name)
+        if len(calls) < times:
+            calls.append(name)
+            change(project_get(name))
+        return project
+
+    monkeypatch.setattr(db, "project_get", project_get_and_change)
+
+
+def test_upload_retries_after_concurrent_change(
+    app, html_client, db, storage, monkeypatch
+):
+    account, api_key = given_account_exists_with_api_key(db)
+    db.project_save(Project(name="example-pkg", admins=[account.name]))
+
+    def upload_other_file(project):
+        project.add_file("0.0.1", File(filename="other.whl", sha256_digest="yyy"))
+        db.project_save(project)
+
+    given_concurrent_change(db, monkeypatch, upload_other_file)
+
+    res = post_example_pkg(html_client, api_key)
+
+    assert res.status_code == 200, res.text
+    project = db.project_get("example-pkg")
+    assert [f.filename for f in project.files] == [
+        "other.whl",
+        "example-pkg-0.0.1.tar.gz",
+    ]
+    assert project.versions["0.0.1"].summary == "Example package to test file upload."
+    assert storage.get("example-pkg", "example-pkg-0.0.1.tar.gz").read()
+
+
+def test_upload_conflicts_with_concurrent_upload_of_same_file(
+    app, html_client, db, storage, monkeypatch
+):
+    account, api_key = given_account_exists_with_api_key(db)
+    db.project_save(Project(name="example-pkg", admins=[account.name]))
+
+    def upload_same_file(project):
+        project.add_file(
+            "0.0.1", File(filename="example-pkg-0.0.1.tar.gz", sha256_digest="yyy")
+        )
+        db.project_save(project)
+
+    given_concurrent_change(db, monkeypatch, upload_same_file)
+
+    res = post_example_pkg(html_client, api_key)
+
+    assert res.status_code == 409, res.text
+    # the stored file is referenced by the concurrent upload
+    assert storage.get("example-pkg", "example-pkg-0.0.1.tar.gz").read()
+
+
+def test_upload_gives_up_on_constantly_changed_project(
+    app, html_client, db, storage, monkeypatch
+):
+    account, api_key = given_account_exists_with_api_key(db)
+    db.project_save(Project(name="example-pkg", admins=[account.name]))
+
+    def add_member(project):
+        db.project_members_update(
+            [MembershipChange(project=project.name, user="userY", role="member")]
+        )
+
+    given_concurrent_change(db, monkeypatch, add_member, times=100)
+
+    res = post_example_pkg(html_client, api_key)
+
+    assert res.status_code == 503, res.text
+    assert db.project_get("example-pkg").files == []
+    with pytest.raises(FileNotFoundError):
+        storage.get("example-pkg", "example-pkg-0.0.1.tar.gz")
+
+
 def test_upload_to_private_repo_denied(app, html_client, db, storage):
     account, api_key = given_account_exists_with_api_key(db)
     db.project_save(
@@ -431,3 +585,112 @@ def test_uploaded_package_shown_with_given_hash(app, html_client, db, storage):
     assert res.html.links == {
         "/packages/example-pkg/example-pkg-0.0.1.tar.gz#sha256=xxx"
     }
+
+
+def test_restricted_token_lists_only_allowed_projects(app, html_client, db, storage):
+    account, _ = given_account_exists_with_api_key(db)
+    api_key = given_restricted_api_key(db, ["example-pkg"])
+    given_project_with_file(db, storage, public=True)
+    given_project_with_file(db, storage, public=True, project_name="other-pkg")
+
+    res = html_client.get("http://localhost/simple/", auth=("__token__", api_key))
+
+    assert res.status_code == 200
+    assert res.html.links == {"example-pkg/"}
+
+
+def test_restricted_token_accesses_allowed_project(app, html_client, db, storage):
+    account, _ = given_account_exists_with_api_key(db)
+    api_key = given_restricted_api_key(db, ["example-pkg"])
+    given_project_with_file(db, storage, public=True)
+
+    page = html_client.get(
+        "http://localhost/simple/example-pkg/", auth=("__token__", api_key)
+    )
+    download = html_client.get(
+        "http://localhost/packages/example-pkg/example-pkg-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+    )
+
+    assert page.status_code == 200
+    assert download.status_code == 200
+
+
+def test_restricted_token_denies_other_projects(app, html_client, db, storage):
+    account, _ = given_account_exists_with_api_key(db)
+    api_key = given_restricted_api_key(db, ["example-pkg"])
+    given_project_with_file(db, storage, public=True, project_name="other-pkg")
+
+    page = html_client.get(
+        "http://localhost/simple/other-pkg/", auth=("__token__", api_key)
+    )
+    download = html_client.get(
+        "http://localhost/packages/other-pkg/example-pkg-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+    )
+
+    assert page.status_code == 403
+    assert download.status_code == 403
+
+
+def test_restricted_token_denies_upload_to_other_project(app, html_client, db, storage):
+    account, _ = given_account_exists_with_api_key(db)
+    api_key = given_restricted_api_key(db, ["example-pkg"])
+    db.project_save(Project(name="other-pkg", admins=[account.name]))
+
+    res = html_client.post(
+        "http://localhost/simple/",
+        auth=("__token__", api_key),
+        data={
+            ":action": "file_upload",
+            "protocol_version": "1",
+            "sha256_digest": "xxx",
+            "filetype": "sdist",
+            "name": "other-pkg",
+            "version": "0.0.1",
+            "summary": "Example package to test file upload.",
+        },
+        files={"content": ("other-pkg-0.0.1.tar.gz", b"data")},
+    )
+
+    assert res.status_code == 403, res.text
+    assert db.project_get("other-pkg").versions == {}
+
+
+def test_download_provides_file_of_group_project(app, html_client, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    db.group_create("team1", admins=[account.name])
+    project = given_project_with_file(db, storage, public=False)
+    project.groups = ["team1"]
+    db.project_save(project)
+
+    index = html_client.get("http://localhost/simple/", auth=("__token__", api_key))
+    res = html_client.get(
+        "http://localhost/packages/example-pkg/example-pkg-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+    )
+
+    assert index.html.links == {"example-pkg/"}
+    assert res.status_code == 200
+    assert res.content == EXAMBLE_FILE_CONTENT
+
+
+def test_download_served_from_cached_storage(db, storage, tmpdir):
+    cached = CachedStorage(storage, tmpdir / "cache")
+    app = Flask(warehouse14.__name__)
+    app.register_blueprint(simple_api.create_blueprint(db=db, storage=cached))
+    session = requests.Session()
+    session.mount("http://localhost", WSGIAdapter(app))
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+
+    responses = [
+        session.get(
+            "http://localhost/packages/example-pkg/example-pkg-0.0.1.tar.gz",
+            auth=("__token__", api_key),
+        )
+        for _ in range(2)
+    ]
+
+    assert [r.content for r in responses] == [EXAMBLE_FILE_CONTENT] * 2
+    assert (cached.hits, cached.misses) == (1, 1)
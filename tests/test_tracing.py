@@ -0,0 +1,120 @@
+from io import BytesIO
+
+from flask import Flask
+from pytest import fixture
+
+import warehouse14
+from tests.test_simple_api import (
+    given_account_exists_with_api_key,
+    given_project_with_file,
+)
+from warehouse14 import simple_api, Project
+from warehouse14.repos_dynamo import DynamoDBBackend
+from warehouse14.storage import SimpleFileStorage
+from warehouse14.tracing import (
+    InMemoryTracer,
+    NoopTracer,
+    TracingDBBackend,
+    TracingStorage,
+)
+
+
+@fixture
+def tracer():
+    return InMemoryTracer()
+
+
+@fixture
+def db(table, tracer):
+    return TracingDBBackend(DynamoDBBackend(table), tracer)
+
+
+@fixture
+def storage(tmpdir, tracer):
+    return TracingStorage(SimpleFileStorage(tmpdir), tracer)
+
+
+@fixture
+def client(db, storage, tracer):
+    app = Flask(warehouse14.__name__)
+    app.register_blueprint(
+        simple_api.create_blueprint(db=db, storage=storage, tracer=tracer)
+    )
+    return app.test_client()
+
+
+def test_noop_tracer_spans_are_context_managers():
+    with NoopTracer().start_span("any", key="value") as span:
+        span.set_attribute("key", "other")
+
+
+def test_spans_nest_within_current_span(tracer):
+    with tracer.start_span("outer"):
+        with tracer.start_span("inner", key="value"):
+            pass
+        with tracer.start_span("second"):
+            pass
+
+    (root,) = tracer.roots
+    assert root.name == "outer"
+    assert [child.name for child in root.children] == ["inner", "second"]
+    assert root.children[0].attributes == {"key": "value"}
+    assert root.duration >= root.children[0].duration
+
+
+def test_span_records_error(tracer):
+    try:
+        with tracer.start_span("failing"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+
+    assert tracer.roots[0].attributes["error"] == "ValueError('boom')"
+
+
+def test_db_and_storage_calls_are_traced(tracer, db, storage):
+    db.project_get("p1")
+    storage.add("p1", "f1", BytesIO(b"data"))
+
+    assert [span.name for span in tracer.roots] == ["db.project_get", "storage.add"]
+    assert tracer.roots[1].attributes == {"project": "p1", "file": "f1"}
+
+
+def test_parallel_db_calls_are_children_of_current_span(tracer, db):
+    db.project_save(Project(name="p1", public=True))
+    db.project_save(Project(name="p2", public=True))
+    tracer.clear()
+
+    with tracer.start_span("request"):
+        db.project_get_many(["p1", "p2"])
+
+    (get_many,) = tracer.find("db.project_get_many")
+    assert get_many.parent.name == "request"
+
+
+def test_download_shows_span_tree(client, tracer, db, storage):
+    account, api_key = given_account_exists_with_api_key(db)
+    given_project_with_file(db, storage, public=True)
+    tracer.clear()
+
+    # buffered, to send the whole body and close the response
+    res = client.get(
+        "/packages/example-pkg/example-pkg-0.0.1.tar.gz",
+        auth=("__token__", api_key),
+        buffered=True,
+    )
+    assert res.status_code == 200
+
+    (request,) = tracer.roots
+    assert request.name == "simple.server_static"
+    assert request.attributes["status"] == 200
+    assert [child.name for child in request.children] == [
+        "simple.verify_password",
+        "db.account_groups_list",
+        "db.project_get_record",
+        "storage.get",
+        "simple.send_file",
+    ]
+    assert request.duration is not None
+    assert all(span.duration is not None for span in request.children)
+    assert "db.account_token_list" in request.format()
@@ -1,32 +1,35 @@
 import datetime
 import secrets
+import time
 from collections import defaultdict
-from operator import attrgetter
 from typing import Optional, List
 from uuid import uuid4
 
 import pypitoken
-import readme_renderer.markdown
-import readme_renderer.rst
-import readme_renderer.txt
-from flask import Flask, render_template, redirect, url_for, abort, request, flash
+from flask import Flask, render_template, redirect, url_for, abort, request, flash, g
 from flask_login import LoginManager, login_required, current_user, logout_user
 from flaskext.markdown import Markdown
+from pydantic import ValidationError
 
 from warehouse14 import simple_api, group_routes
+from warehouse14.api_tokens import TokenCache
+from warehouse14.cache import LRUCache, UserGroupsCache
 from warehouse14.forms import CreateProjectForm, CreateAPITokenForm
 from warehouse14.login import OIDCAuthenticator, Authenticator, User
-from warehouse14.models import Project, Account, Token
-from warehouse14.repos import DBBackend
+from warehouse14.metrics import Metrics, MeteredDBBackend, MeteredStorage, CONTENT_TYPE
+from warehouse14.models import Project, Account, Token, MembershipChange
+from warehouse14.pkg_helpers import normalize_pkgname
+from warehouse14.readme import ReadmeCache
+from warehouse14.repos import ConcurrentModificationError, DBBackend, InvalidCursorError
+from warehouse14.search import SearchIndex, IndexingDBBackend
 from warehouse14.storage import SimpleFileStorage, PackageStorage
+from warehouse14.storage_cache import CachedStorage
+from warehouse14.tracing import Tracer, TracingDBBackend, TracingStorage
 
-_RENDERERS = {
-    None: readme_renderer.rst,  # Default if description_content_type is None
-    "": readme_renderer.rst,  # Default if description_content_type is None
-    "text/plain": readme_renderer.txt,
-    "text/x-rst": readme_renderer.rst,
-    "text/markdown": readme_renderer.markdown,
-}
+PROJECTS_PER_PAGE = 50
+
+# seconds a loaded account is reused by the web UI, before it is loaded again
+ACCOUNT_CACHE_TTL = 60
 
 
 def create_app(
@@ -37,6 +40,9 @@ def create_app(
     app_config: dict = None,
     restrict_project_creation: Optional[List[str]] = None,
     simple_api_allow_project_creation=False,
+    search_index: Optional[SearchIndex] = None,
+    metrics: Optional[Metrics] = None,
+    tracer: Optional[Tracer] = None,
     **kwargs,
 ):
     app = Flask(__name__)
@@ -49,24 +55,104 @@ def create_app(
     if kwargs:
         log.warning(f"Unused options passed {list(kwargs.keys())}")
 
+    if metrics:
+        if isinstance(storage, CachedStorage):
+            metrics.register_cache("storage", storage)
+        db = MeteredDBBackend(db, metrics)
+        storage = MeteredStorage(storage, metrics)
+
+    if tracer:
+        db = TracingDBBackend(db, tracer)
+        storage = TracingStorage(storage, tracer)
+
+    if search_index:
+        # update search index with every change
+        db = IndexingDBBackend(db, search_index)
+
+    # Log database usage per request, if supported by the backend
+    db_stats = getattr(db, "stats", None)
+    if db_stats is not None:
+
+        @app.before_request
+        def start_db_accounting():
+            g.db_stats = db_stats.start_request()
+
+        @app.teardown_request
+        def log_db_accounting(exc=None):
+            stats = db_stats.end_request(request.endpoint)
+            if stats is not None:
+                log.info(f"{request.method} {request.path} DynamoDB {stats}")
+
     # Setup Login and authentication
     login_manager = LoginManager(app)
 
+    account_cache = LRUCache(maxsize=1024, ttl=ACCOUNT_CACHE_TTL)
+    user_groups = UserGroupsCache(db, ttl=ACCOUNT_CACHE_TTL)
+
     @login_manager.user_loader
     def load_user(user_id):
         """Automatically creates a user for any OIDC login"""
-        _account = db.account_get(user_id)
+        _account = account_cache.get(user_id)
         if _account is None:
-            _account = db.account_save(user_id)
-        return User(_account) if _account else None
+            _account = db.account_get_or_create(user_id)
+            account_cache.set(user_id, _account)
+        return User(_account, user_groups.get(user_id)) if _account else None
 
     auth.init_app(app)
 
+    readme_cache = ReadmeCache()
+    token_cache = TokenCache()
+
     simple_blueprint = simple_api.create_blueprint(
-        db, storage, allow_project_creation=simple_api_allow_project_creation
+        db,
+        storage,
+        allow_project_creation=simple_api_allow_project_creation,
+        metrics=metrics,
+        tracer=tracer,
+        token_cache=token_cache,
+        user_groups=user_groups,
     )
     app.register_blueprint(simple_blueprint)
 
+    if metrics:
+        metrics.register_cache("readme", readme_cache.cache)
+        metrics.register_cache("account", account_cache)
+        metrics.register_cache("api_token", token_cache.cache)
+        metrics.register_cache("user_groups", user_groups.cache)
+        metrics.register_cache("normalize_pkgname", normalize_pkgname)
+        if db_stats is not None:
+            metrics.register_dynamodb_stats(db_stats)
+
+        @app.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response):
+            start = g.pop("request_start", None)
+            if start is not None:
+                endpoint = request.endpoint or "unknown"
+                metrics.request_latency.observe(
+                    time.perf_counter() - start,
+                    endpoint=endpoint,
+                    method=request.method,
+                )
+                metrics.requests.inc(
+                    endpoint=endpoint,
+                    method=request.method,
+                    status=response.status_code,
+                )
+            return response
+
+        @app.get("/metrics")
+        def show_metrics():
+            if metrics.bearer_token and not secrets.compare_digest(
+                request.headers.get("Authorization", ""),
+                f"Bearer {metrics.bearer_token}",
+            ):
+                return "Unauthorized", 401, {"WWW-Authenticate": "Bearer"}
+            return metrics.render(), 200, {"Content-Type": CONTENT_TYPE}
+
     def get_user_id():
         return current_user.account.name
 
@@ -79,6 +165,7 @@ def create_app(
     @app.route("/logout")
     @login_required
     def logout():
+        account_cache.pop(get_user_id())
         logout_user()
         return auth.logout()
 
@@ -143,6 +230,7 @@ def create_app(
     def account_token_delete():
         token_id = request.args.get("token_id")
         db.account_token_delete(get_user_id(), token_id)
+        token_cache.invalidate(token_id)
         return redirect(url_for("account"))
 
     group_routes.add_routes(app, db)
@@ -150,16 +238,38 @@ def create_app(
     @app.get("/projects")
     @login_required
     def list_projects():
-        own_projects = [
-            project for project in db.project_list() if project.visible(get_user_id())
-        ]
-        own_projects.sort(key=attrgetter("name"))
+        query = request.args.get("q", "").strip()
+        try:
+            page = db.project_search(
+                query=query or None,
+                user=get_user_id(),
+                cursor=request.args.get("cursor") or None,
+                limit=PROJECTS_PER_PAGE,
+                groups=current_user.groups,
+            )
+        except InvalidCursorError:
+            abort(400, "Invalid cursor")
         return render_template(
             "project/projects.html",
-            projects=own_projects,
+            projects=page.projects,
+            query=query,
+            next_cursor=page.cursor,
             show_create=check_project_creation_allowed(),
         )
 
+    if search_index:
+
+        @app.get("/search")
+        @login_required
+        def search():
+            query = request.args.get("q", "").strip()
+            results = (
+                search_index.search(query, get_user_id(), groups=current_user.groups)
+                if query
+                else []
+            )
+            return render_template("project/search.html", query=query, results=results)
+
     @app.get("/projects/<project_name>")
     @login_required
     def show_project(project_name):
@@ -173,9 +283,7 @@ def create_app(
             return render_template("project/project.html", project=project)
 
         metadata = latest_version.metadata
-        # Render description depending on the type (plain, rst, markdown)
-        renderer = _RENDERERS[latest_version.description_content_type]
-        readme = renderer.render(latest_version.description)
+        readme = readme_cache.render(project.name, latest_version)
 
         grouped_classifiers = defaultdict(list)
         for classifier in latest_version.classifiers:
@@ -213,14 +321,18 @@ def create_app(
 
         form = CreateProjectForm()
         if form.validate_on_submit():
-            project = db.project_save(
-                Project(
-                    name=form.name.data,
-                    admins=[get_user_id()],
-                    members=[],
-                    public=form.public.data,
+            try:
+                project = db.project_save(
+                    Project(
+                        name=form.name.data,
+                        admins=[get_user_id()],
+                        members=[],
+                        public=form.public.data,
+                    )
                 )
-            )
+            except ConcurrentModificationError:
+                flash(f"Project {form.name.data} already exists.")
+                return render_template("project/create_project.html", form=form)
 
             return redirect(
                 url_for("show_project", project_name=project.normalized_name())
@@ -243,7 +355,11 @@ def create_app(
             project.public = form.public.data
 
             # Save changes
-            db.project_save(project)
+            try:
+                db.project_save(project)
+            except ConcurrentModificationError:
+                flash("Project was changed meanwhile, please try again.")
+                return redirect(url_for("edit_project", project_name=project_name))
 
             return redirect(url_for("show_project", project_name=form.name.data))
         else:
@@ -272,21 +388,22 @@ def create_app(
 
         if new_user and new_role:
             # TODO check that user does not exist
-            if new_user in project.admins:
-                project.admins.remove(new_user)
-            if new_user in project.members:
-                project.members.remove(new_user)
+            if new_role not in ("admin", "member"):
+                flash("Invalid role chosen!")
+                return redirect(url_for("project_users", project_name=project_name))
 
             log.info(f"{project_name} {get_user_id()} added {new_user} as {new_role}")
-            if new_role == "admin":
-                project.admins.append(new_user)
-            elif new_role == "member":
-                project.members.append(new_user)
-            else:
-                flash("Invalid role chosen!")
+            change = MembershipChange(
+                project=project.name, user=new_user, role=new_role
+            )
+            change.apply(project)
 
             if len(project.admins) > 0:
-                db.project_save(project)
+                changed = db.project_members_update(
+                    [change], {project.normalized_name(): project.revision}
+                )
+                if not changed:
+                    flash("Project was changed meanwhile, please try again.")
             else:
                 flash("A project requires at least one admin.")
 
@@ -299,18 +416,101 @@ def create_app(
         if not project.is_admin(get_user_id()):
             abort(401, "You are not an admin, what are you doing here?")
 
-        if username in project.admins:
-            # Never delete the last admin!
-            if len(project.admins) > 1:
-                project.admins.remove(username)
+        # Never delete the last admin!
+        if project.admins == [username]:
+            flash("A project requires at least one admin.")
+        elif username in project.admins or username in project.members:
+            changed = db.project_members_update(
+                [MembershipChange(project=project.name, user=username)],
+                {project.normalized_name(): project.revision},
+            )
+            if not changed:
+                flash("Project was changed meanwhile, please try again.")
+
+        return redirect(url_for("project_users", project_name=project_name))
+
+    @app.post("/projects/<project_name>/groups")
+    @login_required
+    def project_groups_add(project_name):
+        project = db.project_get(project_name)
+        if not project.is_admin(get_user_id()):
+            abort(401, "You are not an admin, what are you doing here?")
+
+        group_name = request.form.get("group")
+        if group_name and group_name not in project.groups:
+            if db.group_get(group_name) is None:
+                flash(f"No group found with name {group_name}")
+                return redirect(url_for("project_users", project_name=project_name))
+
+            log.info(f"{project_name} {get_user_id()} added group {group_name}")
+            project.groups.append(group_name)
+            try:
                 db.project_save(project)
-            else:
-                flash("A project requires at least one admin.")
+            except ConcurrentModificationError:
+                flash("Project was changed meanwhile, please try again.")
 
-        if username in project.members:
-            project.members.remove(username)
-            db.project_save(project)
+        return redirect(url_for("project_users", project_name=project_name))
+
+    @app.get("/projects/<project_name>/groups/<group_name>/delete")
+    @login_required
+    def project_groups_remove(project_name, group_name):
+        project = db.project_get(project_name)
+        if not project.is_admin(get_user_id()):
+            abort(401, "You are not an admin, what are you doing here?")
+
+        if group_name in project.groups:
+            log.info(f"{project_name} {get_user_id()} removed group {group_name}")
+            project.groups.remove(group_name)
+            try:
+                db.project_save(project)
+            except ConcurrentModificationError:
+                flash("Project was changed meanwhile, please try again.")
 
         return redirect(url_for("project_users", project_name=project_name))
 
+    @app.post("/manage/projects/users")
+    @login_required
+    def project_users_bulk():
+        """
+        Changes roles of many users across projects within one request.
+
+        Expects `{"changes": [{"project": ..., "user": ..., "role": ...}]}`
+        with the roles "admin", "member" or `null`, which removes the user.
+
+        Changes are checked against the loaded projects and applied only to projects
+        unchanged since. Within one DynamoDB transaction (up to 100 written items),
+        either all changes are applied or none. Larger batches are applied per project.
+        Projects left unchanged are listed as `conflicts` with status 409.
+        """
+        try:
+            changes = [
+                MembershipChange(**change) for change in request.get_json()["changes"]
+            ]
+        except (KeyError, TypeError, ValidationError) as e:
+            abort(400, f"Invalid changes: {e}")
+
+        names = {Project.normalize_name(change.project) for change in changes}
+        projects = {p.normalized_name(): p for p in db.project_get_many(sorted(names))}
+        if missing := names - projects.keys():
+            abort(404, f"No projects found with names {sorted(missing)}")
+
+        user_id = get_user_id()
+        if not_admin := [n for n, p in projects.items() if not p.is_admin(user_id)]:
+            abort(401, f"You are not an admin of {sorted(not_admin)}")
+
+        for change in changes:
+            change.apply(projects[Project.normalize_name(change.project)])
+        if without_admin := [n for n, p in projects.items() if not p.admins]:
+            abort(
+                400, f"A project requires at least one admin: {sorted(without_admin)}"
+            )
+
+        log.info(f"{user_id} changed {len(changes)} roles of {sorted(names)}")
+        revisions = {name: project.revision for name, project in projects.items()}
+        changed = db.project_members_update(changes, revisions)
+        if conflicts := names - set(changed):
+            log.warning(f"{user_id} role changes conflicted for {sorted(conflicts)}")
+            return {"projects": changed, "conflicts": sorted(conflicts)}, 409
+        return {"projects": changed}
+
     return app
@@ -0,0 +1,127 @@
+"""
+Verified API tokens and their permissions
+
+Verifying a token means parsing the macaroon and computing its HMAC chain,
+CI systems send the same token with every request. Verified tokens are cached
+by a hash of the raw token, until the token expires or at most `TOKEN_CACHE_TTL`
+seconds, which bounds how long a token deleted on another worker stays valid.
+
+Restrictions of a token are parsed once into :class:`TokenPermissions`,
+which handlers check per request by set membership.
+"""
+
+import hashlib
+import time
+from typing import Callable, FrozenSet, NamedTuple, Optional, Tuple
+
+from pypitoken import (
+    Token,
+    ValidationError,
+    DateRestriction,
+    LegacyDateRestriction,
+    ProjectNamesRestriction,
+    LegacyProjectNamesRestriction,
+)
+
+from warehouse14.cache import LRUCache
+from warehouse14.pkg_helpers import normalize_pkgname
+
+TOKEN_CACHE_TTL = 60
+
+
+class TokenPermissions(NamedTuple):
+    # normalized names of the projects the token may access, None for all projects
+    projects: Optional[FrozenSet[str]] = None
+
+    def allows(self, project_name: str) -> bool:
+        return self.projects is None or normalize_pkgname(project_name) in self.projects
+
+
+class VerifiedToken(NamedTuple):
+    account_name: str
+    token: Token
+    permissions: TokenPermissions
+    # unix timestamp of the token's expiry, None if it does not expire
+    expires: Optional[float] = None
+
+
+def parse_restrictions(token: Token) -> Tuple[TokenPermissions, Optional[str]]:
+    """
+    Collects the restrictions of a token.
+
+    :raises ValidationError: if the project restrictions exclude each other
+    :return: permissions and a project name satisfying all project restrictions,
+     to verify the token with
+    """
+    project_names = None
+    for restriction in token.restrictions:
+        if isinstance(
+            restriction, (ProjectNamesRestriction, LegacyProjectNamesRestriction)
+        ):
+            names = set(restriction.project_names)
+            project_names = names if project_names is None else project_names & names
+
+    if project_names is None:
+        return TokenPermissions(), None
+    if not project_names:
+        raise ValidationError("Token restricted to disjoint sets of projects")
+
+    permissions = TokenPermissions(frozenset(map(normalize_pkgname, project_names)))
+    return permissions, min(project_names)
+
+
+def token_expiry(token: Token) -> Optional[float]:
+    expiry = None
+    for restriction in token.restrictions:
+        if isinstance(restriction, (DateRestriction, LegacyDateRestriction)):
+            if expiry is None or restriction.not_after < expiry:
+                expiry = restriction.not_after
+    return expiry
+
+
+class TokenCache:
+    def __init__(
+        self,
+        maxsize: int = 4096,
+        ttl: float = TOKEN_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        :param maxsize: number of cached tokens
+        :param ttl: seconds a verification is reused
+        :param clock: current unix timestamp,
+            token restrictions use unix timestamps as well
+        """
+        self.cache = LRUCache(maxsize=maxsize)
+        self.ttl = ttl
+        self._clock = clock
+
+    @staticmethod
+    def _key(raw_token: str) -> bytes:
+        return hashlib.sha256(raw_token.encode()).digest()
+
+    def get(self, raw_token: str) -> Optional[VerifiedToken]:
+        entry = self.cache.get(self._key(raw_token))
+        if entry is None:
+            return None
+
+        valid_until, verified = entry
+        if valid_until <= self._clock():
+            self.cache.pop(self._key(raw_token))
+            return None
+        return verified
+
+    def set(self, raw_token: str, verified: VerifiedToken):
+        """
+        Caches a successfully verified token, the entry expires with the token.
+        """
+        valid_until = self._clock() + self.ttl
+        if verified.expires is not None:
+            valid_until = min(valid_until, verified.expires)
+        self.cache.set(self._key(raw_token), (valid_until, verified))
+
+    def invalidate(self, token_id: str):
+        """
+        Drops cached verifications of a token, like after the token was deleted.
+        """
+        self.cache.pop_matching(lambda _, entry: entry[1].token.identifier == token_id)
@@ -0,0 +1,246 @@
+"""
+ASGI entry point for the simple API (PEP 503)
+
+Serves the same routes as the simple blueprint (index, project page, packages,
+upload) without Flask. Database calls run in a thread pool, downloads are streamed
+in chunks from an :class:`AsyncPackageStorage`, so slow clients hold a coroutine
+instead of a worker thread.
+
+Requires the `asgi` extra, run with e.g. `uvicorn --factory my_module:create`.
+"""
+
+import base64
+import binascii
+import logging
+from functools import wraps
+from pathlib import PurePath
+from typing import Optional, List
+from urllib.parse import quote
+
+from jinja2 import Environment, PackageLoader, select_autoescape
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Route
+
+from warehouse14.api_tokens import TokenCache
+from warehouse14.cache import UserGroupsCache
+from warehouse14.pkg_helpers import normalize_pkgname_for_url
+from warehouse14.repos import DBBackend
+from warehouse14.simple_api import (
+    verify_api_token,
+    index_links,
+    project_links,
+    process_upload,
+    UploadError,
+)
+from warehouse14.storage import PackageStorage
+from warehouse14.storage_async import AsyncStorageAdapter
+
+log = logging.getLogger(__name__)
+
+
+def create_asgi_app(
+    db: DBBackend,
+    storage: PackageStorage,
+    allow_project_creation: bool = False,
+    restrict_project_creation: Optional[List[str]] = None,
+    token_cache: Optional[TokenCache] = None,
+    user_groups: Optional[UserGroupsCache] = None,
+) -> Starlette:
+    async_storage = AsyncStorageAdapter(storage)
+    token_cache = token_cache or TokenCache()
+    user_groups = user_groups or UserGroupsCache(db)
+    templates = Environment(
+        loader=PackageLoader("warehouse14"), autoescape=select_autoescape()
+    )
+
+    def check_project_creation_allowed(username):
+        if not allow_project_creation:
+            return False
+
+        return (
+            restrict_project_creation is None or username in restrict_project_creation
+        )
+
+    def render_template(name: str, **context) -> HTMLResponse:
+        return HTMLResponse(templates.get_template(name).render(**context))
+
+    async def authenticate(request: Request) -> Optional[str]:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "basic":
+            return None
+
+        try:
+            username, _, password = (
+                base64.b64decode(credentials).decode().partition(":")
+            )
+        except (binascii.Error, UnicodeDecodeError):
+            return None
+
+        verified = await run_in_threadpool(
+            verify_api_token, db, username, password, token_cache
+        )
+        if verified is None:
+            return None
+
+        # Store token, permissions and groups of the account for the handlers
+        request.state.token = verified.token
+        request.state.permissions = verified.permissions
+        request.state.groups = await run_in_threadpool(
+            user_groups.get, verified.account_name
+        )
+        return verified.account_name
+
+    def forbidden(request: Request, project_name: str) -> Optional[Response]:
+        if not request.state.permissions.allows(project_name):
+            return PlainTextResponse(
+                "Token is restricted to other projects", status_code=403
+            )
+        return None
+
+    def login_required(endpoint):
+        @wraps(endpoint)
+        async def wrapper(request: Request) -> Response:
+            user_name = await authenticate(request)
+            if user_name is None:
+                return PlainTextResponse(
+                    "Unauthorized: please create an API token using your account page. "
+                    "Also check that you use '__token__' as username.",
+                    status_code=401,
+                    headers={
+                        "WWW-Authenticate": 'Basic realm="Authentication Required"'
+                    },
+                )
+
+            request.state.user_name = user_name
+            return await endpoint(request)
+
+        return wrapper
+
+    @login_required
+    async def simple_index(request: Request):
+        links = await run_in_threadpool(
+            index_links,
+            db,
+            request.state.user_name,
+            request.state.permissions,
+            request.state.groups,
+        )
+        return render_template("simple/simple.html", links=links)
+
+    @login_required
+    async def simple_packages(request: Request):
+        # PEP 503: require normalized project
+        project_name = request.path_params["project_name"]
+        normalized = normalize_pkgname_for_url(project_name)
+        if project_name != normalized:
+            log.info(f"Redirect to normalized project name url")
+            return RedirectResponse(f"/simple/{normalized}/", 301)
+
+        if response := forbidden(request, project_name):
+            return response
+        project = await run_in_threadpool(db.project_get_record, project_name)
+        if project is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        if not project.visible(request.state.user_name, request.state.groups):
+            return PlainTextResponse("Unauthorized", status_code=401)
+
+        links = project_links(project)
+        return render_template("simple/links.html", project=project_name, links=links)
+
+    @login_required
+    async def server_static(request: Request):
+        # PEP 503: require normalized project
+        project_name = request.path_params["project_name"]
+        filename = request.path_params["filename"]
+        normalized = normalize_pkgname_for_url(project_name)
+        if project_name != normalized:
+            log.info(f"Redirect to normalized project name url")
+            return RedirectResponse(f"/packages/{normalized}/{filename}", 301)
+
+        # Check access
+        if response := forbidden(request, normalized):
+            return response
+        project = await run_in_threadpool(db.project_get_record, normalized)
+        if project is None:
+            return PlainTextResponse("Not Found", status_code=404)
+        if not project.visible(request.state.user_name, request.state.groups):
+            return PlainTextResponse("Unauthorized", status_code=401)
+        entry = project.get_file(filename)
+        if entry is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        # serve file
+        log.info(f"Provide file {filename}")
+        try:
+            chunks = await async_storage.open(
+                normalized, filename, sha256_digest=entry.sha256_digest
+            )
+        except (FileNotFoundError, KeyError):
+            return PlainTextResponse("Not Found", status_code=404)
+
+        return StreamingResponse(
+            chunks,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": content_disposition(filename)},
+        )
+
+    @login_required
+    async def upload(request: Request):
+        form = await request.form()
+        try:
+            # a content field sent as text is no upload content
+            file = form.get("content")
+            await run_in_threadpool(
+                process_upload,
+                db,
+                storage,
+                username=request.state.user_name,
+                form=form,
+                content=(
+                    (file.filename, file.file) if isinstance(file, UploadFile) else None
+                ),
+                allow_project_creation=check_project_creation_allowed,
+                permissions=request.state.permissions,
+            )
+        except UploadError as e:
+            return PlainTextResponse(e.message, status_code=e.status)
+        finally:
+            await form.close()
+
+        return JSONResponse({"upload": "successfully"})
+
+    return Starlette(
+        routes=[
+            Route("/simple/", simple_index, methods=["GET"]),
+            Route("/simple/", upload, methods=["POST"]),
+            Route("/simple/{project_name}/", simple_packages, methods=["GET"]),
+            Route(
+                "/packages/{project_name}/{filename:path}",
+                server_static,
+                methods=["GET"],
+            ),
+        ]
+    )
+
+
+def content_disposition(filename: str) -> str:
+    """
+    Content-Disposition header value to download a file under its base name
+    """
+    name = PurePath(filename).name
+    quoted = quote(name)
+    if quoted != name:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{name}"'
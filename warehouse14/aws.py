@@ -0,0 +1,198 @@
+"""
+Factories for the AWS backed implementations,
+with a boto3 configuration sized for threaded workers.
+
+boto3 defaults to 10 pooled connections per client, legacy retries
+and 60 second timeouts.
+With more worker threads than pooled connections, requests queue for a connection
+("Connection pool is full" warnings) and slow calls block a worker for a minute.
+
+Requires the `aws` extra.
+"""
+
+import threading
+from functools import partial
+from typing import Dict, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.response import StreamingBody
+
+from warehouse14.repos_dynamo import DynamoDBBackend, create_table
+from warehouse14.storage import S3Storage
+
+# Parallel calls a single worker thread may issue (e.g. `project_get_many`)
+CONNECTIONS_PER_THREAD = 2
+
+
+def client_config(
+    threads: int = 10,
+    connect_timeout: float = 2,
+    read_timeout: float = 10,
+    max_attempts: int = 5,
+) -> Config:
+    """
+    :param threads: number of worker threads sharing the client
+    :param connect_timeout: seconds to establish a connection
+    :param read_timeout: seconds to wait for a response, per attempt
+    :param max_attempts: attempts including the initial call, with adaptive retry mode
+    """
+    return Config(
+        max_pool_connections=max(10, threads * CONNECTIONS_PER_THREAD),
+        tcp_keepalive=True,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={"mode": "adaptive", "max_attempts": max_attempts},
+    )
+
+
+class _PoolStats:
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+        self.saturated = 0
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class PoolMetrics:
+    """
+    Tracks in-flight calls of boto3 clients compared to their connection pool size.
+
+    A call started while all connections of its client are in use has to wait
+    for a free connection, those calls are counted as `saturated`.
+    Every client has its own pool and is reported separately.
+
+    Streamed response bodies, like the body of an S3 `GetObject`, keep their
+    connection until they are read to the end or closed. Their calls are in flight
+    until then.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools: Dict[str, _PoolStats] = {}
+
+    def attach(self, client, name: Optional[str] = None):
+        """
+        Register on the events of a boto3 client.
+
+        :param name: name of the pool in the snapshot, defaults to the service name
+            of the client, with a number appended if it is taken already
+        """
+        name = name or client.meta.service_model.service_name
+        with self._lock:
+            unique_name, i = name, 1
+            while unique_name in self._pools:
+                i += 1
+                unique_name = f"{name}-{i}"
+            pool = _PoolStats(client.meta.config.max_pool_connections)
+            self._pools[unique_name] = pool
+
+        events = client.meta.events
+        events.register("before-call", partial(self._before_call, pool))
+        events.register("after-call", partial(self._after_call, pool))
+        events.register("after-call-error", partial(self._release, pool))
+
+    def _before_call(self, pool: _PoolStats, **kwargs):
+        with self._lock:
+            if pool.in_flight >= pool.max_connections:
+                pool.saturated += 1
+            pool.in_flight += 1
+            pool.calls += 1
+            pool.peak = max(pool.peak, pool.in_flight)
+
+    def _after_call(self, pool: _PoolStats, parsed=None, **kwargs):
+        body = (parsed or {}).get("Body")
+        if isinstance(body, StreamingBody):
+            self._release_with(pool, body)
+        else:
+            self._release(pool)
+
+    def _release(self, pool: _PoolStats, **kwargs):
+        with self._lock:
+            pool.in_flight -= 1
+
+    def _release_with(self, pool: _PoolStats, body: StreamingBody):
+        """
+        Releases the call, once the body is read to the end or closed.
+        """
+        read, close = body.read, body.close
+        released = []
+
+        def release():
+            with self._lock:
+                if not released:
+                    released.append(True)
+                    pool.in_flight -= 1
+
+        def tracked_read(amt=None):
+            chunk = read(amt)
+            if amt is None or not chunk:
+                release()
+            return chunk
+
+        def tracked_close():
+            close()
+            release()
+
+        body.read = tracked_read
+        body.close = tracked_close
+
+    def snapshot(self) -> Dict[str, dict]:
+        """
+        :return: statistics by pool name
+        """
+        with self._lock:
+            return {name: pool.as_dict() for name, pool in self._pools.items()}
+
+
+def create_dynamodb_backend(
+    table_name: str,
+    threads: int = 10,
+    create_if_missing: bool = False,
+    session: Optional[boto3.Session] = None,
+    pool_metrics: Optional[PoolMetrics] = None,
+    **resource_kwargs,
+) -> DynamoDBBackend:
+    """
+    :param threads: number of worker threads sharing the backend
+    :param create_if_missing: create the table, if it does not exist
+    :param resource_kwargs: passed to `session.resource`,
+        like `region_name` or `endpoint_url`
+    """
+    session = session or boto3.Session()
+    dynamodb = session.resource(
+        "dynamodb", config=client_config(threads), **resource_kwargs
+    )
+    if pool_metrics:
+        pool_metrics.attach(dynamodb.meta.client)
+
+    if create_if_missing:
+        table = create_table(dynamodb, table_name)
+    else:
+        table = dynamodb.Table(table_name)
+    return DynamoDBBackend(table)
+
+
+def create_s3_storage(
+    bucket_name: str,
+    threads: int = 10,
+    allow_overwrite: bool = False,
+    session: Optional[boto3.Session] = None,
+    pool_metrics: Optional[PoolMetrics] = None,
+    **resource_kwargs,
+) -> S3Storage:
+    """
+    :param threads: number of worker threads sharing the storage
+    :param resource_kwargs: passed to `session.resource`,
+        like `region_name` or `endpoint_url`
+    """
+    session = session or boto3.Session()
+    s3 = session.resource("s3", config=client_config(threads), **resource_kwargs)
+    if pool_metrics:
+        pool_metrics.attach(s3.meta.client)
+
+    return S3Storage(s3.Bucket(bucket_name), allow_overwrite=allow_overwrite)
@@ -0,0 +1,116 @@
+"""
+In-process caches shared by the web app and the simple API
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, FrozenSet, Hashable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from warehouse14.repos import DBBackend
+
+
+class LRUCache:
+    """
+    Thread safe mapping with a bounded size, evicting the least recently used entries.
+
+    With a `ttl`, entries expire that many seconds after they were set.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: Optional[float] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (expiry, value)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer = timer
+
+    def _lookup(self, key: Hashable):
+        # requires lock
+        expires, value = self._data[key]
+        if expires is not None and expires <= self._timer():
+            del self._data[key]
+            raise KeyError(key)
+        return value
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        with self._lock:
+            try:
+                value = self._lookup(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        expires = None if self.ttl is None else self._timer() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]:
+        with self._lock:
+            try:
+                value = self._lookup(key)
+            except KeyError:
+                return default
+            del self._data[key]
+            return value
+
+    def pop_matching(self, predicate: Callable[[Hashable, Any], bool]) -> int:
+        """
+        Removes all entries, for which the predicate of key and value is true.
+
+        :return: number of removed entries
+        """
+        with self._lock:
+            keys = [k for k, (_, v) in self._data.items() if predicate(k, v)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            try:
+                self._lookup(key)
+                return True
+            except KeyError:
+                return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class UserGroupsCache:
+    """
+    Groups of users, loaded once and reused for `ttl` seconds.
+    """
+
+    def __init__(self, db: "DBBackend", maxsize: int = 4096, ttl: float = 60):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._db = db
+
+    def get(self, user_id: str) -> FrozenSet[str]:
+        groups = self.cache.get(user_id)
+        if groups is None:
+            groups = frozenset(self._db.account_groups_list(user_id))
+            self.cache.set(user_id, groups)
+        return groups
@@ -1,6 +1,6 @@
 import urllib
 from abc import ABCMeta, abstractmethod
-from typing import Dict
+from typing import Dict, FrozenSet
 from urllib.parse import urlencode
 
 import flask_login
@@ -13,8 +13,9 @@ from warehouse14.models import Account
 
 
 class User(UserMixin):
-    def __init__(self, account: Account):
+    def __init__(self, account: Account, groups: FrozenSet[str] = frozenset()):
         self.account = account
+        self.groups = groups
 
     def get_id(self):
         return self.account.name
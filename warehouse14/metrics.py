@@ -0,0 +1,368 @@
+"""
+Prometheus metrics of the web app and the simple API
+
+Minimal implementation of counters and histograms rendered in the Prometheus
+text format, so the metrics endpoint needs no additional dependency.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, BinaryIO
+
+from warehouse14.repos import DBBackend, DBBackendProxy
+from warehouse14.storage import PackageStorage
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return f"{{{pairs}}}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> (count per bucket, sum)
+        self._values: Dict[Labels, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._key(labels), ([], 0.0))
+            return sum(counts)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted((key, (list(c), s)) for key, (c, s) in self._values.items())
+
+        names = self.label_names + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class CallbackCounter(Metric):
+    """
+    Counter read at collection time, for values counted elsewhere, like cache hits.
+    """
+
+    type = "counter"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+    ):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for key, value in self._collect():
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}{labels} {_format_value(value)}"
+
+
+class Metrics:
+    """
+    Metrics of one app, pass to `create_app` to expose them at `/metrics`.
+    """
+
+    def __init__(self, prefix: str = "warehouse14", bearer_token: Optional[str] = None):
+        """
+        :param prefix: prefix of all metric names
+        :param bearer_token: required by `/metrics` as `Authorization: Bearer <token>`,
+            without it the endpoint is public
+        """
+        self.prefix = prefix
+        self.bearer_token = bearer_token
+        self._metrics: List[Metric] = []
+        self._caches: Dict[str, object] = {}
+
+        self.request_latency = self.histogram(
+            "http_request_duration_seconds",
+            "Latency of HTTP requests",
+            ["endpoint", "method"],
+        )
+        self.requests = self.counter(
+            "http_requests_total",
+            "HTTP requests by response status",
+            ["endpoint", "method", "status"],
+        )
+        self.token_verification = self.histogram(
+            "token_verification_duration_seconds",
+            "Time to verify API tokens",
+            ["result"],
+        )
+        self.db_latency = self.histogram(
+            "db_call_duration_seconds", "Latency of database calls", ["method"]
+        )
+        self.storage_bytes = self.counter(
+            "storage_bytes_total",
+            "Bytes served from and uploaded to the package storage",
+            ["backend", "direction"],
+        )
+        self.register(
+            CallbackCounter(
+                self._name("cache_hits_total"),
+                "Cache hits",
+                ["cache"],
+                lambda: self._collect_caches("hits"),
+            )
+        )
+        self.register(
+            CallbackCounter(
+                self._name("cache_misses_total"),
+                "Cache misses",
+                ["cache"],
+                lambda: self._collect_caches("misses"),
+            )
+        )
+
+    def _name(self, name: str) -> str:
+        return f"{self.prefix}_{name}" if self.prefix else name
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.register(Counter(self._name(name), documentation, labels))
+
+    def histogram(
+        self, name: str, documentation: str, labels=(), **kwargs
+    ) -> Histogram:
+        return self.register(
+            Histogram(self._name(name), documentation, labels, **kwargs)
+        )
+
+    def register_cache(self, name: str, cache):
+        """
+        Reports hits and misses of a cache.
+
+        :param cache: :class:`LRUCache`,
+            or a function decorated with `functools.lru_cache`
+        """
+        self._caches[name] = cache
+
+    def register_dynamodb_stats(self, stats):
+        """
+        Reports the totals of :class:`warehouse14.repos_dynamo.DynamoDBStats`.
+        """
+
+        def calls():
+            for operation, count in sorted(stats.total.as_dict()["calls"].items()):
+                yield (operation,), count
+
+        def capacity():
+            total = stats.total.as_dict()
+            yield ("read",), total["read_units"]
+            yield ("write",), total["write_units"]
+
+        self.register(
+            CallbackCounter(
+                self._name("dynamodb_calls_total"),
+                "DynamoDB calls by operation",
+                ["operation"],
+                calls,
+            )
+        )
+        self.register(
+            CallbackCounter(
+                self._name("dynamodb_capacity_units_total"),
+                "Consumed DynamoDB capacity units",
+                ["kind"],
+                capacity,
+            )
+        )
+
+    def _collect_caches(self, attribute: str) -> Iterable[Tuple[Labels, float]]:
+        for name, cache in sorted(self._caches.items()):
+            if hasattr(cache, "cache_info"):
+                value = getattr(cache.cache_info(), attribute)
+            else:
+                value = getattr(cache, attribute)
+            yield (name,), value
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+@DBBackendProxy.wrap_calls
+class MeteredDBBackend(DBBackendProxy):
+    """
+    Measures the latency of every database call.
+    """
+
+    def __init__(self, db: DBBackend, metrics: Metrics):
+        super().__init__(db)
+        self._metrics = metrics
+
+    def _call_context(self, name: str):
+        return self._metrics.db_latency.time(method=name)
+
+
+class _CountingReader:
+    """
+    File like object counting the bytes read from the wrapped file.
+    """
+
+    def __init__(self, data: BinaryIO, count: Callable[[int], None]):
+        self._data = data
+        self._count = count
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._data.read(size)
+        self._count(len(chunk))
+        return chunk
+
+    def close(self):
+        self._data.close()
+
+
+class MeteredStorage(PackageStorage):
+    """
+    Counts the bytes uploaded to and served from a storage.
+    """
+
+    def __init__(self, storage: PackageStorage, metrics: Metrics):
+        self._storage = storage
+        self._metrics = metrics
+        self._backend = type(storage).__name__
+
+    def _counter(self, direction: str) -> Callable[[int], None]:
+        def count(size: int):
+            self._metrics.storage_bytes.inc(
+                size, backend=self._backend, direction=direction
+            )
+
+        return count
+
+    def add(self, project: str, file: str, data: BinaryIO):
+        self._storage.add(project, file, _CountingReader(data, self._counter("in")))
+
+    def get(self, project: str, file: str) -> BinaryIO:
+        return self._count_out(self._storage.get(project, file))
+
+    def get_with_digest(
+        self, project: str, file: str, sha256_digest: Optional[str]
+    ) -> BinaryIO:
+        return self._count_out(
+            self._storage.get_with_digest(project, file, sha256_digest)
+        )
+
+    def _count_out(self, data: BinaryIO) -> BinaryIO:
+        try:
+            size = os.fstat(data.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            return _CountingReader(data, self._counter("out"))
+
+        # keep real files unwrapped, so they can be served with sendfile
+        self._counter("out")(size)
+        return data
+
+    def delete(self, project: str, file: str):
+        self._storage.delete(project, file)
@@ -1,11 +1,22 @@
 import datetime
 import hashlib
-import re
-from typing import List, Optional, Dict, Literal
-from urllib.parse import quote
-
+from functools import lru_cache
+from typing import (
+    AbstractSet,
+    List,
+    Optional,
+    Dict,
+    Literal,
+    Tuple,
+    Any,
+    NamedTuple,
+    Iterable,
+)
+from packaging import version as pep440
 from pydantic import BaseModel
 
+from warehouse14.pkg_helpers import normalize_pkgname, normalize_pkgname_for_url
+
 PackageType = Literal[
     "bdist_dmg",
     "bdist_dumb",
@@ -86,6 +97,33 @@ class Version(BaseModel):
         return self.metadata.get("classifiers", [])
 
 
+@lru_cache(maxsize=65536)
+def version_sort_key(version: str) -> Tuple[bool, bool, Any]:
+    """
+    Parses a version string once (PEP 440).
+
+    Versions which do not follow PEP 440 are sorted before any valid version.
+
+    :return: (is valid, is pre-release, comparable version)
+    """
+    try:
+        parsed = pep440.Version(version)
+    except pep440.InvalidVersion:
+        return False, False, version
+    return True, parsed.is_prerelease, parsed
+
+
+def _ordering_key(version: str):
+    valid, _, comparable = version_sort_key(version)
+    return valid, comparable
+
+
+def _latest_key(version: str):
+    # final releases before pre-releases, then by PEP 440
+    valid, prerelease, comparable = version_sort_key(version)
+    return not prerelease, valid, comparable
+
+
 class Token(BaseModel):
     id: str
     name: str
@@ -119,16 +157,26 @@ class Project(BaseModel):
     name: str
     admins: List[str] = []
     members: List[str] = []
+    # groups, whose accounts have member access
+    groups: List[str] = []
     public: bool = False
     versions: Dict[str, Version] = {}
+    # stored revision the project was loaded with, 0 for new projects
+    revision: int = 0
 
     @property
     def latest_version(self) -> Optional[Version]:
+        """
+        Latest final release, the latest pre-release if there is no final release.
+        """
         if not self.versions:
             return None
+        return self.versions[max(self.versions, key=_latest_key)]
 
-        version = sorted(self.versions.keys())
-        return self.versions[version[-1]]
+    @property
+    def sorted_versions(self) -> List[Version]:
+        """Versions in PEP 440 order, oldest first"""
+        return [self.versions[v] for v in sorted(self.versions, key=_ordering_key)]
 
     @property
     def files(self):
@@ -137,20 +185,171 @@ class Project(BaseModel):
     def add_file(self, version: str, file: File):
         self.versions.setdefault(version, Version(version=version)).files.append(file)
 
-    def visible(self, user: str):
-        return self.public or (user in self.admins + self.members)
+    def search_text(self) -> str:
+        """Lower case text, searches for the project are matched against"""
+        latest_version = self.latest_version
+        summary = latest_version.summary if latest_version else ""
+        return f"{self.name} {summary}".lower()
+
+    def visible(self, user: str, groups: AbstractSet[str] = frozenset()):
+        """
+        :param groups: groups of the user
+        """
+        return (
+            self.public
+            or user in self.admins
+            or user in self.members
+            or not groups.isdisjoint(self.groups)
+        )
 
     def is_admin(self, user: str):
         return user in self.admins
 
     def normalized_name_for_url(self) -> str:
         """Perform PEP 503 normalization and ensure the value is safe for URLs."""
-        return quote(self.normalized_name())
+        return normalize_pkgname_for_url(self.name)
 
     @staticmethod
     def normalize_name(name: str) -> str:
         """Perform PEP 503 normalization"""
-        return re.sub(r"[-_.]+", "-", name).lower()
+        return normalize_pkgname(name)
+
+
+class MembershipChange(BaseModel):
+    project: str
+    user: str
+    # None removes the user from the project
+    role: Optional[Literal["admin", "member"]] = None
+
+    def apply(self, project: Project):
+        """Changes the role of the user within the given project"""
+        if self.user in project.admins:
+            project.admins.remove(self.user)
+        if self.user in project.members:
+            project.members.remove(self.user)
+
+        if self.role == "admin":
+            project.admins.append(self.user)
+        elif self.role == "member":
+            project.members.append(self.user)
+
+
+class FileEntry(NamedTuple):
+    filename: str
+    sha256_digest: str
+    version: str
+
+    @property
+    def basename(self) -> str:
+        return self.filename.rsplit("/", 1)[-1]
+
+
+class ProjectRecord:
+    """
+    Lean, read only representation of a project for the simple API and downloads.
+
+    Built from plain database values without validating nested pydantic models,
+    :meth:`to_project` provides the full :class:`Project` for the UI and writes.
+    """
+
+    __slots__ = (
+        "name",
+        "public",
+        "admins",
+        "members",
+        "groups",
+        "files",
+        "_file_index",
+        "revision",
+        "_readers",
+        "_versions",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        public: bool,
+        admins: Iterable[str],
+        members: Iterable[str],
+        versions: Dict[str, dict],
+        groups: Iterable[str] = (),
+        revision: int = 0,
+    ):
+        """
+        :param versions: version dicts as stored,
+            `{"version": ..., "metadata": {...}, "files": [...]}`
+        :param revision: stored revision of the project
+        """
+        self.name = name
+        self.public = public
+        self.admins = tuple(admins)
+        self.members = tuple(members)
+        self.groups = frozenset(groups)
+        self.files = tuple(
+            FileEntry(file["filename"], file["sha256_digest"], version)
+            for version, data in versions.items()
+            for file in data.get("files", [])
+        )
+        self._file_index = {file.filename: file for file in self.files}
+        self.revision = revision
+        self._readers = frozenset(self.admins) | frozenset(self.members)
+        self._versions = versions
+
+    @classmethod
+    def from_project(cls, project: Project) -> "ProjectRecord":
+        return cls(
+            name=project.name,
+            public=project.public,
+            admins=project.admins,
+            members=project.members,
+            groups=project.groups,
+            versions={k: v.dict() for k, v in project.versions.items()},
+            revision=project.revision,
+        )
+
+    def to_project(self) -> Project:
+        return Project(
+            name=self.name,
+            admins=list(self.admins),
+            members=list(self.members),
+            groups=sorted(self.groups),
+            public=self.public,
+            versions={k: Version(**v) for k, v in self._versions.items()},
+            revision=self.revision,
+        )
+
+    @property
+    def stored_versions(self) -> Dict[str, dict]:
+        """Version dicts as stored"""
+        return self._versions
+
+    def normalized_name(self) -> str:
+        """Perform PEP 503 normalization"""
+        return Project.normalize_name(self.name)
+
+    def get_file(self, filename: str) -> Optional[FileEntry]:
+        """
+        :return: file of any version with the given name,
+            None if the project does not contain it
+        """
+        return self._file_index.get(filename)
+
+    def visible(self, user: str, groups: AbstractSet[str] = frozenset()) -> bool:
+        """
+        :param groups: groups of the user
+        """
+        return (
+            self.public or user in self._readers or not self.groups.isdisjoint(groups)
+        )
+
+    def is_admin(self, user: str) -> bool:
+        return user in self.admins
+
+
+class ProjectPage(BaseModel):
+    projects: List[Project] = []
+    # opaque cursor to request the next page, None on the last page
+    cursor: Optional[str] = None
 
 
 # class DB(ABC):
@@ -6,14 +6,20 @@ Removed unused code lines
 """
 
 import re
+from functools import lru_cache
 from urllib.parse import quote
 
+_NORMALIZE_PATTERN = re.compile(r"[-_.]+")
 
+
+# Names are normalized several times per request, the set of project names is small
+@lru_cache(maxsize=4096)
 def normalize_pkgname(name: str) -> str:
     """Perform PEP 503 normalization"""
-    return re.sub(r"[-_.]+", "-", name).lower()
+    return _NORMALIZE_PATTERN.sub("-", name).lower()
 
 
+@lru_cache(maxsize=4096)
 def normalize_pkgname_for_url(name: str) -> str:
     """Perform PEP 503 normalization and ensure the value is safe for URLs."""
     return quote(normalize_pkgname(name))
@@ -0,0 +1,63 @@
+"""
+Rendering of project descriptions
+"""
+
+import hashlib
+from typing import Optional
+
+import readme_renderer.markdown
+import readme_renderer.rst
+import readme_renderer.txt
+
+from warehouse14.cache import LRUCache
+from warehouse14.models import Version, Project
+
+_RENDERERS = {
+    None: readme_renderer.rst,  # Default if description_content_type is None
+    "": readme_renderer.rst,  # Default if description_content_type is None
+    "text/plain": readme_renderer.txt,
+    "text/x-rst": readme_renderer.rst,
+    "text/markdown": readme_renderer.markdown,
+}
+
+# marks cache misses, None is a valid result for descriptions failing to render
+_MISSING = object()
+
+
+def render_readme(version: Version) -> Optional[str]:
+    """
+    Render description depending on the type (plain, rst, markdown)
+
+    :return: sanitized html, None if the description could not be rendered
+    """
+    renderer = _RENDERERS[version.description_content_type]
+    return renderer.render(version.description)
+
+
+class ReadmeCache:
+    """
+    Keeps rendered descriptions,
+    rendering large rst descriptions takes a lot of CPU time.
+
+    Entries are keyed by project, version and a hash of the description,
+    so changed metadata is rendered again.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self._cache = LRUCache(maxsize)
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._cache
+
+    def render(self, project_name: str, version: Version) -> Optional[str]:
+        description_hash = hashlib.sha256(
+            f"{version.description_content_type}\n{version.description}".encode()
+        ).hexdigest()
+        key = (Project.normalize_name(project_name), version.version, description_hash)
+
+        readme = self._cache.get(key, _MISSING)
+        if readme is _MISSING:
+            readme = render_readme(version)
+            self._cache.set(key, readme)
+        return readme
@@ -1,7 +1,31 @@
+import functools
+import inspect
 from abc import abstractmethod, ABC
-from typing import List, Optional
+from contextlib import nullcontext
+from operator import attrgetter
+from typing import AbstractSet, ContextManager, List, Mapping, Optional
 
-from warehouse14.models import Project, Account, Token, Group
+from warehouse14.models import (
+    Project,
+    Account,
+    Token,
+    Group,
+    MembershipChange,
+    ProjectPage,
+    ProjectRecord,
+)
+
+
+class ConcurrentModificationError(Exception):
+    """
+    The project was changed by someone else since it was loaded.
+    """
+
+
+class InvalidCursorError(ValueError):
+    """
+    The cursor was not returned by a previous page of the same search.
+    """
 
 
 class DBBackend(ABC):
@@ -22,6 +46,18 @@ class DBBackend(ABC):
         :param user_id: ID of the user, which will be used to search for
         """
 
+    def account_get_or_create(self, user_id: str) -> Account:
+        """
+        Load an account, creates the account if it does not exist.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        :param user_id: ID of the user
+        """
+        account = self.account_get(user_id)
+        if account is None:
+            account = self.account_save(user_id)
+        return account
+
     @abstractmethod
     def account_token_add(
         self, user_id: str, token_id: str, name: str, key: str
@@ -88,8 +124,11 @@ class DBBackend(ABC):
     @abstractmethod
     def project_save(self, project: Project) -> Project:
         """
-        Create a project in the package index
-        :param project: project data
+        Create or update a project in the package index
+
+        :param project: project data, `revision` as loaded, 0 for a new project
+        :raises ConcurrentModificationError: if the stored revision differs
+        :return: saved project with the new revision
         """
 
     def project_get(self, name: str) -> Optional[Project]:
@@ -101,8 +140,247 @@ class DBBackend(ABC):
         :return: Project or None
         """
 
+    def project_members_update(
+        self,
+        changes: List[MembershipChange],
+        revisions: Optional[Mapping[str, int]] = None,
+    ) -> List[str]:
+        """
+        Applies a batch of role changes, across projects.
+
+        Callers check permissions and that every project keeps an admin,
+        on the projects loaded with the given revisions.
+        May be overwritten by subclasses, for an optimized implementation.
+        The default implementation saves project by project, a project changed
+        concurrently while saving is left unchanged.
+        :param changes: role changes, applied in the given order
+        :param revisions: revision of each project by normalized name, the changes
+            were checked against. If any project was changed since, none is changed.
+        :return: normalized names of the changed projects
+        """
+        projects = {}
+        for change in changes:
+            name = Project.normalize_name(change.project)
+            if name not in projects:
+                projects[name] = self.project_get(name)
+            if projects[name] is not None:
+                change.apply(projects[name])
+
+        projects = {name: p for name, p in projects.items() if p is not None}
+        if revisions is not None and any(
+            p.revision != revisions.get(name, p.revision)
+            for name, p in projects.items()
+        ):
+            return []
+
+        changed = []
+        for name, project in projects.items():
+            try:
+                self.project_save(project)
+            except ConcurrentModificationError:
+                continue
+            changed.append(name)
+        return changed
+
+    def project_get_record(self, name: str) -> Optional[ProjectRecord]:
+        """
+        Returns the lean read model of a project by given name.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        :param name: project name
+        :return: ProjectRecord or None
+        """
+        project = self.project_get(name)
+        return ProjectRecord.from_project(project) if project else None
+
+    def project_list_records(self) -> List[ProjectRecord]:
+        """
+        Lists all projects as lean read models.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        """
+        return [ProjectRecord.from_project(p) for p in self.project_list()]
+
+    def project_get_many(self, names: List[str]) -> List[Project]:
+        """
+        Returns projects by given names, unknown names are skipped.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        :param names: project names
+        :return: Projects in order of the given names
+        """
+        projects = (self.project_get(name) for name in names)
+        return [project for project in projects if project is not None]
+
     @abstractmethod
     def project_list(self) -> List[Project]:
         """
         Lists all project names
         """
+
+    def project_search(
+        self,
+        query: Optional[str] = None,
+        user: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        groups: AbstractSet[str] = frozenset(),
+    ) -> ProjectPage:
+        """
+        Returns a page of projects.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        :param query: text the name or summary of a project contains, case insensitive
+        :param user: only return projects visible for this user
+        :param cursor: cursor of the previous page, None for the first page
+        :param limit: max number of projects on the page
+        :param groups: groups of the user
+        :raises InvalidCursorError: if the cursor is invalid
+        :return: ProjectPage
+        """
+        try:
+            start = int(cursor) if cursor else 0
+        except ValueError:
+            raise InvalidCursorError(cursor)
+        if start < 0:
+            raise InvalidCursorError(cursor)
+
+        query = query.lower() if query else ""
+        projects = sorted(
+            (
+                project
+                for project in self.project_list()
+                if query in project.search_text()
+                and (user is None or project.visible(user, groups))
+            ),
+            key=attrgetter("name"),
+        )
+
+        end = start + limit
+        return ProjectPage(
+            projects=projects[start:end],
+            cursor=str(end) if end < len(projects) else None,
+        )
+
+
+class DBBackendProxy(DBBackend):
+    """
+    Delegates all calls to another backend.
+
+    Base for wrappers, which add behaviour to some methods of any backend.
+    """
+
+    def __init__(self, db: DBBackend):
+        self._db = db
+
+    def __getattr__(self, name):
+        # provide implementation specific attributes of the wrapped backend
+        return getattr(self._db, name)
+
+    def _call_context(self, name: str) -> ContextManager:
+        """
+        Context every delegated call runs in,
+        for classes decorated with :meth:`wrap_calls`.
+
+        :param name: name of the called method
+        """
+        return nullcontext()
+
+    @staticmethod
+    def wrap_calls(cls):
+        """
+        Class decorator,
+        runs all methods delegated by DBBackendProxy within `_call_context`.
+
+        Methods defined by the decorated class are kept,
+        wrapped methods keep signature and docstring.
+        """
+        for name, method in list(vars(DBBackendProxy).items()):
+            if (
+                name.startswith("_")
+                or name in vars(cls)
+                or not inspect.isfunction(method)
+            ):
+                continue
+            setattr(cls, name, _delegate_within_context(name, method))
+        return cls
+
+    def account_save(self, user_id: str, **kwargs) -> Optional[Account]:
+        return self._db.account_save(user_id, **kwargs)
+
+    def account_get(self, user_id: str) -> Optional[Account]:
+        return self._db.account_get(user_id)
+
+    def account_get_or_create(self, user_id: str) -> Account:
+        return self._db.account_get_or_create(user_id)
+
+    def account_token_add(
+        self, user_id: str, token_id: str, name: str, key: str
+    ) -> Optional[Token]:
+        return self._db.account_token_add(user_id, token_id, name, key)
+
+    def account_token_list(self, account_id: str) -> List[Token]:
+        return self._db.account_token_list(account_id)
+
+    def account_token_delete(self, account_id: str, token_id: str):
+        return self._db.account_token_delete(account_id, token_id)
+
+    def resolve_token(self, token_id: str) -> Optional[Account]:
+        return self._db.resolve_token(token_id)
+
+    def group_create(self, name: str, admins: List[str]) -> Group:
+        return self._db.group_create(name, admins)
+
+    def group_get(self, name: str) -> Optional[Group]:
+        return self._db.group_get(name)
+
+    def account_groups_list(self, user_id: str) -> List[str]:
+        return self._db.account_groups_list(user_id)
+
+    def group_delete(self, name: str):
+        return self._db.group_delete(name)
+
+    def project_save(self, project: Project) -> Project:
+        return self._db.project_save(project)
+
+    def project_get(self, name: str) -> Optional[Project]:
+        return self._db.project_get(name)
+
+    def project_members_update(
+        self,
+        changes: List[MembershipChange],
+        revisions: Optional[Mapping[str, int]] = None,
+    ) -> List[str]:
+        return self._db.project_members_update(changes, revisions)
+
+    def project_get_record(self, name: str) -> Optional[ProjectRecord]:
+        return self._db.project_get_record(name)
+
+    def project_list_records(self) -> List[ProjectRecord]:
+        return self._db.project_list_records()
+
+    def project_get_many(self, names: List[str]) -> List[Project]:
+        return self._db.project_get_many(names)
+
+    def project_list(self) -> List[Project]:
+        return self._db.project_list()
+
+    def project_search(
+        self,
+        query: Optional[str] = None,
+        user: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        groups: AbstractSet[str] = frozenset(),
+    ) -> ProjectPage:
+        return self._db.project_search(query, user, cursor, limit, groups)
+
+
+def _delegate_within_context(name: str, method):
+    @functools.wraps(method)
+    def delegate(self, *args, **kwargs):
+        with self._call_context(name):
+            return getattr(self._db, name)(*args, **kwargs)
+
+    delegate.__doc__ = method.__doc__ or getattr(DBBackend, name).__doc__
+    return delegate
@@ -1,12 +1,24 @@
+import heapq
 import json
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, copy_context
 from datetime import datetime
-from typing import Optional, TYPE_CHECKING, List
+from itertools import chain, groupby, islice
+from operator import attrgetter
+from typing import AbstractSet, Optional, TYPE_CHECKING, List, Dict, Iterator, Mapping
 
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError, ParamValidationError
 
 from warehouse14 import Account, Token, Project
-from warehouse14.models import Version, Group
-from warehouse14.repos import DBBackend
+from warehouse14.models import Group, MembershipChange, ProjectPage, ProjectRecord
+from warehouse14.repos import (
+    ConcurrentModificationError,
+    DBBackend,
+    InvalidCursorError,
+)
 
 if TYPE_CHECKING:
     from mypy_boto3_dynamodb.service_resource import Table, DynamoDBServiceResource
@@ -42,9 +54,165 @@ def create_table(dynamodb: "DynamoDBServiceResource", table_name):
     )
 
 
+# keys per BatchGetItem call
+BATCH_GET_SIZE = 100
+# items per TransactWriteItems call
+TRANSACTION_SIZE = 100
+
+READ_OPERATIONS = {"GetItem", "BatchGetItem", "Query", "Scan", "TransactGetItems"}
+
+
+class RequestStats:
+    """
+    Counts DynamoDB calls, returned items and consumed capacity units.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = Counter()
+        self.items = 0
+        self.read_units = 0.0
+        self.write_units = 0.0
+
+    def record(self, operation: str, items: int, capacity_units: float):
+        with self._lock:
+            self.calls[operation] += 1
+            self.items += items
+            if operation in READ_OPERATIONS:
+                self.read_units += capacity_units
+            else:
+                self.write_units += capacity_units
+
+    def merge(self, other: "RequestStats"):
+        other = other.as_dict()
+        with self._lock:
+            self.calls.update(other["calls"])
+            self.items += other["items"]
+            self.read_units += other["read_units"]
+            self.write_units += other["write_units"]
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "items": self.items,
+                "read_units": self.read_units,
+                "write_units": self.write_units,
+            }
+
+    def __str__(self):
+        stats = self.as_dict()
+        calls = ", ".join(
+            f"{op}={count}" for op, count in sorted(stats["calls"].items())
+        )
+        return (
+            f"calls: {sum(self.calls.values())} ({calls}), items: {stats['items']}, "
+            f"RCU: {stats['read_units']:.1f}, WCU: {stats['write_units']:.1f}"
+        )
+
+
+class DynamoDBStats:
+    """
+    Accounting of all calls of a client to a table, in total, per endpoint
+    and for the current request.
+
+    Every call requests `ReturnConsumedCapacity=TOTAL`.
+    Calls to other tables, e.g. of other backends sharing the client, are ignored.
+    """
+
+    def __init__(self, client, table_name: str):
+        """
+        :param client: DynamoDB client, the event handlers are registered with
+        :param table_name: only calls accessing this table are accounted
+        """
+        self.table_name = table_name
+        self._context_key = f"warehouse14_stats_{id(self)}"
+        self.total = RequestStats()
+        self.endpoints: Dict[str, RequestStats] = defaultdict(RequestStats)
+        self._current: ContextVar[Optional[RequestStats]] = ContextVar(
+            "dynamodb_request_stats", default=None
+        )
+
+        events = client.meta.events
+        events.register("before-parameter-build.dynamodb", self._request_capacity)
+        events.register("after-call.dynamodb", self._record)
+
+    def start_request(self) -> RequestStats:
+        """
+        Starts accounting for the current request (context),
+        until `end_request` is called.
+        """
+        stats = RequestStats()
+        self._current.set(stats)
+        return stats
+
+    def end_request(self, endpoint: Optional[str] = None) -> Optional[RequestStats]:
+        """
+        Stops accounting for the current request.
+
+        :param endpoint: adds the request to the aggregate of this endpoint
+        """
+        stats = self._current.get()
+        self._current.set(None)
+        if stats is not None and endpoint is not None:
+            self.endpoints[endpoint].merge(stats)
+        return stats
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total.as_dict(),
+            "endpoints": {
+                endpoint: stats.as_dict()
+                for endpoint, stats in list(self.endpoints.items())
+            },
+        }
+
+    def _accesses_table(self, params: dict) -> bool:
+        if params.get("TableName") == self.table_name:
+            return True
+        if self.table_name in params.get("RequestItems", {}):
+            return True
+        return any(
+            action.get("TableName") == self.table_name
+            for item in params.get("TransactItems", [])
+            for action in item.values()
+        )
+
+    def _request_capacity(self, params, model, context, **kwargs):
+        if not self._accesses_table(params):
+            return
+        context[self._context_key] = True
+        if "ReturnConsumedCapacity" in model.input_shape.members:
+            params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+    def _record(self, parsed, model, context, **kwargs):
+        if not context.get(self._context_key):
+            return
+        items = len(parsed.get("Items", [])) + (1 if "Item" in parsed else 0)
+
+        consumed = parsed.get("ConsumedCapacity", [])
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        capacity_units = sum(c.get("CapacityUnits", 0) for c in consumed)
+
+        self.total.record(model.name, items, capacity_units)
+        current = self._current.get()
+        if current is not None:
+            current.record(model.name, items, capacity_units)
+
+
 class DynamoDBBackend(DBBackend):
-    def __init__(self, table: "Table"):
+    def __init__(self, table: "Table", max_parallel_queries: int = 8):
+        """
+        :param table: DynamoDB table, created with :func:`create_table`
+        :param max_parallel_queries: queries issued in parallel,
+            to load multiple projects
+        """
         self._table = table
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_parallel_queries, thread_name_prefix="dynamodb"
+        )
+        self.stats = DynamoDBStats(self._table.meta.client, self._table.name)
 
         self.__scanner = self._table.meta.client.get_paginator("scan").paginate
         self.__querier = self._table.meta.client.get_paginator("query").paginate
@@ -54,19 +222,41 @@ class DynamoDBBackend(DBBackend):
         """
         Load non confidential data for a user
         """
-        # check if already exists, if so, get created date
-        existing_account = self.account_get(user_id=user_id)
-        created = existing_account.created if existing_account else datetime.now()
-
-        self._table.put_item(
-            Item={
+        # single upsert, keeps the created date of existing accounts
+        item = self._table.update_item(
+            Key={
                 "pk": f"account#{user_id}",
                 "sk": f"account#{user_id}",
-                "created": created.isoformat(),
-                "updated": datetime.now().isoformat(),
-            }
-        )
-        return self.account_get(user_id=user_id)
+            },
+            UpdateExpression=(
+                "SET created = if_not_exists(created, :now), updated = :now"
+            ),
+            ExpressionAttributeValues={":now": datetime.now().isoformat()},
+            ReturnValues="ALL_NEW",
+        )["Attributes"]
+        return self._account_from_item(user_id, item)
+
+    def account_get_or_create(self, user_id: str) -> Account:
+        # existing accounts cost a read, only the first login writes
+        account = self.account_get(user_id)
+        if account is not None:
+            return account
+
+        now = datetime.now().isoformat()
+        item = {
+            "pk": f"account#{user_id}",
+            "sk": f"account#{user_id}",
+            "created": now,
+            "updated": now,
+        }
+        try:
+            self._table.put_item(Item=item, ConditionExpression=Attr("pk").not_exists())
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            # created by a concurrent login
+            return self.account_get(user_id)
+        return self._account_from_item(user_id, item)
 
     def account_get(self, user_id: str) -> Optional[Account]:
         """
@@ -84,11 +274,15 @@ class DynamoDBBackend(DBBackend):
         if item is None:
             return None
         else:
-            return Account(
-                name=user_id,
-                created=datetime.fromisoformat(item.get("created")),
-                updated=datetime.fromisoformat(item.get("updated")),
-            )
+            return self._account_from_item(user_id, item)
+
+    @staticmethod
+    def _account_from_item(user_id: str, item: dict) -> Account:
+        return Account(
+            name=user_id,
+            created=datetime.fromisoformat(item.get("created")),
+            updated=datetime.fromisoformat(item.get("updated")),
+        )
 
     def account_token_add(
         self, user_id: str, token_id: str, name: str, key: str
@@ -207,8 +401,18 @@ class DynamoDBBackend(DBBackend):
 
     def group_delete(self, name: str):
         with self._table.batch_writer() as w:
-            items = self._query(
-                KeyConditionExpression=Key("pk").eq(f"group#{name}"),
+            items = list(
+                self._query(
+                    KeyConditionExpression=Key("pk").eq(f"group#{name}"),
+                )
+            )
+            # access granted to the group on projects
+            items.extend(
+                self._query(
+                    IndexName="sk_gsi",
+                    KeyConditionExpression=Key("sk").eq(f"group#{name}")
+                    & Key("pk").begins_with("project#"),
+                )
             )
 
             for item in items:
@@ -221,92 +425,267 @@ class DynamoDBBackend(DBBackend):
 
     # Project methods
     def project_save(self, project: Project) -> Project:
+        """
+        Writes only the changed items within one transaction,
+        guarded by the revision the project was loaded with.
+        """
         normalized_name = project.normalized_name()
+        pk = f"project#{normalized_name}"
+
+        current = self.project_get_record(normalized_name)
+        current_revision = current.revision if current else 0
+        if current_revision != project.revision:
+            raise ConcurrentModificationError(normalized_name)
+        revision = project.revision + 1
+
+        # update project entry, changed versions only
+        versions = {k: json.loads(v.json()) for k, v in project.versions.items()}
+        sets = ["revision = :revision"]
+        removes = []
+        names = {}
+        values = {":revision": revision}
+        if current is None:
+            sets += ["#name = :name", "versions = :versions"]
+            values[":name"] = project.name
+            values[":versions"] = versions
+        else:
+            if project.name != current.name:
+                sets.append("#name = :name")
+                values[":name"] = project.name
+            stored = current.stored_versions
+            for i, (version, data) in enumerate(versions.items()):
+                if stored.get(version) != data:
+                    sets.append(f"versions.#v{i} = :v{i}")
+                    names[f"#v{i}"] = version
+                    values[f":v{i}"] = data
+            for i, version in enumerate(stored.keys() - versions.keys()):
+                removes.append(f"versions.#r{i}")
+                names[f"#r{i}"] = version
+        # search text depends on name and versions only,
+        # entries stored before it was introduced get it with any save
+        changed = len(sets) > 1 or removes
+        sets.append(
+            "#search = :search"
+            if changed
+            else "#search = if_not_exists(#search, :search)"
+        )
+        names["#search"] = "search"
+        values[":search"] = project.search_text()
+        if ":name" in values:
+            names["#name"] = "name"
+
+        if project.revision:
+            condition = "revision = :expected"
+            values[":expected"] = project.revision
+        else:
+            # new project, or stored before revisions were introduced
+            condition = "attribute_not_exists(revision)"
+
+        update = {
+            "Key": {"pk": pk, "sk": pk},
+            "UpdateExpression": f"SET {', '.join(sets)}"
+            + (f" REMOVE {', '.join(removes)}" if removes else ""),
+            "ConditionExpression": condition,
+            "ExpressionAttributeValues": values,
+        }
+        if names:
+            update["ExpressionAttributeNames"] = names
+
+        # roles of accounts and groups, public is stored as account
+        current_roles = {}
+        if current is not None:
+            current_roles.update({f"account#{a}": "admin" for a in current.admins})
+            current_roles.update({f"account#{m}": "member" for m in current.members})
+            current_roles.update({f"group#{g}": "member" for g in current.groups})
+            if current.public:
+                current_roles["account#public"] = "member"
+        roles = {f"group#{g}": "member" for g in project.groups}
+        roles.update({f"account#{m}": "member" for m in project.members})
+        roles.update({f"account#{a}": "admin" for a in project.admins})
+        if project.public:
+            roles["account#public"] = "member"
+
+        writes = []
+        for sk, role in roles.items():
+            if current_roles.get(sk) != role:
+                item = {"pk": pk, "sk": sk, "role": role}
+                if sk != "account#public":
+                    item["name"] = sk.split("#", 1)[1]
+                writes.append({"Put": {"Item": item}})
+        for sk in current_roles.keys() - roles.keys():
+            writes.append({"Delete": {"Key": {"pk": pk, "sk": sk}}})
+
+        if not self._transact({"Update": update}, writes):
+            raise ConcurrentModificationError(normalized_name)
+
+        return project.copy(update={"revision": revision}, deep=True)
+
+    def _transact(self, guard: dict, writes: List[dict]) -> bool:
+        """
+        Writes the guard and all writes of one project within TransactWriteItems calls.
 
-        current = self.project_get(normalized_name)
+        A transaction contains up to TRANSACTION_SIZE items,
+        further writes of large diffs
+        are sent in follow-up transactions, after the guarded one succeeded.
 
-        # calc admins diff
-        current_admins = set(current.admins) if current else set()
-        project_admins = set(project.admins)
-        to_create_admins = project_admins - current_admins
-        to_delete_admins = current_admins - project_admins
+        :param guard: conditional update of the project entry
+        :return: False, if the condition of the guard failed
+        """
+        client = self._table.meta.client
+        items = [guard, *writes]
+        for start in range(0, len(items), TRANSACTION_SIZE):
+            chunk = [
+                {action: {"TableName": self._table.name, **params}}
+                for item in items[start : start + TRANSACTION_SIZE]
+                for action, params in item.items()
+            ]
+            try:
+                client.transact_write_items(TransactItems=chunk)
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get("CancellationReasons") or [{}]
+                if start == 0 and reasons[0].get("Code") == "ConditionalCheckFailed":
+                    return False
+                raise
+        return True
+
+    def project_members_update(
+        self,
+        changes: List[MembershipChange],
+        revisions: Optional[Mapping[str, int]] = None,
+    ) -> List[str]:
+        """
+        Writes the role entries of all projects within one transaction,
+        without loading the projects.
 
-        # calc members diff
-        current_members = set(current.members) if current else set()
-        project_members = set(project.members)
-        to_create_members = project_members - current_members
-        to_delete_members = current_members - project_members
+        Each project entry guards its role entries by the given revision.
+        Batches exceeding the items of one transaction are written with one
+        transaction per project, projects changed concurrently are left unchanged.
+        """
+        # the last change per project and user wins
+        roles = defaultdict(dict)
+        for change in changes:
+            roles[Project.normalize_name(change.project)][change.user] = change.role
+
+        transactions = {}
+        for name, users in sorted(roles.items()):
+            pk = f"project#{name}"
+            # bump the revision, concurrent saves must not revert the changes
+            guard = {
+                "Key": {"pk": pk, "sk": pk},
+                "UpdateExpression": "ADD revision :one",
+                "ConditionExpression": "attribute_exists(pk)",
+                "ExpressionAttributeValues": {":one": 1},
+            }
+            revision = revisions.get(name) if revisions is not None else None
+            if revision:
+                guard["ConditionExpression"] = "revision = :expected"
+                guard["ExpressionAttributeValues"][":expected"] = revision
+            elif revision == 0:
+                # stored before revisions were introduced
+                guard["ConditionExpression"] += " AND attribute_not_exists(revision)"
+
+            writes = []
+            for user, role in users.items():
+                key = {"pk": pk, "sk": f"account#{user}"}
+                if role is None:
+                    writes.append({"Delete": {"Key": key}})
+                else:
+                    item = {**key, "name": user, "role": role}
+                    writes.append({"Put": {"Item": item}})
+            transactions[name] = ({"Update": guard}, writes)
+
+        if (
+            sum(1 + len(writes) for _, writes in transactions.values())
+            > TRANSACTION_SIZE
+        ):
+
+            def update(name: str) -> Optional[str]:
+                return name if self._transact(*transactions[name]) else None
+
+            updated = self._map_parallel(update, list(transactions))
+            return [name for name in updated if name is not None]
+
+        while transactions:
+            failed = self._transact_atomic(list(transactions.values()))
+            if not failed:
+                return list(transactions)
+            if revisions is not None:
+                return []
+            # without revisions, only missing projects fail their guard
+            names = list(transactions)
+            for i in failed:
+                del transactions[names[i]]
+        return []
+
+    def _transact_atomic(self, transactions: List[tuple]) -> List[int]:
+        """
+        Writes the guards and writes of many projects,
+        within one TransactWriteItems call.
 
-        # write to db
-        with self._table.batch_writer() as w:
-            # update project entry
-            w.put_item(
-                Item={
-                    "pk": f"project#{normalized_name}",
-                    "sk": f"project#{normalized_name}",
-                    "name": project.name,
-                    "versions": {
-                        k: json.loads(v.json()) for k, v in project.versions.items()
-                    },
-                }
+        :param transactions: guard and writes of each project
+        :return: indexes of the projects, whose guard failed. Nothing was written then.
+        """
+        client = self._table.meta.client
+        items = []
+        guards = []
+        for guard, writes in transactions:
+            guards.append(len(items))
+            items.extend([guard, *writes])
+
+        try:
+            client.transact_write_items(
+                TransactItems=[
+                    {action: {"TableName": self._table.name, **params}}
+                    for item in items
+                    for action, params in item.items()
+                ]
             )
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons") or []
+            failed = [
+                i
+                for i, position in enumerate(guards)
+                if position < len(reasons)
+                and reasons[position].get("Code") == "ConditionalCheckFailed"
+            ]
+            if not failed:
+                raise
+            return failed
+        return []
+
+    def backfill_search(self) -> int:
+        """
+        Writes the search text of projects, which were stored before it was introduced.
 
-            # update public state
-            if project.public:
-                w.put_item(
-                    Item={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#public",
-                        "role": "member",
-                    }
-                )
-            else:
-                w.delete_item(
-                    Key={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#public",
-                    }
-                )
-
-            # write admin diff
-            for admin in to_create_admins:
-                w.put_item(
-                    Item={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#{admin}",
-                        "name": admin,
-                        "role": "admin",
-                    }
-                )
-            for admin in to_delete_admins:
-                w.delete_item(
-                    Key={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#{admin}",
-                    }
-                )
-
-            # write member diff
-            for member in to_create_members:
-                w.put_item(
-                    Item={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#{member}",
-                        "name": member,
-                        "role": "member",
-                    }
-                )
-            for member in to_delete_members:
-                w.delete_item(
-                    Key={
-                        "pk": f"project#{normalized_name}",
-                        "sk": f"account#{member}",
-                    }
-                )
+        :return: number of updated projects
+        """
+        items = self._scan(
+            FilterExpression=Attr("pk").begins_with("project#")
+            & Attr("sk").begins_with("project#")
+            & Attr("search").not_exists(),
+            ProjectionExpression="pk",
+        )
 
-        return self.project_get(normalized_name)
+        updated = 0
+        for item in items:
+            project = self.project_get(item["pk"].split("#", 1)[1])
+            if project is None:
+                continue
+            self._table.update_item(
+                Key={"pk": item["pk"], "sk": item["pk"]},
+                UpdateExpression="SET #search = if_not_exists(#search, :search)",
+                ConditionExpression="attribute_exists(pk)",
+                ExpressionAttributeNames={"#search": "search"},
+                ExpressionAttributeValues={":search": project.search_text()},
+            )
+            updated += 1
+        return updated
 
     def project_get(self, name: str) -> Optional[Project]:
+        record = self.project_get_record(name)
+        return record.to_project() if record else None
+
+    def project_get_record(self, name: str) -> Optional[ProjectRecord]:
         normalized_name = Project.normalize_name(name)
         items = self._query(
             KeyConditionExpression=Key("pk").eq(f"project#{normalized_name}")
@@ -316,6 +695,7 @@ class DynamoDBBackend(DBBackend):
         public = False
         db_admins = []
         db_members = []
+        db_groups = []
         for item in items:
             if item["sk"].startswith("project#"):
                 db_project = item
@@ -327,18 +707,32 @@ class DynamoDBBackend(DBBackend):
                     db_admins.append(item)
                 elif role == "member":
                     db_members.append(item)
+            elif item["sk"].startswith("group#"):
+                db_groups.append(item)
 
         if db_project is None:
             return None
 
-        return Project(
+        return ProjectRecord(
             name=db_project["name"],
             admins=[a["name"] for a in db_admins],
             members=[a["name"] for a in db_members],
+            groups=[g["name"] for g in db_groups],
             public=public,
-            versions={k: Version(**v) for k, v in db_project["versions"].items()},
+            versions=db_project["versions"],
+            revision=int(db_project.get("revision", 0)),
         )
 
+    def project_get_many(self, names: List[str]) -> List[Project]:
+        # every project is a query on its own partition, the client is thread safe
+        projects = self._map_parallel(self.project_get, names)
+        return [project for project in projects if project is not None]
+
+    def _map_parallel(self, func, args):
+        # Run within a copy of the current context, to keep the request accounting
+        contexts = [copy_context() for _ in args]
+        return self._executor.map(lambda c, a: c.run(func, a), contexts, args)
+
     def _scan(self, **kwargs):
         for page in self.__scanner(TableName=self._table.name, **kwargs):
             yield from page.get("Items", [])
@@ -351,6 +745,13 @@ class DynamoDBBackend(DBBackend):
         """
         Lists all project names
         """
+        return self.project_get_many(self._project_names())
+
+    def project_list_records(self) -> List[ProjectRecord]:
+        records = self._map_parallel(self.project_get_record, self._project_names())
+        return [record for record in records if record is not None]
+
+    def _project_names(self) -> List[str]:
         # TODO this will explode,
         # we have to scan the whole DB and do additional requests per project
         # we should lookup by the index for a specific user, using a paginator!
@@ -358,5 +759,167 @@ class DynamoDBBackend(DBBackend):
             FilterExpression=Key("pk").begins_with(f"project#")
             & Key("sk").begins_with("project#"),
         )
+        return [p["name"] for p in items]
+
+    def project_search(
+        self,
+        query: Optional[str] = None,
+        user: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        groups: AbstractSet[str] = frozenset(),
+    ) -> ProjectPage:
+        """
+        With a user, pages through the projects visible to the user in order of
+        their normalized names. They are looked up by their role entries
+        in the `sk_gsi` index, starting after the cursor and reading about one page
+        per principal, only projects of the page are loaded.
+
+        Without a user, scans only as many project entries as required to fill the page,
+        pages are in scan order and sorted by name within the page.
+
+        The query is matched against the `search` attribute.
+        """
+        query = query.lower() if query else None
+        if user is None:
+            return self._project_search_scan(query, cursor, limit)
+
+        after = self._parse_search_cursor(cursor) if cursor else None
+        # one name in advance, to tell whether a further page exists
+        names = self._visible_project_names(user, groups, after, limit + 1)
+
+        page = []
+        more = False
+        while len(page) < limit:
+            batch = list(islice(names, min(limit - len(page), BATCH_GET_SIZE)))
+            if not batch:
+                break
+            if query:
+                search_texts = self._project_search_texts(batch)
+                batch = [
+                    name
+                    for name in batch
+                    if name in search_texts and query in search_texts[name]
+                ]
+            page.extend(batch)
+        else:
+            more = next(names, None) is not None
+
+        cursor = f"project#{page[-1]}" if page and more else None
+        return ProjectPage(projects=self.project_get_many(page), cursor=cursor)
+
+    @staticmethod
+    def _parse_search_cursor(cursor: str) -> str:
+        """
+        The cursor of a user's search is the key of the last project of the page.
+        """
+        prefix, _, name = cursor.partition("#")
+        if prefix != "project" or not name or Project.normalize_name(name) != name:
+            raise InvalidCursorError(cursor)
+        return name
+
+    def _visible_project_names(
+        self,
+        user: str,
+        groups: AbstractSet[str],
+        after: Optional[str],
+        page_size: int,
+    ) -> Iterator[str]:
+        """
+        Normalized names of the projects the user has a role in, public projects
+        and projects of the user's groups, in order and starting after the given name.
+
+        Every principal's role entries are read from the `sk_gsi` index
+        in pages of `page_size`, only as far as the names are consumed.
+        """
+        principals = [
+            f"account#{user}",
+            "account#public",
+            *(f"group#{group}" for group in sorted(groups)),
+        ]
+        start = f"project#{after}\x00" if after else "project#"
+
+        def first_page(principal: str):
+            pages = iter(
+                self.__querier(
+                    TableName=self._table.name,
+                    IndexName="sk_gsi",
+                    KeyConditionExpression=Key("sk").eq(principal)
+                    & Key("pk").between(start, "project$"),
+                    ProjectionExpression="pk",
+                    PaginationConfig={"PageSize": page_size},
+                )
+            )
+            return next(pages, {}).get("Items", []), pages
+
+        def names(items: List[dict], pages) -> Iterator[str]:
+            # role entries are sorted by pk, the range key of the index
+            for item in chain(items, (i for p in pages for i in p.get("Items", []))):
+                yield item["pk"].split("#", 1)[1]
+
+        # the first pages are read in parallel, most pages fit into them
+        streams = [names(*page) for page in self._map_parallel(first_page, principals)]
+        return (name for name, _ in groupby(heapq.merge(*streams)))
+
+    def _project_search_texts(self, names: List[str]) -> Dict[str, str]:
+        """
+        Search text of existing projects, by normalized name
+        """
+        client = self._table.meta.client
+        request = {
+            self._table.name: {
+                "Keys": [{"pk": f"project#{n}", "sk": f"project#{n}"} for n in names],
+                "ProjectionExpression": "pk, #search",
+                "ExpressionAttributeNames": {"#search": "search"},
+            }
+        }
+
+        texts = {}
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for item in response["Responses"].get(self._table.name, []):
+                name = item["pk"].split("#", 1)[1]
+                # match the name of entries without search text, see `backfill_search`
+                texts[name] = item.get("search", name)
+            request = response.get("UnprocessedKeys")
+        return texts
+
+    def _project_search_scan(
+        self, query: Optional[str], cursor: Optional[str], limit: int
+    ) -> ProjectPage:
+        filter_expression = Attr("pk").begins_with("project#") & Attr("sk").begins_with(
+            "project#"
+        )
+        if query:
+            # match the name of entries without search text, see `backfill_search`
+            filter_expression &= Attr("search").contains(query) | (
+                Attr("search").not_exists() & Attr("pk").contains(query)
+            )
 
-        return [self.project_get(p["name"]) for p in items]
+        projects = []
+        while len(projects) < limit:
+            try:
+                result = self.__scanner(
+                    TableName=self._table.name,
+                    FilterExpression=filter_expression,
+                    PaginationConfig={
+                        "MaxItems": limit - len(projects),
+                        "StartingToken": cursor,
+                    },
+                ).build_full_result()
+            except (ParamValidationError, ValueError) as e:
+                raise InvalidCursorError(cursor) from e
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ValidationException":
+                    raise
+                raise InvalidCursorError(cursor) from e
+
+            names = [item["name"] for item in result.get("Items", [])]
+            projects.extend(self.project_get_many(names))
+
+            cursor = result.get("NextToken")
+            if cursor is None:
+                break
+
+        projects.sort(key=attrgetter("name"))
+        return ProjectPage(projects=projects, cursor=cursor)
@@ -0,0 +1,211 @@
+"""
+Full text search over project metadata
+
+Releases are indexed in an embedded SQLite FTS5 table, ranked with bm25.
+Use a file path to share the index between worker processes on one host.
+"""
+
+import re
+import sqlite3
+import threading
+from typing import AbstractSet, List, Iterable, Mapping, Optional
+
+from pydantic import BaseModel
+
+from warehouse14.models import MembershipChange, Project, Version
+from warehouse14.repos import DBBackendProxy
+
+# principal of public projects,
+# can not collide with user ids, which never start with a colon
+PUBLIC = ":public"
+# prefix of group principals
+GROUP = ":group:"
+
+# bm25 weights of the indexed columns: name, summary, keywords, classifiers, description
+_WEIGHTS = (10.0, 5.0, 3.0, 1.0, 1.0)
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+class SearchResult(BaseModel):
+    name: str
+    normalized_name: str
+    version: str
+    summary: str
+    # bm25 score, lower is better
+    score: float
+
+
+class SearchIndex:
+    def __init__(self, path: str = ":memory:"):
+        """
+        :param path: sqlite database file, in-memory by default
+        """
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._con.execute("PRAGMA journal_mode=WAL")
+
+        with self._con:
+            self._con.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS releases USING fts5(
+                    project UNINDEXED,
+                    version UNINDEXED,
+                    name,
+                    summary,
+                    keywords,
+                    classifiers,
+                    description,
+                    tokenize = 'porter unicode61'
+                )
+                """
+            )
+            self._con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS principals (
+                    project TEXT NOT NULL,
+                    principal TEXT NOT NULL,
+                    PRIMARY KEY (principal, project)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def index_project(self, project: Project):
+        """
+        Replaces all indexed releases and permissions of the project.
+        """
+        with self._lock, self._con:
+            self._delete(project.normalized_name())
+            self._insert(project)
+
+    def remove_project(self, name: str):
+        with self._lock, self._con:
+            self._delete(Project.normalize_name(name))
+
+    def rebuild(self, projects: Iterable[Project]):
+        """
+        Drops the whole index and indexes all given projects within one transaction.
+        """
+        with self._lock, self._con:
+            self._con.execute("DELETE FROM releases")
+            self._con.execute("DELETE FROM principals")
+            for project in projects:
+                self._insert(project)
+
+    def search(
+        self,
+        query: str,
+        user: str,
+        limit: int = 20,
+        groups: AbstractSet[str] = frozenset(),
+    ) -> List[SearchResult]:
+        """
+        Best matching release per project, for projects visible to the user.
+
+        :param query: free text, all terms have to match (prefix match)
+        :param user: user id to check permissions for
+        :param groups: groups of the user
+        """
+        match = " ".join(f'"{term}"*' for term in _TERM.findall(query))
+        if not match:
+            return []
+
+        principals = [PUBLIC, user, *(f"{GROUP}{group}" for group in groups)]
+        weights = ", ".join(map(str, _WEIGHTS))
+        placeholders = ", ".join("?" * len(principals))
+        results = {}
+        with self._lock:
+            rows = self._con.execute(
+                f"""
+                SELECT name, project, version, summary,
+                    bm25(releases, 0, 0, {weights}) AS score
+                FROM releases
+                WHERE releases MATCH ?
+                AND project IN (
+                    SELECT project FROM principals WHERE principal IN ({placeholders})
+                )
+                ORDER BY score
+                """,
+                (match, *principals),
+            )
+            # rows are ordered by score, keep the best release per project
+            for name, project, version, summary, score in rows:
+                if project not in results:
+                    results[project] = SearchResult(
+                        name=name,
+                        normalized_name=project,
+                        version=version,
+                        summary=summary,
+                        score=score,
+                    )
+                    if len(results) >= limit:
+                        break
+
+        return list(results.values())
+
+    def _delete(self, normalized_name: str):
+        self._con.execute("DELETE FROM releases WHERE project = ?", (normalized_name,))
+        self._con.execute(
+            "DELETE FROM principals WHERE project = ?", (normalized_name,)
+        )
+
+    def _insert(self, project: Project):
+        normalized_name = project.normalized_name()
+        # projects without releases are still found by name
+        versions = project.versions.values() or [Version(version="")]
+        self._con.executemany(
+            "INSERT INTO releases VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (normalized_name, version.version, project.name, *_document(version))
+                for version in versions
+            ],
+        )
+
+        principals = set(project.admins) | set(project.members)
+        principals.update(f"{GROUP}{group}" for group in project.groups)
+        if project.public:
+            principals.add(PUBLIC)
+        self._con.executemany(
+            "INSERT INTO principals VALUES (?, ?)",
+            [(normalized_name, principal) for principal in principals],
+        )
+
+
+def _document(version: Version):
+    metadata = version.metadata
+    keywords = metadata.get("keywords", [])
+    if isinstance(keywords, str):
+        keywords = keywords.split(",")
+
+    return (
+        version.summary,
+        " ".join(keywords),
+        " ".join(version.classifiers),
+        version.description,
+    )
+
+
+class IndexingDBBackend(DBBackendProxy):
+    """
+    Keeps the search index up to date with every saved project.
+    """
+
+    def __init__(self, db, index: SearchIndex):
+        super().__init__(db)
+        self.index = index
+
+    def project_save(self, project: Project) -> Project:
+        saved = super().project_save(project)
+        self.index.index_project(saved)
+        return saved
+
+    def project_members_update(
+        self,
+        changes: List[MembershipChange],
+        revisions: Optional[Mapping[str, int]] = None,
+    ) -> List[str]:
+        changed = super().project_members_update(changes, revisions)
+        for project in self.project_get_many(changed):
+            self.index.index_project(project)
+        return changed
@@ -1,21 +1,34 @@
 """
 Implementation of PEP 503
 """
+
 import logging
 import mimetypes
-import os
+import time
 from pathlib import Path
-from urllib.parse import urljoin
+from typing import AbstractSet, Optional, Tuple, List, Iterable, Callable, BinaryIO
 
 from flask import Blueprint, request, render_template, redirect, send_file, abort, g
 from flask_httpauth import HTTPBasicAuth
 from pypitoken import Token, ValidationError, LoaderError
 from werkzeug.datastructures import MultiDict
-
-from warehouse14.models import Project, File
+from werkzeug.wrappers import Response
+from werkzeug.wsgi import ClosingIterator
+
+from warehouse14.api_tokens import (
+    TokenCache,
+    TokenPermissions,
+    VerifiedToken,
+    parse_restrictions,
+    token_expiry,
+)
+from warehouse14.cache import UserGroupsCache
+from warehouse14.metrics import Metrics
+from warehouse14.models import Project, File, ProjectRecord
 from warehouse14.pkg_helpers import normalize_pkgname_for_url
-from warehouse14.repos import DBBackend
+from warehouse14.repos import ConcurrentModificationError, DBBackend
 from warehouse14.storage import PackageStorage
+from warehouse14.tracing import Tracer, NoopTracer, Span
 
 SINGLE_USE_METADATA = {
     "summary",
@@ -38,6 +51,12 @@ MULTIPLE_USE_METADATA = {
 
 ACCEPTED_METADATA = SINGLE_USE_METADATA | MULTIPLE_USE_METADATA
 
+REQUIRED_METADATA = {"name", "version", "filetype", "summary", "sha256_digest"}
+# saves of an upload, before giving up on concurrent changes of the project
+UPLOAD_SAVE_ATTEMPTS = 5
+
+log = logging.getLogger(__name__)
+
 
 def extract_metadata(form: MultiDict):
     metadata = {}
@@ -52,15 +71,256 @@ def extract_metadata(form: MultiDict):
     return metadata
 
 
+def verify_api_token(
+    db: DBBackend,
+    username: str,
+    password: str,
+    token_cache: Optional[TokenCache] = None,
+) -> Optional[VerifiedToken]:
+    """
+    Verifies the given api token.
+
+    :param username: name of the account, has to be `__token__`
+    :param password: api token with prefix
+    :param token_cache: reuse previous verifications of the same token
+    :return: account name, loaded token and its permissions, None if not authenticated
+    """
+    try:
+        if username and username != "__token__":
+            log.warning(f"Access without proper token username {username}")
+            return None
+
+        if token_cache:
+            verified = token_cache.get(password)
+            if verified is not None:
+                return verified
+
+        token = Token.load(password)
+        permissions, project_name = parse_restrictions(token)
+        account = db.resolve_token(token.identifier)
+        if account is None:
+            return None
+
+        for tk in db.account_token_list(account.name):
+            if tk.id == token.identifier:
+                # project access is checked per request with the permissions
+                token.check(key=tk.key, project_name=project_name, user_id=account.name)
+                verified = VerifiedToken(
+                    account.name, token, permissions, token_expiry(token)
+                )
+                if token_cache:
+                    token_cache.set(password, verified)
+                return verified
+    except (LoaderError, ValidationError):
+        log.warning(f"Access with invalid token permitted.")
+
+    # Not authenticated
+    return None
+
+
+def index_links(
+    db: DBBackend,
+    user_name: str,
+    permissions: TokenPermissions = TokenPermissions(),
+    groups: AbstractSet[str] = frozenset(),
+) -> List[Tuple[str, str]]:
+    """
+    :param permissions: permissions of the token, limiting the listed projects
+    :param groups: groups of the user
+    :return: sorted (name, normalized name) of all projects visible for the user
+    """
+    return sorted(
+        (p.name, p.normalized_name())
+        for p in db.project_list_records()
+        if p.visible(user_name, groups) and permissions.allows(p.name)
+    )
+
+
+def project_links(project: ProjectRecord) -> List[Tuple[str, str]]:
+    """
+    :return: (file name, href) of all files of the project
+    """
+    packages = f"/packages/{normalize_pkgname_for_url(project.name)}/"
+    return [
+        (file.basename, f"{packages}{file.filename}#sha256={file.sha256_digest}")
+        for file in project.files
+    ]
+
+
+class UploadError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def process_upload(
+    db: DBBackend,
+    storage: PackageStorage,
+    username: str,
+    form: MultiDict,
+    content: Optional[Tuple[str, BinaryIO]],
+    allow_project_creation: Callable[[str], bool],
+    permissions: TokenPermissions = TokenPermissions(),
+) -> Project:
+    """
+    Validates an upload request and stores the file and metadata.
+
+    :param form: form fields of the upload request
+    :param content: file name and stream of the uploaded `content` file
+    :param allow_project_creation: decides if the user may create a missing project
+    :param permissions: permissions of the token used for the upload
+    :raises UploadError: with the http status to respond with
+    :return: updated project
+    """
+    log.info(f"Upload request from {username}")
+
+    # Validate request, check for required information
+    for field in (":action", "protocol_version"):
+        if field not in form:
+            log.warning(f"Missing field '{field}'.")
+            raise UploadError(400, f"Missing field '{field}'.")
+    if form[":action"] != "file_upload":
+        log.warning(f"Wrong action '{form[':action']}', only supporting 'file_upload'")
+        raise UploadError(
+            403, f"Wrong action '{form[':action']}', only supporting 'file_upload'"
+        )
+    if form["protocol_version"] != "1":
+        log.warning(f"Wrong protocol_version '{form['protocol_version']}'.")
+        raise UploadError(403, f"Wrong protocol_version '{form['protocol_version']}'.")
+    if content is None:
+        log.warning(f"No upload content.")
+        raise UploadError(403, f"No upload content.")
+
+    if not REQUIRED_METADATA.issubset(set(form.keys())):
+        log.warning(f"Missing required information.")
+        raise UploadError(403, f"Missing required information.")
+
+    project_name = form["name"]
+    version = form["version"]
+    file_key, stream = content
+    sha256_digest = form["sha256_digest"]
+
+    if not permissions.allows(project_name):
+        log.warning(f"Token of {username} is restricted to other projects")
+        raise UploadError(403, f"Token is restricted to other projects")
+
+    # get or create project
+    project = db.project_get(project_name)
+    if project is None:
+        if not allow_project_creation(username):
+            log.warning(f"No permission to create a new project via direct upload.")
+            raise UploadError(
+                401, f"No permission to create a new project via direct upload."
+            )
+        else:
+            try:
+                project = db.project_save(
+                    Project(
+                        name=project_name, admins=[username], members=[], public=False
+                    )
+                )
+            except ConcurrentModificationError:
+                # created by a concurrent upload
+                project = db.project_get(project_name)
+
+    # Check permissions, only admins are allowed to upload
+    if username not in project.admins:
+        log.warning(
+            "No permission to upload packages. "
+            f"{username} -> {project.normalized_name()}"
+        )
+        raise UploadError(401, f"No permission to upload packages")
+
+    new_metadata = extract_metadata(form)
+
+    def add_to(project: Project):
+        project.add_file(version, File(filename=file_key, sha256_digest=sha256_digest))
+        project.versions[version].metadata.update(new_metadata)
+
+    try:
+        # Store file
+        add_to(project)
+        storage.add(project.normalized_name(), file_key, stream)
+    except FileExistsError:
+        log.warning("File already exists, overwriting not allowed")
+        raise UploadError(409, "File already exists, overwriting not allowed")
+
+    # Update project, concurrent uploads of other files change it as well
+    for attempt in range(1, UPLOAD_SAVE_ATTEMPTS + 1):
+        try:
+            project = db.project_save(project)
+            break
+        except ConcurrentModificationError:
+            log.info(f"Project {project.normalized_name()} was changed meanwhile")
+
+        project = db.project_get(project_name)
+        if project is None or username not in project.admins:
+            storage.delete(Project.normalize_name(project_name), file_key)
+            raise UploadError(401, f"No permission to upload packages")
+        if any(file.filename == file_key for file in project.files):
+            # the stored file belongs to the concurrent upload
+            log.warning("File already exists, overwriting not allowed")
+            raise UploadError(409, "File already exists, overwriting not allowed")
+        if attempt == UPLOAD_SAVE_ATTEMPTS:
+            storage.delete(project.normalized_name(), file_key)
+            raise UploadError(503, "Project is changed too often, please retry")
+        add_to(project)
+
+    log.info(f"Uploaded new file for {project.normalized_name()}: {file_key}")
+
+    return project
+
+
+def end_on_close(response: Response, span: Span):
+    """
+    Ends the span after the body was sent, which is after the request context is closed.
+    """
+    if not span.recording:
+        return
+
+    if response.direct_passthrough:
+        # werkzeug hands out passthrough bodies (send_file) without `Response.close`
+        response.response = ClosingIterator(response.response, span.end)
+    else:
+        response.call_on_close(span.end)
+
+
 def create_blueprint(
     db: DBBackend,
     storage: PackageStorage,
     allow_project_creation: bool = False,
     restrict_project_creation=None,
+    metrics: Optional[Metrics] = None,
+    tracer: Optional[Tracer] = None,
+    token_cache: Optional[TokenCache] = None,
+    user_groups: Optional[UserGroupsCache] = None,
 ):
     app = Blueprint("simple", __name__)
     token_auth = HTTPBasicAuth()
-    log = logging.getLogger(__name__)
+    tracer = tracer or NoopTracer()
+    token_cache = token_cache or TokenCache()
+    user_groups = user_groups or UserGroupsCache(db)
+
+    @app.before_request
+    def start_request_span():
+        g.request_span = tracer.start_span(
+            request.endpoint or "simple", method=request.method, path=request.path
+        )
+
+    @app.after_request
+    def end_request_span(response):
+        span = g.pop("request_span", None)
+        if span is not None:
+            span.set_attribute("status", response.status_code)
+            end_on_close(response, span)
+        return response
+
+    @app.teardown_request
+    def end_failed_request_span(exc=None):
+        span = g.pop("request_span", None)
+        if span is not None:
+            span.end()
 
     def check_project_creation_allowed(username):
         if not allow_project_creation:
@@ -86,39 +346,31 @@ def create_blueprint(
         :param password: api token with prefix
         :return: username
         """
-        try:
-            if username and username != "__token__":
-                log.warning(f"Access without proper token username {username}")
-                return None
-
-            token = Token.load(password)
-            account = db.resolve_token(token.identifier)
-            if account is None:
-                return None
-
-            for tk in db.account_token_list(account.name):
-                if tk.id == token.identifier:
-                    # delay test to check for specific project access
-                    token.check(key=tk.key)
+        start = time.perf_counter()
+        with tracer.start_span("simple.verify_password"):
+            verified = verify_api_token(db, username, password, token_cache)
+        if metrics:
+            metrics.token_verification.observe(
+                time.perf_counter() - start,
+                result="invalid" if verified is None else "valid",
+            )
+        if verified is None:
+            return None
 
-                    # Store token for later
-                    g.token = token
-                    return account.name
-        except (LoaderError, ValidationError):
-            log.warning(f"Access with invalid token permitted.")
+        # Store token, permissions and groups of the account for the handlers
+        g.token = verified.token
+        g.permissions = verified.permissions
+        g.groups = user_groups.get(verified.account_name)
+        return verified.account_name
 
-        # Not authenticated
-        return None
+    def check_token_permissions(project_name: str):
+        if not g.permissions.allows(project_name):
+            abort(403, "Token is restricted to other projects")
 
     @app.get("/simple/")
     @token_auth.login_required
     def simple_index():
-        usern_name = token_auth.current_user()
-        links = sorted(
-            (p.name, p.normalized_name())
-            for p in db.project_list()
-            if p.visible(usern_name)
-        )
+        links = index_links(db, token_auth.current_user(), g.permissions, g.groups)
         return render_template("simple/simple.html", links=links)
 
     @app.route("/simple/<project_name>/")
@@ -130,24 +382,16 @@ def create_blueprint(
             log.info(f"Redirect to normalized project name url")
             return redirect(f"/simple/{normalized}/", 301)
 
-        project = db.project_get(project_name)
+        check_token_permissions(project_name)
+        project = db.project_get_record(project_name)
         if project is None:
             abort(404)
 
         user_name = token_auth.current_user()
-        if not project.visible(user_name):
+        if not project.visible(user_name, g.groups):
             abort(401)
 
-        links = (
-            (
-                os.path.basename(file.filename),
-                urljoin(
-                    request.path,
-                    f"../../packages/{normalized}/{file.filename}#sha256={file.sha256_digest}",
-                ),
-            )
-            for file in project.files
-        )
+        links = project_links(project)
         return render_template("simple/links.html", project=project_name, links=links)
 
         # packages = sorted(
@@ -177,19 +421,27 @@ def create_blueprint(
             return redirect(f"/simple/{normalized}/{filename}", 301)
 
         # Check access
+        check_token_permissions(normalized)
         usern_name = token_auth.current_user()
-        project = db.project_get(normalized)
-        if not project.visible(usern_name):
+        project = db.project_get_record(normalized)
+        if project is None:
+            abort(404)
+        if not project.visible(usern_name, g.groups):
             abort(401)
+        entry = project.get_file(filename)
+        if entry is None:
+            abort(404)
 
         # serve file
         log.info(f"Provide file {filename}")
-        file = storage.get(project_name, filename)
+        file = storage.get_with_digest(project_name, filename, entry.sha256_digest)
+        send_span = tracer.start_span("simple.send_file", file=filename)
         response = send_file(
             file,
             download_name=Path(filename).name,
             mimetype="application/octet-stream",
         )
+        end_on_close(response, send_span)
         return response
         # if config.cache_control:
         #     response.set_header(
@@ -200,75 +452,19 @@ def create_blueprint(
     @app.post("/simple/")
     @token_auth.login_required
     def upload():
-        form = request.form
-
-        # Get user
-        username = token_auth.current_user()
-        log.info(f"Upload request from {username}")
-
-        # Validate request, check for required information
-        if form[":action"] != "file_upload":
-            log.warning(
-                f"Wrong action '{form[':action:']}', only supporting 'file_upload'"
-            )
-            abort(
-                403, f"Wrong action '{form[':action:']}', only supporting 'file_upload'"
-            )
-        if form["protocol_version"] != "1":
-            log.warning(f"Wrong protocol_version '{form['protocol_version']}'.")
-            abort(403, f"Wrong protocol_version '{form['protocol_version']}'.")
-        if "content" not in request.files:
-            log.warning(f"No upload content.")
-            abort(403, f"No upload content.")
-
-        REQUIRED_METADATA = {"name", "version", "filetype", "summary", "sha256_digest"}
-        if not REQUIRED_METADATA.issubset(set(form.keys())):
-            log.warning(f"Missing required information.")
-            abort(403, f"Missing required information.")
-
-        project_name = form["name"]
-        version = form["version"]
-        file = request.files["content"]
-        sha256_digest = form["sha256_digest"]
-
-        # get or create project
-        project = db.project_get(project_name)
-        if project is None:
-            if not check_project_creation_allowed(username):
-                log.warning(f"No permission to create a new project via direct upload.")
-                abort(401, f"No permission to create a new project via direct upload.")
-            else:
-                project = db.project_save(
-                    Project(
-                        name=project_name, admins=[username], members=[], public=False
-                    )
-                )
-
-        # Check permissions, only admins are allowed to upload
-        if username not in project.admins:
-            log.warning(
-                f"No permission to upload packages. {username} -> {project.normalized_name()}"
-            )
-            abort(401, f"No permission to upload packages")
-
+        file = request.files.get("content")
         try:
-            # Store file
-            file_key = file.filename
-            project.add_file(
-                version, File(filename=file_key, sha256_digest=sha256_digest)
+            process_upload(
+                db,
+                storage,
+                username=token_auth.current_user(),
+                form=request.form,
+                content=(file.filename, file.stream) if file else None,
+                allow_project_creation=check_project_creation_allowed,
+                permissions=g.permissions,
             )
-            storage.add(project.normalized_name(), file_key, file.stream)
-        except FileExistsError:
-            log.warning("File already exists, overwriting not allowed")
-            abort(409, "File already exists, overwriting not allowed")
-
-        # Update metadata
-        new_metadata = extract_metadata(form)
-        project.versions[version].metadata.update(new_metadata)
-
-        # Update project
-        db.project_save(project)
-        log.info(f"Uploaded new file for {project.normalized_name()}: {file_key}")
+        except UploadError as e:
+            abort(e.status, e.message)
 
         return {"upload": "successfully"}
 
@@ -1,8 +1,13 @@
+import ctypes
+import errno
 import hashlib
+import os
+import shutil
+import tempfile
 from abc import ABC, abstractmethod
-from io import BytesIO
+from contextlib import closing
 from pathlib import Path
-from typing import Iterable, BinaryIO, Union
+from typing import Iterable, BinaryIO, Union, List, Optional, Tuple
 
 
 class PackageStorage(ABC):
@@ -24,6 +29,18 @@ class PackageStorage(ABC):
     def delete(self, project: str, file: str):
         raise NotImplementedError()
 
+    def get_with_digest(
+        self, project: str, file: str, sha256_digest: Optional[str]
+    ) -> BinaryIO:
+        """
+        Like `get`,
+        the digest recorded in the project allows caches to validate their copy.
+
+        May be overwritten by subclasses, for an optimized implementation.
+        :param sha256_digest: hex digest of the file, None if unknown
+        """
+        return self.get(project, file)
+
     def digest(self, project: str, file: str, hash_algo: str) -> str:
         """
         Reads and digests for a file according to specified hashing-algorithm.
@@ -33,38 +50,236 @@ class PackageStorage(ABC):
 
         From https://stackoverflow.com/a/21565932/548792
         """
-        data = self.get(project, file)
-
         digester = hashlib.new(hash_algo)
-        blocksize = 2 ** 16
-        for block in iter(lambda: data.read(blocksize), b""):
-            digester.update(block)
+        blocksize = 2**16
+        with closing(self.get(project, file)) as data:
+            for block in iter(lambda: data.read(blocksize), b""):
+                digester.update(block)
         return f"{hash_algo}={digester.hexdigest()}"
 
 
+# prefix of files, which are not completely written yet
+TEMP_PREFIX = ".upload-"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def _fsync_directory(path: Path):
+    """
+    Persists the directory entries, not supported on every platform (Windows)
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# errors of os.link on file systems without hard links
+LINK_UNSUPPORTED_ERRNOS = {errno.EPERM, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOSYS}
+
+
+def _rename_noreplace(src: str, dst: Path) -> bool:
+    """
+    Renames without replacing an existing file, fails with FileExistsError if it exists.
+
+    :return: False, if neither the platform nor the file system support it
+    """
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (AttributeError, OSError):
+        return False
+
+    at_fdcwd, rename_noreplace = -100, 1
+    if (
+        renameat2(
+            at_fdcwd, os.fsencode(src), at_fdcwd, os.fsencode(dst), rename_noreplace
+        )
+        == 0
+    ):
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.EINVAL, errno.ENOSYS):
+        return False
+    raise OSError(error, os.strerror(error), str(dst))
+
+
+def _commit_exclusive(tmp: str, key: Path):
+    """
+    Moves the file to the key, fails with FileExistsError if the key exists
+    """
+    try:
+        # hard links are never replaced, the first upload wins
+        os.link(tmp, key)
+        return
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED_ERRNOS:
+            raise
+
+    # file system without hard links
+    if not _rename_noreplace(tmp, key):
+        # reserve the name and replace it, readers may see an empty file meanwhile
+        os.close(os.open(key, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        os.replace(tmp, key)
+
+
 class SimpleFileStorage(PackageStorage):
-    def __init__(self, root: Union[str, Path], allow_overwrite=False):
+    # deepest supported sharding, 256^3 directories per project
+    MAX_SHARD_LEVELS = 3
+
+    def __init__(
+        self, root: Union[str, Path], allow_overwrite=False, shard_levels: int = 0
+    ):
+        """
+        :param root: directory, files are stored in `<root>/packages/<project>/`
+        :param shard_levels: directories between project and file,
+            named by two hex digits of the file name hash.
+            Every level divides the files per directory by 256.
+            Files stored with another level are still found,
+            use :meth:`migrate` to move them.
+        """
+        if not 0 <= shard_levels <= self.MAX_SHARD_LEVELS:
+            raise ValueError(
+                f"shard_levels must be between 0 and {self.MAX_SHARD_LEVELS}"
+            )
+
         self._root = (Path(root) / "packages").expanduser().resolve()
         self._allow_overwrite = allow_overwrite
+        self._shard_levels = shard_levels
 
-    def add(self, project: str, file: str, data: BinaryIO):
-        key = self._root / project / file
+    @staticmethod
+    def _shards(file: str, levels: int) -> List[str]:
+        digest = hashlib.sha256(file.encode()).hexdigest()
+        return [digest[i * 2 : i * 2 + 2] for i in range(levels)]
 
-        if key.exists() and not self._allow_overwrite:
-            raise FileExistsError(str(key))
+    def _path(self, project: str, file: str, levels: Optional[int] = None) -> Path:
+        if levels is None:
+            levels = self._shard_levels
+        return self._root.joinpath(project, *self._shards(file, levels), file)
 
+    def _paths(self, project: str, file: str) -> Iterable[Path]:
+        """
+        Possible paths of a file, the configured layout first
+        """
+        yield self._path(project, file)
+        for levels in range(self.MAX_SHARD_LEVELS + 1):
+            if levels != self._shard_levels:
+                yield self._path(project, file, levels)
+
+    def _find(self, project: str, file: str) -> Optional[Path]:
+        for key in self._paths(project, file):
+            if key.exists():
+                return key
+        return None
+
+    def add(self, project: str, file: str, data: BinaryIO):
+        """
+        Writes to a temporary file next to the target, which is synced to disk
+        and then committed in one step, readers never see partial files.
+        Without `allow_overwrite` the commit fails,
+        if a concurrent upload stored the file first.
+        """
+        existing = self._find(project, file)
+        if existing is not None and not self._allow_overwrite:
+            raise FileExistsError(str(existing))
+
+        key = self._path(project, file)
         key.parent.mkdir(parents=True, exist_ok=True)
-        key.write_bytes(data.read())
+        fd, tmp = tempfile.mkstemp(
+            dir=key.parent, prefix=f"{TEMP_PREFIX}{key.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(data, f, COPY_BUFFER_SIZE)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp, 0o644)
+
+            if self._allow_overwrite:
+                os.replace(tmp, key)
+            else:
+                _commit_exclusive(tmp, key)
+            _fsync_directory(key.parent)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+        if existing is not None and existing != key:
+            existing.unlink()
 
     def get(self, project: str, file: str) -> BinaryIO:
-        key = self._root / project / file
-        return BytesIO(key.read_bytes())
+        # Hand out the open file,
+        # so callers can stream it instead of loading it into memory
+        for key in self._paths(project, file):
+            try:
+                return key.open("rb")
+            except FileNotFoundError:
+                pass
+        # retry the configured layout,
+        # the file may have been moved by a running migration
+        return self._path(project, file).open("rb")
 
     def delete(self, project: str, file: str):
-        key = self._root / project / file
-        if key.exists():
+        key = self._find(project, file)
+        if key is not None:
             key.unlink()
 
+    def migrate(self) -> int:
+        """
+        Moves all files stored with another layout to the configured `shard_levels`.
+        Files are moved atomically, so the storage can serve while migrating.
+
+        :return: number of moved files
+        """
+        if not self._root.exists():
+            return 0
+
+        moved = 0
+        for project_dir in self._root.iterdir():
+            if not project_dir.is_dir():
+                continue
+
+            files = (
+                p
+                for p in project_dir.rglob("*")
+                if p.is_file() and not p.name.startswith(TEMP_PREFIX)
+            )
+            for path in sorted(files):
+                file, levels = self._parse(path.relative_to(project_dir).parts)
+                if levels == self._shard_levels:
+                    continue
+
+                key = self._path(project_dir.name, file)
+                key.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(path, key)
+                moved += 1
+
+            # remove emptied shard directories, deepest first
+            for directory in sorted(
+                (p for p in project_dir.rglob("*") if p.is_dir()),
+                key=lambda p: len(p.parts),
+                reverse=True,
+            ):
+                if not any(directory.iterdir()):
+                    directory.rmdir()
+
+        return moved
+
+    def _parse(self, parts: Tuple[str, ...]) -> Tuple[str, int]:
+        """
+        :param parts: path of a stored file, relative to the project directory
+        :return: file name and shard levels of the path
+        """
+        for levels in range(self.MAX_SHARD_LEVELS, 0, -1):
+            file = "/".join(parts[levels:])
+            if file and list(parts[:levels]) == self._shards(file, levels):
+                return file, levels
+        return "/".join(parts), 0
+
 
 class S3Storage(PackageStorage):
     def __init__(self, bucket, allow_overwrite=False):
@@ -85,9 +300,10 @@ class S3Storage(PackageStorage):
 
     def get(self, project: str, file: str) -> BinaryIO:
         key = f"{project}/{file}"
-        if self._contains(key):
+        try:
+            # a single request, instead of listing the key first
             return self._bucket.Object(key).get()["Body"]
-        else:
+        except self._bucket.meta.client.exceptions.NoSuchKey:
             raise KeyError()
 
     def delete(self, project: str, file: str):
@@ -0,0 +1,112 @@
+"""
+Async variants of the package storages.
+
+Blocking file system and S3 calls are moved into worker threads (the same approach
+aiofiles uses), blobs are handed out as async chunk iterators, so an ASGI server can
+keep many slow downloads in flight without pinning a thread per download.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional, Union
+
+from warehouse14.storage import PackageStorage, SimpleFileStorage, S3Storage
+
+CHUNK_SIZE = 2**16
+
+
+class AsyncPackageStorage(ABC):
+    @abstractmethod
+    async def add(self, project: str, file: str, data: BinaryIO):
+        """
+        :param project: normalized name of the project
+        :param file: file file of the blob to store
+        :param data: blob to store
+        :return: None
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def open(
+        self, project: str, file: str, chunk_size: int = CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        Opens a blob for streaming.
+
+        Missing blobs raise on `open`, not while iterating,
+        so callers can answer with an error before a response is started.
+
+        :return: async iterator over the chunks of the blob
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def delete(self, project: str, file: str):
+        raise NotImplementedError()
+
+    async def get(self, project: str, file: str) -> bytes:
+        """
+        Reads the whole blob, prefer `open` for anything bigger than metadata.
+        """
+        chunks = await self.open(project, file)
+        return b"".join([chunk async for chunk in chunks])
+
+
+class AsyncStorageAdapter(AsyncPackageStorage):
+    """
+    Provides any synchronous :class:`PackageStorage` as :class:`AsyncPackageStorage`.
+    """
+
+    def __init__(self, storage: PackageStorage):
+        self._storage = storage
+
+    @property
+    def storage(self) -> PackageStorage:
+        return self._storage
+
+    async def add(self, project: str, file: str, data: BinaryIO):
+        await asyncio.to_thread(self._storage.add, project, file, data)
+
+    async def open(
+        self,
+        project: str,
+        file: str,
+        chunk_size: int = CHUNK_SIZE,
+        sha256_digest: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        :param sha256_digest: digest recorded in the project,
+            see `PackageStorage.get_with_digest`
+        """
+        blob = await asyncio.to_thread(
+            self._storage.get_with_digest, project, file, sha256_digest
+        )
+        return self._iter_chunks(blob, chunk_size)
+
+    async def delete(self, project: str, file: str):
+        await asyncio.to_thread(self._storage.delete, project, file)
+
+    @staticmethod
+    async def _iter_chunks(blob: BinaryIO, chunk_size: int) -> AsyncIterator[bytes]:
+        try:
+            while chunk := await asyncio.to_thread(blob.read, chunk_size):
+                yield chunk
+        finally:
+            await asyncio.to_thread(blob.close)
+
+
+class AsyncSimpleFileStorage(AsyncStorageAdapter):
+    def __init__(
+        self, root: Union[str, Path], allow_overwrite=False, shard_levels: int = 0
+    ):
+        super().__init__(
+            SimpleFileStorage(
+                root, allow_overwrite=allow_overwrite, shard_levels=shard_levels
+            )
+        )
+
+
+class AsyncS3Storage(AsyncStorageAdapter):
+    def __init__(self, bucket, allow_overwrite=False):
+        super().__init__(S3Storage(bucket, allow_overwrite=allow_overwrite))
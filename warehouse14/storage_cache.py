@@ -0,0 +1,199 @@
+"""
+Read-through cache of a package storage on local disk
+
+Popular files are downloaded from slow backing stores like S3 only once,
+hits are served as real files, so the web server can send them with sendfile.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from pathlib import Path
+from typing import BinaryIO, Dict, NamedTuple, Optional, Union
+
+from warehouse14.storage import COPY_BUFFER_SIZE, TEMP_PREFIX, PackageStorage
+
+log = logging.getLogger(__name__)
+
+
+class _Entry(NamedTuple):
+    path: Path
+    size: int
+    # sha256 hex digest of the content
+    digest: str
+
+
+def _key(project: str, file: str) -> str:
+    return hashlib.sha256(f"{project}/{file}".encode()).hexdigest()
+
+
+class CachedStorage(PackageStorage):
+    """
+    Keeps copies of served files on local disk within a byte budget,
+    evicting the least recently used files.
+
+    Copies are validated against the sha256 digest of the project record, if given,
+    outdated copies are downloaded again. Use one directory per process,
+    the cache is rebuilt from the directory on start.
+    """
+
+    def __init__(
+        self,
+        storage: PackageStorage,
+        directory: Union[str, Path],
+        max_bytes: int = 10 * 1024**3,
+    ):
+        """
+        :param storage: backing storage
+        :param directory: cache directory
+        :param max_bytes: budget of all cached files, larger files are not cached
+        """
+        self._storage = storage
+        self._directory = Path(directory).expanduser().resolve()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: Dict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._fill_locks: Dict[str, threading.Lock] = {}
+        self._load()
+
+    @property
+    def storage(self) -> PackageStorage:
+        return self._storage
+
+    def _load(self):
+        self._directory.mkdir(parents=True, exist_ok=True)
+
+        # leftovers of interrupted downloads
+        for path in self._directory.glob(f"{TEMP_PREFIX}*"):
+            path.unlink(missing_ok=True)
+
+        found = []
+        for path in self._directory.glob("*/*"):
+            key, _, digest = path.name.partition(".")
+            stat = path.stat()
+            found.append((stat.st_mtime, key, _Entry(path, stat.st_size, digest)))
+
+        # oldest first, approximates the order of use
+        with self._lock:
+            for _, key, entry in sorted(found):
+                self._entries[key] = entry
+                self.size += entry.size
+            self._evict()
+
+    def add(self, project: str, file: str, data: BinaryIO):
+        self._storage.add(project, file, data)
+        self._invalidate(project, file)
+
+    def get(self, project: str, file: str) -> BinaryIO:
+        return self.get_with_digest(project, file, None)
+
+    def get_with_digest(
+        self, project: str, file: str, sha256_digest: Optional[str]
+    ) -> BinaryIO:
+        key = _key(project, file)
+        expected = sha256_digest.lower() if sha256_digest else None
+
+        data = self._open_cached(key, expected)
+        if data is not None:
+            return data
+
+        with self._lock:
+            self.misses += 1
+            fill_lock = self._fill_locks.setdefault(key, threading.Lock())
+
+        # download once, concurrent requests of the same file wait for it
+        with fill_lock:
+            data = self._open_cached(key, expected)
+            if data is None:
+                data = self._fill(key, project, file, expected)
+
+        with self._lock:
+            self._fill_locks.pop(key, None)
+        return data
+
+    def delete(self, project: str, file: str):
+        self._storage.delete(project, file)
+        self._invalidate(project, file)
+
+    def _open_cached(self, key: str, expected: Optional[str]) -> Optional[BinaryIO]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            if expected is not None and entry.digest != expected:
+                # the file changed in the backing storage
+                self._remove(key)
+                return None
+
+            try:
+                data = entry.path.open("rb")
+            except FileNotFoundError:
+                self._remove(key)
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def _fill(
+        self, key: str, project: str, file: str, expected: Optional[str]
+    ) -> BinaryIO:
+        fd, tmp = tempfile.mkstemp(dir=self._directory, prefix=TEMP_PREFIX)
+        digester = hashlib.sha256()
+        try:
+            with os.fdopen(fd, "wb") as f, closing(
+                self._storage.get(project, file)
+            ) as source:
+                for chunk in iter(lambda: source.read(COPY_BUFFER_SIZE), b""):
+                    digester.update(chunk)
+                    f.write(chunk)
+            data = open(tmp, "rb")
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        digest = digester.hexdigest()
+        size = os.fstat(data.fileno()).st_size
+        if expected is not None and digest != expected:
+            log.warning(f"Digest of {project}/{file} differs from project, not cached")
+            # the open file stays readable
+            os.unlink(tmp)
+            return data
+        if size > self.max_bytes:
+            os.unlink(tmp)
+            return data
+
+        path = self._directory / key[:2] / f"{key}.{digest}"
+        path.parent.mkdir(exist_ok=True)
+        with self._lock:
+            self._remove(key)
+            os.replace(tmp, path)
+            self._entries[key] = _Entry(path, size, digest)
+            self.size += size
+            self._evict()
+        return data
+
+    def _invalidate(self, project: str, file: str):
+        with self._lock:
+            self._remove(_key(project, file))
+
+    def _remove(self, key: str):
+        # requires lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            # files being served stay readable
+            entry.path.unlink(missing_ok=True)
+
+    def _evict(self):
+        # requires lock
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
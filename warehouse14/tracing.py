@@ -0,0 +1,245 @@
+"""
+Tracing of requests across authentication, database and storage
+
+A request to the simple API opens a span,
+every database and storage call within opens a child span.
+`NoopTracer` is the default, `InMemoryTracer` records span trees (tests, debugging)
+and `OpenTelemetryTracer` forwards spans to OpenTelemetry
+(requires `opentelemetry-api`).
+"""
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from warehouse14.repos import DBBackend, DBBackendProxy
+from warehouse14.storage import PackageStorage
+
+
+class Span:
+    """
+    Span which does not record anything, base of all spans.
+
+    Use as context manager or call `end`, ending a span multiple times has no effect.
+    """
+
+    recording = False
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self) -> "Span":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.set_attribute("error", repr(exc))
+        self.end()
+
+
+class Tracer(ABC):
+    @abstractmethod
+    def start_span(self, name: str, **attributes) -> Span:
+        """
+        Starts a span as child of the current span.
+        The span is the current span until it ends.
+
+        :param name: name of the operation, like `db.project_get`
+        :param attributes: key value pairs describing the operation
+        """
+        raise NotImplementedError()
+
+
+class NoopTracer(Tracer):
+    _span = Span()
+
+    def start_span(self, name: str, **attributes) -> Span:
+        return self._span
+
+
+class RecordedSpan(Span):
+    recording = True
+
+    def __init__(
+        self,
+        tracer: "InMemoryTracer",
+        name: str,
+        parent: Optional["RecordedSpan"],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.parent = parent
+        self.attributes = attributes
+        self.children: List[RecordedSpan] = []
+        self.start = time.perf_counter()
+        self.end_time: Optional[float] = None
+        self._tracer = tracer
+
+    @property
+    def duration(self) -> Optional[float]:
+        """
+        Duration in seconds, None while the span is running
+        """
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+            self._tracer._finish(self)
+
+    def format(self, indent: int = 0) -> str:
+        """
+        Renders the span tree, one line with duration per span
+        """
+        duration = (
+            "running" if self.duration is None else f"{self.duration * 1000:.2f} ms"
+        )
+        lines = [f"{'  ' * indent}{self.name} ({duration})"]
+        lines.extend(child.format(indent + 1) for child in self.children)
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"RecordedSpan({self.name!r})"
+
+
+class InMemoryTracer(Tracer):
+    """
+    Records all spans in memory, use for tests and debugging.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: ContextVar[Optional[RecordedSpan]] = ContextVar(
+            "warehouse14_span", default=None
+        )
+        self.roots: List[RecordedSpan] = []
+        self.finished: List[RecordedSpan] = []
+
+    def start_span(self, name: str, **attributes) -> RecordedSpan:
+        parent = self._current.get()
+        span = RecordedSpan(self, name, parent, attributes)
+        with self._lock:
+            if parent is None:
+                self.roots.append(span)
+            else:
+                parent.children.append(span)
+        self._current.set(span)
+        return span
+
+    def _finish(self, span: RecordedSpan):
+        with self._lock:
+            self.finished.append(span)
+        if self._current.get() is span:
+            self._current.set(span.parent)
+
+    def find(self, name: str) -> List[RecordedSpan]:
+        """
+        All recorded spans with the given name
+        """
+        with self._lock:
+            spans = list(self.roots)
+        found = []
+        while spans:
+            span = spans.pop(0)
+            if span.name == name:
+                found.append(span)
+            spans.extend(span.children)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self.roots.clear()
+            self.finished.clear()
+
+
+class _OpenTelemetrySpan(Span):
+    recording = True
+
+    def __init__(self, span, context, token):
+        self._span = span
+        self._context = context
+        self._token = token
+        self._ended = False
+
+    def set_attribute(self, key: str, value: Any):
+        self._span.set_attribute(key, value)
+
+    def end(self):
+        if not self._ended:
+            self._ended = True
+            self._span.end()
+            self._context.detach(self._token)
+
+
+class OpenTelemetryTracer(Tracer):
+    """
+    Creates OpenTelemetry spans, configure the SDK and exporters as usual.
+    """
+
+    def __init__(self, tracer=None):
+        """
+        :param tracer: OpenTelemetry tracer,
+            defaults to the tracer `warehouse14` of the global provider
+        """
+        from opentelemetry import context, trace
+
+        self._context = context
+        self._trace = trace
+        self._tracer = tracer or trace.get_tracer("warehouse14")
+
+    def start_span(self, name: str, **attributes) -> Span:
+        span = self._tracer.start_span(name, attributes=attributes)
+        token = self._context.attach(self._trace.set_span_in_context(span))
+        return _OpenTelemetrySpan(span, self._context, token)
+
+
+@DBBackendProxy.wrap_calls
+class TracingDBBackend(DBBackendProxy):
+    """
+    Opens a span for every database call.
+    """
+
+    def __init__(self, db: DBBackend, tracer: Tracer):
+        super().__init__(db)
+        self._tracer = tracer
+
+    def _call_context(self, name: str):
+        return self._tracer.start_span(f"db.{name}")
+
+
+class TracingStorage(PackageStorage):
+    """
+    Opens a span for every storage call.
+    """
+
+    def __init__(self, storage: PackageStorage, tracer: Tracer):
+        self._storage = storage
+        self._tracer = tracer
+
+    def add(self, project: str, file: str, data: BinaryIO):
+        with self._tracer.start_span("storage.add", project=project, file=file):
+            self._storage.add(project, file, data)
+
+    def get(self, project: str, file: str) -> BinaryIO:
+        with self._tracer.start_span("storage.get", project=project, file=file):
+            return self._storage.get(project, file)
+
+    def get_with_digest(
+        self, project: str, file: str, sha256_digest: Optional[str]
+    ) -> BinaryIO:
+        with self._tracer.start_span("storage.get", project=project, file=file):
+            return self._storage.get_with_digest(project, file, sha256_digest)
+
+    def delete(self, project: str, file: str):
+        with self._tracer.start_span("storage.delete", project=project, file=file):
+            self._storage.delete(project, file)